@@ -0,0 +1,109 @@
+import json
+import random
+import sys
+import threading
+import time
+from collections import deque
+from typing import Callable, Optional, TextIO
+
+
+class AccessLog:
+    """Structured access log written in batches by a background thread.
+
+    The request path only appends a tuple to a bounded deque; formatting and
+    writing happen on the writer thread, so a slow stdout never blocks the
+    event loop. When the queue is full new records are dropped and counted
+    rather than waited on. Successful (2xx) responses can be sampled with
+    ``success_sample_rate``; every other status is always recorded.
+    """
+
+    def __init__(
+        self,
+        max_queue: int = 10_000,
+        batch_size: int = 256,
+        flush_interval: float = 1.0,
+        success_sample_rate: float = 1.0,
+        stream: Optional[TextIO] = None,
+        random_func: Callable[[], float] = random.random,
+    ):
+        self.max_queue = max_queue
+        self.batch_size = batch_size
+        self.flush_interval = flush_interval
+        self.success_sample_rate = success_sample_rate
+        self.stream = stream
+        self.random_func = random_func
+
+        self.dropped = 0
+        self.sampled_out = 0
+        self.written = 0
+
+        self._queue: deque = deque()
+        self._wakeup = threading.Event()
+        self._stopping = False
+        self._thread: Optional[threading.Thread] = None
+
+    def record(self, method: str, route: str, status: int, duration: float, client: str) -> None:
+        """Queue one access record; never blocks."""
+        if 200 <= status < 300 and self.success_sample_rate < 1.0:
+            if self.random_func() >= self.success_sample_rate:
+                self.sampled_out += 1
+                return
+
+        queue = self._queue
+        if len(queue) >= self.max_queue:
+            self.dropped += 1
+            return
+        queue.append((time.time(), method, route, status, duration, client))
+        if len(queue) >= self.batch_size:
+            self._wakeup.set()
+
+    def start(self) -> None:
+        """Start the background writer thread."""
+        if self._thread is not None and self._thread.is_alive():
+            return
+        self._stopping = False
+        self._thread = threading.Thread(target=self._run, name="access-log-writer", daemon=True)
+        self._thread.start()
+
+    def stop(self) -> None:
+        """Stop the writer thread after flushing everything queued."""
+        self._stopping = True
+        self._wakeup.set()
+        if self._thread is not None:
+            self._thread.join()
+            self._thread = None
+        self.flush()
+
+    def flush(self) -> None:
+        """Write every queued record in batches of ``batch_size``."""
+        while self._write_batch():
+            pass
+
+    def _run(self) -> None:
+        while not self._stopping:
+            self._wakeup.wait(self.flush_interval)
+            self._wakeup.clear()
+            self.flush()
+
+    def _write_batch(self) -> int:
+        queue = self._queue
+        lines = []
+        while queue and len(lines) < self.batch_size:
+            timestamp, method, route, status, duration, client = queue.popleft()
+            lines.append(json.dumps({
+                "ts": round(timestamp, 3),
+                "method": method,
+                "route": route,
+                "status": status,
+                "duration_ms": round(duration * 1000, 3),
+                "client": client,
+            }))
+        if lines:
+            stream = self.stream or sys.stdout
+            try:
+                stream.write("\n".join(lines) + "\n")
+                stream.flush()
+                self.written += len(lines)
+            except (OSError, ValueError):
+                self.dropped += len(lines)
+        return len(lines)
@@ -1,20 +1,29 @@
 from fastapi import Depends, HTTPException, status
 from fastapi.security import HTTPBearer, HTTPAuthorizationCredentials
-from sqlalchemy.orm import Session
+from sqlalchemy.ext.asyncio import AsyncSession
 from jose import JWTError
 from . import schemas
+from .cache import principal_cache
 from .cruds import users as user_crud
-from .database import get_db
+from .database import get_async_db
+from .revocation import revocations
 from .security import verify_token
 
 # HTTP Bearer token scheme
 security = HTTPBearer()
 
-def get_current_user(
+async def get_current_user(
     credentials: HTTPAuthorizationCredentials = Depends(security),
-    db: Session = Depends(get_db)
-) -> schemas.UserResponse:
-    """Get current user from JWT token"""
+    db: AsyncSession = Depends(get_async_db)
+) -> schemas.AuthenticatedUser:
+    """Get current user from JWT token
+    
+    Tokens carry the user's id, active flag and token version, so the
+    principal is built from the claims and checked against the in-memory
+    revocation set without touching the users table. Verified principals are
+    also cached per token, so repeated requests skip JWT decoding too.
+    Tokens issued before those claims existed are resolved from the database.
+    """
     
     credentials_exception = HTTPException(
         status_code=status.HTTP_401_UNAUTHORIZED,
@@ -26,31 +35,50 @@ def get_current_user(
         # Extract token from credentials
         token = credentials.credentials
         
+        cached_user = principal_cache.get(token)
+        if cached_user is not None:
+            if revocations.is_revoked(cached_user.id, cached_user.token_version):
+                raise credentials_exception
+            return cached_user
+        cache_epoch = principal_cache.epoch
+        
         # Verify token
         token_data = verify_token(token)
         if token_data is None:
             raise credentials_exception
         
-        # Get user from database
-        user = user_crud.get_user_by_email(db, email=token_data["email"])
-        if user is None:
-            raise credentials_exception
+        if token_data["user_id"] is not None:
+            current_user = schemas.AuthenticatedUser(
+                id=token_data["user_id"],
+                email=token_data["email"],
+                is_active=token_data["active"],
+                token_version=token_data["version"]
+            )
+            if revocations.is_revoked(current_user.id, current_user.token_version):
+                raise credentials_exception
+        else:
+            # Get user from database
+            user = await user_crud.get_user_by_email_async(db, email=token_data["email"])
+            if user is None:
+                raise credentials_exception
+            current_user = schemas.AuthenticatedUser.model_validate(user)
         
         # Check if user is active
-        if user.is_active is False:
+        if current_user.is_active is False:
             raise HTTPException(
                 status_code=status.HTTP_401_UNAUTHORIZED,
                 detail="Inactive user"
             )
         
-        return user
+        principal_cache.set(token, current_user, token_data["exp"], epoch=cache_epoch)
+        return current_user
         
     except JWTError:
         raise credentials_exception
 
 def get_current_active_user(
-    current_user: schemas.UserResponse = Depends(get_current_user)
-) -> schemas.UserResponse:
+    current_user: schemas.AuthenticatedUser = Depends(get_current_user)
+) -> schemas.AuthenticatedUser:
     """Get current active user (additional validation)"""
     if not current_user.is_active:
         raise HTTPException(
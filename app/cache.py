@@ -0,0 +1,212 @@
+import asyncio
+import hashlib
+import threading
+import time
+from collections import OrderedDict
+from typing import Any, Awaitable, Callable, Dict, Generic, Hashable, NamedTuple, Optional, Tuple, TypeVar
+
+from . import schemas
+from .config import settings
+
+V = TypeVar("V")
+
+
+class TTLCache(Generic[V]):
+    """Bounded least-recently-used cache whose entries expire after a TTL.
+
+    Sync endpoints and dependencies run on threadpool threads, so every
+    operation takes a short lock.
+    """
+
+    def __init__(self, max_entries: int = 10_000, ttl: float = 60.0, clock: Callable[[], float] = time.monotonic):
+        self.max_entries = max_entries
+        self.ttl = ttl
+        self.clock = clock
+        self._entries: "OrderedDict[Hashable, Tuple[float, V]]" = OrderedDict()
+        self._lock = threading.Lock()
+
+    def __len__(self) -> int:
+        return len(self._entries)
+
+    def get(self, key: Hashable) -> Optional[V]:
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is None:
+                return None
+            expires_at, value = entry
+            if expires_at <= self.clock():
+                del self._entries[key]
+                return None
+            self._entries.move_to_end(key)
+            return value
+
+    def set(self, key: Hashable, value: V, ttl: Optional[float] = None) -> None:
+        ttl = self.ttl if ttl is None else min(ttl, self.ttl)
+        with self._lock:
+            self._entries[key] = (self.clock() + ttl, value)
+            self._entries.move_to_end(key)
+            while len(self._entries) > self.max_entries:
+                self._entries.popitem(last=False)
+
+    def pop(self, key: Hashable) -> None:
+        with self._lock:
+            self._entries.pop(key, None)
+
+    def clear(self) -> None:
+        with self._lock:
+            self._entries.clear()
+
+
+class PrincipalCache:
+    """Authenticated users keyed by the bearer token that identified them.
+
+    Entries hold an immutable ``schemas.AuthenticatedUser`` snapshot and live
+    for at most the cache TTL and never past the token's own expiry. Writes to
+    a user bump that user's generation, which turns every cached entry for
+    them into a miss without having to find the tokens involved. Callers read
+    ``epoch`` before loading a user and pass it to ``set``, so a snapshot
+    loaded while an invalidation was happening is never stored.
+
+    The cache is per worker process: another worker serving a stale entry for
+    a user changed elsewhere does so for at most ``ttl`` seconds.
+    """
+
+    def __init__(self, max_entries: int = 10_000, ttl: float = 60.0, clock: Callable[[], float] = time.time):
+        self.clock = clock
+        self._entries: TTLCache[Tuple[int, schemas.AuthenticatedUser]] = TTLCache(max_entries, ttl, clock)
+        self._generations: Dict[int, int] = {}
+        self.epoch = 0
+
+    def get(self, token: str) -> Optional[schemas.AuthenticatedUser]:
+        entry = self._entries.get(token)
+        if entry is None:
+            return None
+        generation, user = entry
+        if generation != self._generations.get(user.id, 0):
+            self._entries.pop(token)
+            return None
+        return user
+
+    def set(
+        self,
+        token: str,
+        user: schemas.AuthenticatedUser,
+        token_expires_at: Optional[Any] = None,
+        epoch: Optional[int] = None
+    ) -> None:
+        if epoch is not None and epoch != self.epoch:
+            return
+        ttl = None
+        if token_expires_at is not None:
+            ttl = float(token_expires_at) - self.clock()
+            if ttl <= 0:
+                return
+        self._entries.set(token, (self._generations.get(user.id, 0), user), ttl)
+
+    def invalidate_user(self, user_id: int) -> None:
+        """Drop every cached principal for ``user_id``."""
+        self._generations[user_id] = self._generations.get(user_id, 0) + 1
+        self.epoch += 1
+
+    def clear(self) -> None:
+        self._entries.clear()
+        self._generations.clear()
+        self.epoch += 1
+
+
+class CachedResponse(NamedTuple):
+    """A pre-encoded JSON body, its strong ETag and the headers sent with it"""
+    body: bytes
+    etag: str
+    headers: Dict[str, str]
+
+    @classmethod
+    def from_body(cls, body: bytes, headers: Optional[Dict[str, str]] = None) -> "CachedResponse":
+        return cls(body, f'"{hashlib.blake2b(body, digest_size=16).hexdigest()}"', headers or {})
+
+    def matches(self, if_none_match: Optional[str]) -> bool:
+        """Whether an ``If-None-Match`` header names this body (weak comparison, as RFC 9110 asks)"""
+        if not if_none_match:
+            return False
+        tags = [tag.strip() for tag in if_none_match.split(",")]
+        return "*" in tags or any(tag.removeprefix("W/") == self.etag for tag in tags)
+
+
+class ResponseCache:
+    """Encoded responses of public read endpoints, keyed by URL.
+
+    Entries remember the ``epoch`` they were loaded in and writes bump it
+    (``invalidate``), so a write turns every entry into a miss, including one
+    whose load was still running when the write happened. Concurrent misses
+    for the same key in the same epoch share one load (single flight): the
+    first request runs it and the others await its result, or its exception.
+    Flights live on the event loop; ``invalidate`` may be called from
+    threadpool threads.
+
+    The cache is per worker process: another worker keeps serving what it
+    cached before a write made elsewhere for at most ``ttl`` seconds.
+    """
+
+    def __init__(self, max_entries: int = 1_000, ttl: float = 5.0, clock: Callable[[], float] = time.monotonic):
+        self._entries: TTLCache[Tuple[int, CachedResponse]] = TTLCache(max_entries, ttl, clock)
+        self._flights: Dict[Tuple[int, Hashable], "asyncio.Future[CachedResponse]"] = {}
+        self.epoch = 0
+        self.hits = 0
+        self.misses = 0
+        self.coalesced = 0
+
+    async def get_or_load(self, key: Hashable, load: Callable[[], Awaitable[CachedResponse]]) -> CachedResponse:
+        epoch = self.epoch
+        entry = self._entries.get(key)
+        if entry is not None and entry[0] == epoch:
+            self.hits += 1
+            return entry[1]
+
+        flight = self._flights.get((epoch, key))
+        if flight is not None:
+            self.coalesced += 1
+            try:
+                return await asyncio.shield(flight)
+            except asyncio.CancelledError:
+                if not flight.cancelled():
+                    raise
+                # The request running the load went away; load for ourselves
+                return await self.get_or_load(key, load)
+
+        self.misses += 1
+        flight = self._flights[(epoch, key)] = asyncio.get_running_loop().create_future()
+        try:
+            response = await load()
+        except asyncio.CancelledError:
+            flight.cancel()
+            raise
+        except Exception as exc:
+            flight.set_exception(exc)
+            flight.exception()  # retrieved, so an unawaited flight is not logged
+            raise
+        finally:
+            self._flights.pop((epoch, key), None)
+        flight.set_result(response)
+        if epoch == self.epoch:
+            self._entries.set(key, (epoch, response))
+        return response
+
+    def invalidate(self) -> None:
+        """Drop every cached response; call after committing a write they may show."""
+        self.epoch += 1
+        self._entries.clear()
+
+    def clear(self) -> None:
+        self.invalidate()
+        self.hits = self.misses = self.coalesced = 0
+
+
+principal_cache = PrincipalCache(
+    max_entries=settings.auth_cache_max_entries,
+    ttl=settings.auth_cache_ttl_seconds
+)
+
+event_cache = ResponseCache(
+    max_entries=settings.event_cache_max_entries,
+    ttl=settings.event_cache_ttl_seconds
+)
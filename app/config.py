@@ -1,23 +1,134 @@
 import os
+import tempfile
 from pydantic_settings import BaseSettings
 
 class Settings(BaseSettings):
     # Database
     database_url: str | None = os.getenv("DATABASE_URL")
+    # Connection pools: every worker runs a sync and an async engine, each with
+    # up to db_pool_size + db_max_overflow connections. Both are capped so that
+    # web_concurrency workers stay within db_max_connections minus
+    # db_reserved_connections (left for migrations, consoles and monitoring).
+    db_pool_size: int = 5
+    db_max_overflow: int = 10
+    db_pool_timeout_seconds: float = 30.0
+    db_pool_recycle_seconds: int = 1800
+    db_pool_pre_ping: bool = True
+    db_max_connections: int = 100
+    db_reserved_connections: int = 10
+    # Gunicorn worker processes; gunicorn reads the same WEB_CONCURRENCY variable
+    web_concurrency: int = 4
+    # Comma-separated read replica URLs for the public read endpoints. A replica
+    # lagging more than replica_max_lag_seconds is skipped, and callers who
+    # committed a write in the last read_your_writes_seconds read the primary.
+    database_replica_urls: str = ""
+    replica_max_lag_seconds: float = 5.0
+    replica_check_interval_seconds: float = 5.0
+    read_your_writes_seconds: float = 15.0
+    # Workers whose database is behind the code's schema version migrate it at
+    # boot (one at a time); turn off once `python -m app.migrations` runs as
+    # the release step, so workers with a stale schema fail fast instead
+    migrate_on_startup: bool = True
     
     # JWT
     jwt_secret_key: str | None = os.getenv("JWT_SECRET_KEY")
     jwt_algorithm: str = "HS256"
-    jwt_access_token_expire_minutes: int = 30
+    # Access tokens are validated without a database lookup, so their lifetime
+    # bounds how long a revoked token works when the revocation set is stale;
+    # refresh tokens are checked against the database when they are used
+    jwt_access_token_expire_minutes: int = 15
+    jwt_refresh_token_expire_days: int = 7
+    # How often each worker loads revocations made by other workers
+    token_revocation_refresh_seconds: float = 5.0
     
+    # Authenticated user cache (per worker, keyed by bearer token)
+    auth_cache_ttl_seconds: int = 60
+    auth_cache_max_entries: int = 10_000
+    
+    # Public event reads (GET /events, GET /events/{id}) cached per worker as
+    # encoded JSON; event writes clear this worker's entries at once, other
+    # workers' entries expire after the TTL. With a TTL of 0 only
+    # concurrent identical requests are merged into one query
+    event_cache_ttl_seconds: float = 5.0
+    event_cache_max_entries: int = 1_000
+    
+    # Ticket sales increment events.tickets_sold, one row per event that every
+    # purchase locks. With inventory_shards > 0 each event's remaining capacity
+    # is split across that many rows and a sale claims one, picked at random
+    # or by worker process (inventory_shard_choice "random" or "worker")
+    inventory_shards: int = 0
+    inventory_shard_choice: str = "random"
+    # Starting a payment holds a ticket for ticket_hold_seconds (longer than a
+    # Paystack checkout takes); every hold_sweep_interval_seconds each worker
+    # releases up to hold_sweep_batch_size expired holds per sweep query
+    ticket_hold_seconds: int = 900
+    hold_sweep_interval_seconds: float = 30.0
+    hold_sweep_batch_size: int = 500
+    # Virtual waiting room: with waiting_room_admissions_per_second > 0,
+    # starting a payment needs a token from POST /events/{id}/queue, and each
+    # event admits that many buyers per second to checkout (split evenly
+    # between the web_concurrency workers). Admitted tokens are good for
+    # waiting_room_checkout_seconds.
+    waiting_room_admissions_per_second: float = 0
+    waiting_room_checkout_seconds: int = 600
+    # Reserved seating: seats held with POST /events/{id}/seats/hold stay the
+    # buyer's for seat_hold_seconds (until their payment's hold ends, once
+    # checkout starts). Each worker searches its own copy of an event's seat
+    # availability, reloaded after seat_map_refresh_seconds.
+    seat_hold_seconds: int = 300
+    seat_map_refresh_seconds: float = 2.0
+
     # Security
     bcrypt_rounds: int = 12
+    # When set, bcrypt_rounds is replaced at startup by the highest cost (within
+    # the min/max bounds) whose verify takes at most this long on this host;
+    # the result is shared by all workers through bcrypt_calibration_path.
+    # Stored hashes with a different cost are rehashed on the next login.
+    bcrypt_target_verify_ms: float = 0
+    bcrypt_min_rounds: int = 10
+    bcrypt_max_rounds: int = 16
+    bcrypt_calibration_path: str = os.path.join(tempfile.gettempdir(), "event_ticketing_bcrypt_rounds")
+    # bcrypt runs on this many dedicated processes per worker (0 = threadpool);
+    # requests beyond password_hash_max_pending get a 503 with Retry-After
+    password_hash_processes: int = 2
+    password_hash_max_pending: int = 32
+    password_hash_retry_after_seconds: int = 1
+    # Failed logins allowed per account (and per client IP) before further
+    # attempts are refused for up to lockout_duration_minutes
     max_login_attempts: int = 5
+    max_login_attempts_per_ip: int = 20
     lockout_duration_minutes: int = 15
+    login_attempts_storage_path: str = os.path.join(tempfile.gettempdir(), "event_ticketing_login_attempts.bin")
     
     # Rate limiting
     rate_limit_requests: int = 100
     rate_limit_window_seconds: int = 60
+    rate_limit_max_clients: int = 100_000
+    # "memory" keeps a budget per worker, "shared" enforces one budget across
+    # all workers on the host through the table mapped at rate_limit_storage_path
+    rate_limit_backend: str = "memory"
+    rate_limit_storage_path: str = os.path.join(tempfile.gettempdir(), "event_ticketing_rate_limit.bin")
+    
+    # Access log (one JSON line per request, written off the event loop)
+    access_log_enabled: bool = True
+    access_log_queue_size: int = 10_000
+    access_log_batch_size: int = 256
+    access_log_flush_interval_seconds: float = 1.0
+    # Fraction of 2xx responses that are logged; other statuses are always logged
+    access_log_success_sample_rate: float = 1.0
+    
+    # Metrics (/metrics in Prometheus text format)
+    metrics_enabled: bool = True
+    # Shared directory where every worker drops its snapshot so any worker can
+    # report totals for the whole server; unset reports the serving worker only
+    metrics_multiprocess_dir: str | None = None
+    metrics_snapshot_interval_seconds: float = 10.0
+    # SQL per request: statements slower than this are logged with their
+    # parameters redacted, and a statement repeated this many times in one
+    # request is reported as a possible N+1. Debug mode also returns the
+    # request's counts in an X-DB-Stats response header.
+    sql_slow_query_ms: float = 200.0
+    sql_repeated_statement_threshold: int = 5
     
     # CORS
     cors_origins: list = ["http://localhost:3000"]
@@ -29,5 +140,6 @@ class Settings(BaseSettings):
     class Config:
         env_file = ".env"
         case_sensitive = False
+        extra = "ignore"
 
 settings = Settings()
\ No newline at end of file
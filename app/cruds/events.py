@@ -1,6 +1,18 @@
+import re
+from datetime import datetime
+from decimal import Decimal
+from sqlalchemy import and_, column, func, literal_column, or_, select, table, text, tuple_, update
+from sqlalchemy.engine import Row
+from sqlalchemy.ext.asyncio import AsyncSession
 from sqlalchemy.orm import Session
 from .. import models, schemas
-from typing import List, Optional
+from ..cache import event_cache
+from ..config import settings
+from . import inventory
+from typing import List, Optional, Sequence, Tuple
+
+# Listing order; keyset pages continue after an (event_date, id) pair
+EVENT_ORDER = (models.Event.event_date, models.Event.id)
 
 def create_event(db: Session, event: schemas.EventCreate, user_id: int) -> models.Event:
     db_event = models.Event(
@@ -9,13 +21,74 @@ def create_event(db: Session, event: schemas.EventCreate, user_id: int) -> model
     )
     db.add(db_event)
     db.commit()
+    event_cache.invalidate()
     db.refresh(db_event)
     return db_event
 
-def get_events(db: Session, skip: int = 0, limit: int = 100) -> List[models.Event]:
-    return db.query(models.Event).filter(
-        models.Event.is_active == True
-    ).offset(skip).limit(limit).all()
+def get_events(
+    db: Session, skip: int = 0, limit: int = 100, after: Optional[Tuple[datetime, int]] = None
+) -> List[models.Event]:
+    query = db.query(models.Event).filter(models.Event.is_active == True)
+    if after is not None:
+        query = query.filter(tuple_(*EVENT_ORDER) > tuple_(*after))
+    return query.order_by(*EVENT_ORDER).offset(skip).limit(limit).all()
+
+def search_terms(query: str) -> List[str]:
+    """Words of a search box query; punctuation is dropped rather than parsed as search syntax"""
+    return re.findall(r"\w+", query)
+
+def text_match(dialect: str, terms: List[str]):
+    """Clause matching events containing every term, the last one as a prefix (type-ahead)
+    
+    Postgres matches against ix_events_search and SQLite against events_fts.
+    Other databases fall back to LIKE, which scans.
+    """
+    if dialect == "postgresql":
+        query = " & ".join(terms[:-1] + [f"{terms[-1]}:*"])
+        document = models.event_search_document(models.Event.title, models.Event.description, models.Event.location)
+        return document.op("@@")(func.to_tsquery(literal_column("'english'::regconfig"), query))
+    if dialect == "sqlite":
+        query = " ".join([f'"{term}"' for term in terms[:-1]] + [f'"{terms[-1]}"*'])
+        matches = select(column("rowid")).select_from(table("events_fts")).where(text("events_fts MATCH :fts_query"))
+        return models.Event.id.in_(matches.params(fts_query=query))
+    return and_(*(
+        or_(models.Event.title.ilike(f"%{term}%"), models.Event.description.ilike(f"%{term}%"),
+            models.Event.location.ilike(f"%{term}%"))
+        for term in terms
+    ))
+
+def event_filters(
+    dialect: str,
+    query: Optional[str] = None,
+    category_id: Optional[int] = None,
+    date_from: Optional[datetime] = None,
+    date_to: Optional[datetime] = None,
+    min_price: Optional[Decimal] = None,
+    max_price: Optional[Decimal] = None,
+) -> list:
+    filters = [models.Event.is_active == True]
+    terms = search_terms(query or "")
+    if terms:
+        filters.append(text_match(dialect, terms))
+    if category_id is not None:
+        filters.append(models.Event.category_id == category_id)
+    if date_from is not None:
+        filters.append(models.Event.event_date >= date_from)
+    if date_to is not None:
+        filters.append(models.Event.event_date <= date_to)
+    if min_price is not None:
+        filters.append(models.Event.price >= min_price)
+    if max_price is not None:
+        filters.append(models.Event.price <= max_price)
+    return filters
+
+def search_events(
+    db: Session, limit: int = 100, after: Optional[Tuple[datetime, int]] = None, **filters
+) -> List[models.Event]:
+    query = db.query(models.Event).filter(*event_filters(db.get_bind().dialect.name, **filters))
+    if after is not None:
+        query = query.filter(tuple_(*EVENT_ORDER) > tuple_(*after))
+    return query.order_by(*EVENT_ORDER).limit(limit).all()
 
 def get_event(db: Session, event_id: int) -> Optional[models.Event]:
     return db.query(models.Event).filter(
@@ -23,15 +96,130 @@ def get_event(db: Session, event_id: int) -> Optional[models.Event]:
         models.Event.is_active == True
     ).first()
 
-def update_tickets_sold(db: Session, event_id: int, increment: int = 1) -> Optional[models.Event]:
+def update_tickets_sold(db: Session, event_id: int, increment: int = 1, held: int = 0) -> Optional[models.Event]:
+    """Count ``increment`` tickets sold for an active event, ``held`` of them from its holds
+    
+    With INVENTORY_SHARDS the sale is counted on one of the event's shards,
+    held tickets on the shards holding them, leaving the event row (which
+    every sale would otherwise lock) alone unless all shards are sold out
+    or the holds were taken on the event row, before it had shards.
+    """
+    if settings.inventory_shards:
+        event = get_event(db, event_id)
+        if event is None:
+            return None
+        on_row = held - (inventory.end_shard_holds(db, event_id, held, sold=True) if held else 0)
+        if on_row:
+            event.tickets_held = models.Event.tickets_held - on_row
+        unheld = increment - held
+        if unheld and not inventory.sell_from_shards(db, event, unheld):
+            on_row += unheld
+        if on_row:
+            event.tickets_sold = models.Event.tickets_sold + on_row
+        db.commit()
+        event_cache.invalidate()
+        return get_event(db, event_id)
+    
     updated = db.query(models.Event).filter(
         models.Event.id == event_id,
         models.Event.is_active == True
     ).update(
-        {models.Event.tickets_sold: models.Event.tickets_sold + increment},
+        {
+            models.Event.tickets_sold: models.Event.tickets_sold + increment,
+            models.Event.tickets_held: models.Event.tickets_held - held
+        },
         synchronize_session="fetch"
     )
     if updated:
         db.commit()
+        event_cache.invalidate()
         return get_event(db, event_id)
-    return None
\ No newline at end of file
+    return None
+
+# Async versions, for async def routes using get_async_db
+
+async def create_event_async(db: AsyncSession, event: schemas.EventCreate, user_id: int) -> models.Event:
+    db_event = models.Event(
+        **event.model_dump(),
+        organizer_id=user_id
+    )
+    db.add(db_event)
+    await db.commit()
+    event_cache.invalidate()
+    await db.refresh(db_event)
+    return db_event
+
+def event_listing(*entities, filters: Optional[Sequence] = None, after: Optional[Tuple[datetime, int]] = None):
+    """Select ``entities`` of the events matching ``filters`` (default: active ones), in listing order after ``after``"""
+    query = select(*entities).where(*(filters if filters is not None else [models.Event.is_active == True]))
+    if after is not None:
+        query = query.where(tuple_(*EVENT_ORDER) > tuple_(*after))
+    return query.order_by(*EVENT_ORDER)
+
+async def get_events_async(
+    db: AsyncSession, skip: int = 0, limit: int = 100, after: Optional[Tuple[datetime, int]] = None
+) -> List[models.Event]:
+    result = await db.scalars(event_listing(models.Event, after=after).offset(skip).limit(limit))
+    return list(result)
+
+async def get_event_rows_async(
+    db: AsyncSession, columns: Sequence, skip: int = 0, limit: int = 100,
+    after: Optional[Tuple[datetime, int]] = None
+) -> List[Row]:
+    """``get_events_async`` selecting only ``columns``, as rows rather than entities"""
+    result = await db.execute(event_listing(*columns, after=after).offset(skip).limit(limit))
+    return list(result)
+
+async def search_events_async(
+    db: AsyncSession, limit: int = 100, after: Optional[Tuple[datetime, int]] = None, **filters
+) -> List[models.Event]:
+    query = event_listing(models.Event, after=after, filters=event_filters(db.get_bind().dialect.name, **filters))
+    result = await db.scalars(query.limit(limit))
+    return list(result)
+
+async def search_event_rows_async(
+    db: AsyncSession, columns: Sequence, limit: int = 100, after: Optional[Tuple[datetime, int]] = None, **filters
+) -> List[Row]:
+    """``search_events_async`` selecting only ``columns``, as rows rather than entities"""
+    query = event_listing(*columns, after=after, filters=event_filters(db.get_bind().dialect.name, **filters))
+    result = await db.execute(query.limit(limit))
+    return list(result)
+
+async def get_event_async(db: AsyncSession, event_id: int) -> Optional[models.Event]:
+    return await db.scalar(
+        select(models.Event).where(
+            models.Event.id == event_id,
+            models.Event.is_active == True
+        )
+    )
+
+async def update_tickets_sold_async(
+    db: AsyncSession, event_id: int, increment: int = 1, held: int = 0
+) -> Optional[models.Event]:
+    if settings.inventory_shards:
+        event = await get_event_async(db, event_id)
+        if event is None:
+            return None
+        on_row = held - (await inventory.end_shard_holds_async(db, event_id, held, sold=True) if held else 0)
+        if on_row:
+            event.tickets_held = models.Event.tickets_held - on_row
+        unheld = increment - held
+        if unheld and not await inventory.sell_from_shards_async(db, event, unheld):
+            on_row += unheld
+        if on_row:
+            event.tickets_sold = models.Event.tickets_sold + on_row
+        await db.commit()
+        event_cache.invalidate()
+        return await db.get(models.Event, event_id, populate_existing=True)
+    
+    result = await db.execute(
+        update(models.Event)
+        .where(models.Event.id == event_id, models.Event.is_active == True)
+        .values(tickets_sold=models.Event.tickets_sold + increment, tickets_held=models.Event.tickets_held - held)
+        .execution_options(synchronize_session="fetch")
+    )
+    if result.rowcount:
+        await db.commit()
+        event_cache.invalidate()
+        return await db.get(models.Event, event_id, populate_existing=True)
+    return None
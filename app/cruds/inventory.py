@@ -0,0 +1,179 @@
+import os
+import random
+from typing import Callable, List
+
+from sqlalchemy import insert, select, update
+from sqlalchemy.exc import IntegrityError
+from sqlalchemy.ext.asyncio import AsyncSession
+from sqlalchemy.orm import Session
+from .. import models
+from ..config import settings
+
+# Sharded inventory: sales and ticket holds claim a shard row of the event
+# instead of locking the event row. Holds are interchangeable, so ending one
+# takes it off whichever shard has one. None of these functions commit;
+# update_tickets_sold and the payment hold functions do.
+
+Shard = models.EventInventoryShard
+
+def pick_shard(shards: int) -> int:
+    """The shard a sale tries first: random, or fixed per worker process"""
+    if settings.inventory_shard_choice == "worker":
+        return os.getpid() % shards
+    return random.randrange(shards)
+
+def split_allotment(available: int, shards: int) -> List[int]:
+    """``available`` tickets spread as evenly as possible over ``shards``"""
+    base, extra = divmod(max(available, 0), shards)
+    return [base + (1 if shard < extra else 0) for shard in range(shards)]
+
+def claim(event_id: int, shard: int, count: int):
+    """Sell ``count`` from one shard if its allotment allows; matches no row otherwise"""
+    return (
+        update(Shard)
+        .where(Shard.event_id == event_id, Shard.shard == shard, Shard.sold + Shard.held + count <= Shard.allotment)
+        .values(sold=Shard.sold + count)
+        .execution_options(synchronize_session=False)
+    )
+
+def claim_hold(event_id: int, shard: int, count: int):
+    """Hold ``count`` on one shard if its allotment allows; matches no row otherwise"""
+    return (
+        update(Shard)
+        .where(Shard.event_id == event_id, Shard.shard == shard, Shard.sold + Shard.held + count <= Shard.allotment)
+        .values(held=Shard.held + count)
+        .execution_options(synchronize_session=False)
+    )
+
+def unhold(event_id: int, shard: int, count: int, sold: bool):
+    """End ``count`` holds on one shard, selling them when ``sold``; matches no row unless it has that many"""
+    values = {Shard.held: Shard.held - count}
+    if sold:
+        values[Shard.sold] = Shard.sold + count
+    return (
+        update(Shard)
+        .where(Shard.event_id == event_id, Shard.shard == shard, Shard.held >= count)
+        .values(values)
+        .execution_options(synchronize_session=False)
+    )
+
+def shard_rows(event_id: int):
+    """The event's shards, locked and reloaded, for rebalancing"""
+    return (
+        select(Shard).where(Shard.event_id == event_id).order_by(Shard.shard)
+        .with_for_update().execution_options(populate_existing=True)
+    )
+
+def rebalance(shards: List[models.EventInventoryShard]) -> int:
+    """Spread the allotment locked shard rows have neither sold nor held evenly; returns how much there was"""
+    spare = sum(shard.allotment - shard.sold - shard.held for shard in shards)
+    for shard, share in zip(shards, split_allotment(spare, len(shards))):
+        shard.allotment = shard.sold + shard.held + share
+    return spare
+
+def take_holds(shards: List[models.EventInventoryShard], count: int, sold: bool) -> int:
+    """End up to ``count`` holds on locked shard rows, selling them when ``sold``; returns how many"""
+    ended = 0
+    for shard in shards:
+        take = min(shard.held, count - ended)
+        shard.held -= take
+        if sold:
+            shard.sold += take
+        ended += take
+    return ended
+
+def create_shards(db: Session, event: models.Event, shards: int) -> None:
+    """Split the event's capacity left after the event row's sales and holds over ``shards`` rows, unless another worker just did"""
+    available = event.capacity - event.tickets_sold - event.tickets_held
+    try:
+        with db.begin_nested():
+            db.execute(insert(Shard), [
+                {"event_id": event.id, "shard": shard, "allotment": allotment, "sold": 0}
+                for shard, allotment in enumerate(split_allotment(available, shards))
+            ])
+    except IntegrityError:
+        pass
+
+def claim_from_shards(db: Session, event: models.Event, count: int, statement: Callable = claim) -> bool:
+    """Claim ``count`` tickets on one of the event's shards with ``statement`` (``claim`` or ``claim_hold``)
+
+    Tries the picked shard; when it is dry, creates the event's shards if
+    it has none yet, or rebalances them, and tries again, then every shard
+    in turn. False when no shard has ``count`` left (sold out).
+    """
+    first = pick_shard(settings.inventory_shards)
+    if db.execute(statement(event.id, first, count)).rowcount:
+        return True
+    shards = list(db.scalars(shard_rows(event.id)))
+    if not shards:
+        create_shards(db, event, settings.inventory_shards)
+    elif rebalance(shards) < count:
+        return False
+    db.flush()
+    total = len(shards) or settings.inventory_shards
+    for offset in range(total):
+        if db.execute(statement(event.id, (first + offset) % total, count)).rowcount:
+            return True
+    return False
+
+def sell_from_shards(db: Session, event: models.Event, count: int = 1) -> bool:
+    """Count a sale of ``count`` tickets on one of the event's shards; False when they are sold out"""
+    return claim_from_shards(db, event, count, claim)
+
+def hold_on_shards(db: Session, event: models.Event, count: int = 1) -> bool:
+    """Hold ``count`` tickets on one of the event's shards; False when they are sold out"""
+    return claim_from_shards(db, event, count, claim_hold)
+
+def end_shard_holds(db: Session, event_id: int, count: int = 1, sold: bool = False) -> int:
+    """End up to ``count`` of the event's holds on its shards, selling them when ``sold``; returns how many
+
+    Holds taken on the event row, before the event had shards, are not
+    counted here; the caller ends the rest there.
+    """
+    if db.execute(unhold(event_id, pick_shard(settings.inventory_shards), count, sold)).rowcount:
+        return count
+    ended = take_holds(list(db.scalars(shard_rows(event_id))), count, sold)
+    db.flush()
+    return ended
+
+# Async versions, for async def routes using get_async_db
+
+async def create_shards_async(db: AsyncSession, event: models.Event, shards: int) -> None:
+    available = event.capacity - event.tickets_sold - event.tickets_held
+    try:
+        async with db.begin_nested():
+            await db.execute(insert(Shard), [
+                {"event_id": event.id, "shard": shard, "allotment": allotment, "sold": 0}
+                for shard, allotment in enumerate(split_allotment(available, shards))
+            ])
+    except IntegrityError:
+        pass
+
+async def claim_from_shards_async(db: AsyncSession, event: models.Event, count: int, statement: Callable = claim) -> bool:
+    first = pick_shard(settings.inventory_shards)
+    if (await db.execute(statement(event.id, first, count))).rowcount:
+        return True
+    shards = list(await db.scalars(shard_rows(event.id)))
+    if not shards:
+        await create_shards_async(db, event, settings.inventory_shards)
+    elif rebalance(shards) < count:
+        return False
+    await db.flush()
+    total = len(shards) or settings.inventory_shards
+    for offset in range(total):
+        if (await db.execute(statement(event.id, (first + offset) % total, count))).rowcount:
+            return True
+    return False
+
+async def sell_from_shards_async(db: AsyncSession, event: models.Event, count: int = 1) -> bool:
+    return await claim_from_shards_async(db, event, count, claim)
+
+async def hold_on_shards_async(db: AsyncSession, event: models.Event, count: int = 1) -> bool:
+    return await claim_from_shards_async(db, event, count, claim_hold)
+
+async def end_shard_holds_async(db: AsyncSession, event_id: int, count: int = 1, sold: bool = False) -> int:
+    if (await db.execute(unhold(event_id, pick_shard(settings.inventory_shards), count, sold))).rowcount:
+        return count
+    ended = take_holds(list(await db.scalars(shard_rows(event_id))), count, sold)
+    await db.flush()
+    return ended
@@ -1,6 +1,92 @@
+import hashlib
+import itertools
+from collections import Counter
+from datetime import datetime, timedelta, timezone
+from sqlalchemy import select, update
+from sqlalchemy.ext.asyncio import AsyncSession
 from sqlalchemy.orm import Session
 from .. import models
-from typing import Optional
+from ..config import settings
+from . import inventory
+from typing import Optional, cast
+
+# Ticket holds: starting a payment reserves a ticket by incrementing
+# events.tickets_held in the same conditional UPDATE that checks capacity,
+# so checkouts beyond capacity are refused before Paystack is called. With
+# INVENTORY_SHARDS the hold is claimed on one of the event's shards instead,
+# like a sale, so neither checkouts nor verifications lock the event row.
+# The hold ends when the payment is verified (the ticket is sold), fails, or
+# passes hold_expires_at and is swept by expire_holds.
+
+def hold_tickets(event_id: int, count: int = 1):
+    """Hold ``count`` tickets of an active event if that many are neither sold nor held; matches no row otherwise"""
+    event = models.Event
+    return (
+        update(event)
+        .where(
+            event.id == event_id,
+            event.is_active == True,
+            event.tickets_sold_total + event.tickets_held_total + count <= event.capacity
+        )
+        .values(tickets_held=event.tickets_held + count)
+        .execution_options(synchronize_session=False)
+    )
+
+def release_tickets(event_id: int, count: int = 1):
+    return (
+        update(models.Event)
+        .where(models.Event.id == event_id)
+        .values(tickets_held=models.Event.tickets_held - count)
+        .execution_options(synchronize_session=False)
+    )
+
+def hold_event_tickets(db: Session, event_id: int, count: int = 1) -> bool:
+    """Hold ``count`` tickets of an active event if that many are left; not committed"""
+    if settings.inventory_shards:
+        event = db.scalar(select(models.Event).where(models.Event.id == event_id, models.Event.is_active == True))
+        return event is not None and inventory.hold_on_shards(db, event, count)
+    return bool(db.execute(hold_tickets(event_id, count)).rowcount)
+
+def release_event_tickets(db: Session, event_id: int, count: int = 1) -> None:
+    """Give back ``count`` held tickets, taken off the event's shards first; not committed"""
+    if settings.inventory_shards:
+        count -= inventory.end_shard_holds(db, event_id, count)
+    if count:
+        db.execute(release_tickets(event_id, count))
+
+def end_hold(reference: str, status: str):
+    """Clear a pending payment's hold and set its ``status``; returns its event id only if it had a hold"""
+    payment = models.Payment
+    return (
+        update(payment)
+        .where(payment.paystack_reference == reference, payment.status == 'pending', payment.hold_expires_at.is_not(None))
+        .values(status=status, hold_expires_at=None)
+        .returning(payment.event_id)
+        .execution_options(synchronize_session=False)
+    )
+
+def reopen(reference: str):
+    """Mark an expired or failed payment paid, for a late successful verification"""
+    payment = models.Payment
+    return (
+        update(payment)
+        .where(payment.paystack_reference == reference, payment.status.in_(('expired', 'failed')))
+        .values(status='success')
+        .execution_options(synchronize_session=False)
+    )
+
+def sell_unheld(reference: str):
+    """Mark a pending payment that never held a ticket (from before holds existed) paid"""
+    payment = models.Payment
+    return (
+        update(payment)
+        .where(payment.paystack_reference == reference, payment.status == 'pending', payment.hold_expires_at.is_(None))
+        .values(status='success')
+        .execution_options(synchronize_session=False)
+    )
+
+# convert_hold's result when another verification has already sold the payment
+HOLD_USED = -1
 
 def create_payment(
     db: Session,
@@ -23,6 +109,106 @@ def create_payment(
     db.refresh(db_payment)
     return db_payment
 
+def reserve_payment(
+    db: Session,
+    user_id: int,
+    event_id: int,
+    reference: str,
+    amount: float,
+    hold_seconds: int
+) -> Optional[models.Payment]:
+    """Hold a ticket for a new pending payment; None when the event has none left"""
+    if not hold_event_tickets(db, event_id):
+        db.rollback()
+        return None
+    db_payment = models.Payment(
+        user_id=user_id,
+        event_id=event_id,
+        paystack_reference=reference,
+        amount=amount,
+        status='pending',
+        hold_expires_at=datetime.now(timezone.utc) + timedelta(seconds=hold_seconds)
+    )
+    db.add(db_payment)
+    db.commit()
+    db.refresh(db_payment)
+    return db_payment
+
+def set_access_code(db: Session, payment: models.Payment, access_code: str) -> None:
+    setattr(payment, "paystack_access_code", access_code)
+    db.commit()
+
+def release_hold(db: Session, reference: str, status: str):
+    """Set a payment's ``status``, giving back the ticket it held if it still held one"""
+    event_id = db.scalar(end_hold(reference, status))
+    if event_id is not None:
+        release_event_tickets(db, event_id)
+        db.commit()
+    return update_payment_status(db, reference, status)
+
+def convert_hold(db: Session, payment: models.Payment) -> Optional[int]:
+    """Use up a payment's hold for its sale, in the open transaction (not committed)
+
+    Returns the held tickets the sale accounts for, to pass to
+    update_tickets_sold: 1 when the hold was live, 0 for a payment started
+    before holds existed, which is counted as it always was. A payment whose
+    hold expired or failed takes a ticket again if one is left; None when
+    none is, after rolling back. Each case marks the payment paid in the
+    same conditional UPDATE, so of two concurrent verifications the second
+    matches nothing and gets HOLD_USED.
+    """
+    reference = cast(str, getattr(payment, "paystack_reference"))
+    if db.scalar(end_hold(reference, 'success')) is not None:
+        return 1
+    if db.execute(sell_unheld(reference)).rowcount:
+        return 0
+    if not db.execute(reopen(reference)).rowcount:
+        return HOLD_USED
+    if hold_event_tickets(db, cast(int, getattr(payment, "event_id"))):
+        return 1
+    db.rollback()
+    return None
+
+def expire_holds(db: Session, limit: int = 500, now: Optional[datetime] = None) -> int:
+    """Release up to ``limit`` holds past their expiry; returns how many"""
+    now = now or datetime.now(timezone.utc)
+    payment = models.Payment
+    expired = (
+        select(payment.id)
+        .where(payment.status == 'pending', payment.hold_expires_at <= now)
+        .order_by(payment.hold_expires_at)
+        .limit(limit)
+    )
+    event_ids = db.scalars(
+        update(payment)
+        .where(payment.id.in_(expired), payment.status == 'pending', payment.hold_expires_at <= now)
+        .values(status='expired', hold_expires_at=None)
+        .returning(payment.event_id)
+        .execution_options(synchronize_session=False)
+    ).all()
+    # Events in id order, so concurrent sweepers lock them in the same order
+    for event_id, count in sorted(Counter(event_ids).items()):
+        release_event_tickets(db, event_id, count)
+    db.commit()
+    return len(event_ids)
+
+def queue_checkout_reference(db: Session, place_key: str) -> Optional[str]:
+    """Reference for the next checkout of a waiting-room place; None while one is pending or paid
+
+    Each attempt has its own numbered reference, so the unique reference
+    column lets only one of two concurrent checkouts of a place through, on
+    any worker. A failed or expired attempt can be followed by another.
+    """
+    prefix = f"TXN-Q{hashlib.blake2b(place_key.encode(), digest_size=15).hexdigest().upper()}"
+    for attempt in itertools.count():
+        reference = f"{prefix}-{attempt}"
+        payment = get_payment_by_reference(db, reference)
+        if payment is None:
+            return reference
+        if getattr(payment, "status") not in ('failed', 'expired'):
+            return None
+    return None
+
 def get_payment_by_reference(db: Session, reference: str) -> Optional[models.Payment]:
     return db.query(models.Payment).filter(
         models.Payment.paystack_reference == reference
@@ -36,4 +222,96 @@ def update_payment_status(db: Session, reference: str, status: str, ticket_id: O
             setattr(payment, "ticket_id", ticket_id)
         db.commit()
         db.refresh(payment)
-    return payment
\ No newline at end of file
+    return payment
+
+# Async versions, for async def routes using get_async_db
+
+async def create_payment_async(
+    db: AsyncSession,
+    user_id: int,
+    event_id: int,
+    reference: str,
+    amount: float,
+    access_code: str
+) -> models.Payment:
+    db_payment = models.Payment(
+        user_id=user_id,
+        event_id=event_id,
+        paystack_reference=reference,
+        paystack_access_code=access_code,
+        amount=amount,
+        status='pending'
+    )
+    db.add(db_payment)
+    await db.commit()
+    await db.refresh(db_payment)
+    return db_payment
+
+async def hold_event_tickets_async(db: AsyncSession, event_id: int, count: int = 1) -> bool:
+    if settings.inventory_shards:
+        event = await db.scalar(select(models.Event).where(models.Event.id == event_id, models.Event.is_active == True))
+        return event is not None and await inventory.hold_on_shards_async(db, event, count)
+    return bool((await db.execute(hold_tickets(event_id, count))).rowcount)
+
+async def release_event_tickets_async(db: AsyncSession, event_id: int, count: int = 1) -> None:
+    if settings.inventory_shards:
+        count -= await inventory.end_shard_holds_async(db, event_id, count)
+    if count:
+        await db.execute(release_tickets(event_id, count))
+
+async def reserve_payment_async(
+    db: AsyncSession,
+    user_id: int,
+    event_id: int,
+    reference: str,
+    amount: float,
+    hold_seconds: int
+) -> Optional[models.Payment]:
+    if not await hold_event_tickets_async(db, event_id):
+        await db.rollback()
+        return None
+    db_payment = models.Payment(
+        user_id=user_id,
+        event_id=event_id,
+        paystack_reference=reference,
+        amount=amount,
+        status='pending',
+        hold_expires_at=datetime.now(timezone.utc) + timedelta(seconds=hold_seconds)
+    )
+    db.add(db_payment)
+    await db.commit()
+    await db.refresh(db_payment)
+    return db_payment
+
+async def release_hold_async(db: AsyncSession, reference: str, status: str):
+    event_id = await db.scalar(end_hold(reference, status))
+    if event_id is not None:
+        await release_event_tickets_async(db, event_id)
+        await db.commit()
+    return await update_payment_status_async(db, reference, status)
+
+async def convert_hold_async(db: AsyncSession, payment: models.Payment) -> Optional[int]:
+    reference = cast(str, getattr(payment, "paystack_reference"))
+    if await db.scalar(end_hold(reference, 'success')) is not None:
+        return 1
+    if (await db.execute(sell_unheld(reference))).rowcount:
+        return 0
+    if not (await db.execute(reopen(reference))).rowcount:
+        return HOLD_USED
+    if await hold_event_tickets_async(db, cast(int, getattr(payment, "event_id"))):
+        return 1
+    await db.rollback()
+    return None
+
+async def get_payment_by_reference_async(db: AsyncSession, reference: str) -> Optional[models.Payment]:
+    return await db.scalar(select(models.Payment).where(models.Payment.paystack_reference == reference))
+
+async def update_payment_status_async(db: AsyncSession, reference: str, status: str, ticket_id: Optional[int] = None):
+    payment = await get_payment_by_reference_async(db, reference)
+    if payment:
+        setattr(payment, "status", status)
+        if ticket_id is not None:
+            setattr(payment, "ticket_id", ticket_id)
+        await db.commit()
+        await db.refresh(payment)
+    return payment
@@ -0,0 +1,161 @@
+from datetime import datetime, timedelta, timezone
+from typing import List, Optional, Tuple
+
+from sqlalchemy import delete, insert, or_, select, tuple_, update
+from sqlalchemy.exc import IntegrityError
+from sqlalchemy.ext.asyncio import AsyncSession
+from sqlalchemy.orm import Session, selectinload
+from .. import models, schemas
+from ..seating import EventSeats, SeatMap, seating
+
+# Reserved seating. Holding seats inserts event_seats rows, whose primary key
+# lets only one buyer have a seat, whichever worker they are on. The search
+# for which seats to ask for runs on the worker's bitsets (app.seating).
+
+Seat = models.EventSeat
+
+def seat_layout(venue_id: int):
+    """(section, row label, seats) of a venue, best section and front row first"""
+    return (
+        select(models.VenueSection.name, models.VenueRow.label, models.VenueRow.seats)
+        .join(models.VenueRow, models.VenueRow.section_id == models.VenueSection.id)
+        .where(models.VenueSection.venue_id == venue_id)
+        .order_by(models.VenueSection.position, models.VenueRow.position)
+    )
+
+def build_seat_map(layout) -> SeatMap:
+    sections: List[Tuple[str, List[Tuple[str, int]]]] = []
+    for section, label, seats in layout:
+        if not sections or sections[-1][0] != section:
+            sections.append((section, []))
+        sections[-1][1].append((label, seats))
+    return SeatMap(sections)
+
+def taken_seats(event_id: int, now: datetime):
+    """Seat numbers of an event that are sold or held by an unexpired hold"""
+    return select(Seat.seat_number).where(
+        Seat.event_id == event_id, or_(Seat.status == 'sold', Seat.hold_expires_at > now)
+    )
+
+def attach_seat(
+    db: Session, event_id: int, seat_number: str, user_id: int, reference: str, expires_at: datetime
+) -> bool:
+    """Tie a seat the user holds to their payment, until the payment's own hold ends; not committed"""
+    return bool(db.execute(
+        update(Seat)
+        .where(
+            Seat.event_id == event_id, Seat.seat_number == seat_number, Seat.user_id == user_id,
+            Seat.status == 'held', Seat.payment_reference.is_(None), Seat.hold_expires_at > datetime.now(timezone.utc)
+        )
+        .values(payment_reference=reference, hold_expires_at=expires_at)
+        .execution_options(synchronize_session=False)
+    ).rowcount)
+
+def release_seat(db: Session, reference: str) -> None:
+    """Free the seat held for a payment that failed"""
+    released = db.execute(
+        delete(Seat).where(Seat.payment_reference == reference, Seat.status == 'held')
+        .returning(Seat.event_id, Seat.seat_number)
+    ).all()
+    db.commit()
+    for event_id, seat_number in released:
+        state = seating.events.get(event_id)
+        if state is not None:
+            with state.lock:
+                state.release([seat_number])
+
+def sell_seat(db: Session, reference: str) -> Optional[str]:
+    """Mark the seat held for a paid payment sold; its seat number, or None if the hold was swept. Not committed"""
+    return db.scalar(
+        update(Seat).where(Seat.payment_reference == reference, Seat.status == 'held')
+        .values(status='sold', hold_expires_at=None)
+        .returning(Seat.seat_number)
+        .execution_options(synchronize_session=False)
+    )
+
+def expire_seat_holds(db: Session, limit: int = 500, now: Optional[datetime] = None) -> int:
+    """Delete up to ``limit`` seat holds past their expiry; returns how many"""
+    now = now or datetime.now(timezone.utc)
+    expired = (
+        select(Seat.event_id, Seat.seat_number)
+        .where(Seat.status == 'held', Seat.hold_expires_at <= now)
+        .order_by(Seat.hold_expires_at)
+        .limit(limit)
+    )
+    deleted = db.execute(
+        delete(Seat).where(tuple_(Seat.event_id, Seat.seat_number).in_(expired), Seat.status == 'held', Seat.hold_expires_at <= now)
+    ).rowcount
+    db.commit()
+    return deleted
+
+# Async versions, for async def routes using get_async_db
+
+async def create_venue_async(db: AsyncSession, venue: schemas.VenueCreate, user_id: int) -> models.Venue:
+    db_venue = models.Venue(name=venue.name, owner_id=user_id, sections=[
+        models.VenueSection(name=section.name, position=position, rows=[
+            models.VenueRow(label=row.label, seats=row.seats, position=row_position)
+            for row_position, row in enumerate(section.rows)
+        ])
+        for position, section in enumerate(venue.sections)
+    ])
+    db.add(db_venue)
+    await db.commit()
+    return await get_venue_async(db, db_venue.id)
+
+async def get_venue_async(db: AsyncSession, venue_id: int) -> Optional[models.Venue]:
+    return await db.scalar(
+        select(models.Venue).where(models.Venue.id == venue_id)
+        .options(selectinload(models.Venue.sections).selectinload(models.VenueSection.rows))
+        .execution_options(populate_existing=True)
+    )
+
+async def event_seats_async(db: AsyncSession, event_id: int, venue_id: Optional[int]) -> Optional[EventSeats]:
+    """This worker's view of a reserved-seating event's seats, loaded when missing or stale"""
+    if venue_id is None:
+        return None
+    state = seating.events.get(event_id)
+    if state is None:
+        seat_map = seating.maps.get(venue_id)
+        if seat_map is None:
+            seat_map = build_seat_map((await db.execute(seat_layout(venue_id))).all())
+            seating.maps.set(venue_id, seat_map)
+        state = EventSeats(seat_map, await db.scalars(taken_seats(event_id, datetime.now(timezone.utc))))
+        seating.events.set(event_id, state)
+    return state
+
+async def hold_seats_async(
+    db: AsyncSession, event_id: int, venue_id: int, user_id: int, count: int, section: Optional[str],
+    hold_seconds: int, attempts: int = 5
+) -> Optional[Tuple[List[str], datetime]]:
+    """Hold the best ``count`` adjacent seats for the user; None when no such block is free
+
+    The block is picked on this worker's bitsets and then inserted. When
+    another worker holds one of its seats first, the insert fails and the
+    search runs again on freshly loaded availability.
+    """
+    for _ in range(attempts):
+        state = await event_seats_async(db, event_id, venue_id)
+        if state is None:
+            return None
+        with state.lock:
+            seats = state.best_available(count, section)
+            if seats is None:
+                return None
+            state.take(seats)
+        now = datetime.now(timezone.utc)
+        expires_at = now + timedelta(seconds=hold_seconds)
+        try:
+            # Expired holds on these seats are not swept yet but no longer count
+            await db.execute(delete(Seat).where(
+                Seat.event_id == event_id, Seat.seat_number.in_(seats), Seat.status == 'held', Seat.hold_expires_at <= now
+            ))
+            await db.execute(insert(Seat), [
+                {"event_id": event_id, "seat_number": seat, "status": 'held', "user_id": user_id, "hold_expires_at": expires_at}
+                for seat in seats
+            ])
+            await db.commit()
+            return seats, expires_at
+        except IntegrityError:
+            await db.rollback()
+            seating.forget(event_id)
+    return None
@@ -1,6 +1,9 @@
+from sqlalchemy import select
+from sqlalchemy.engine import Row
+from sqlalchemy.ext.asyncio import AsyncSession
 from sqlalchemy.orm import Session
 from .. import models
-from typing import List, Optional
+from typing import AsyncIterator, List, Optional, Sequence
 import secrets
 
 def generate_ticket_code() -> str:
@@ -10,7 +13,8 @@ def create_ticket(
     db: Session,
     user_id: int,
     event_id: int,
-    amount: float
+    amount: float,
+    seat_number: Optional[str] = None
 ) -> models.Ticket:
     ticket_code = generate_ticket_code()
     
@@ -19,6 +23,7 @@ def create_ticket(
         event_id=event_id,
         ticket_code=ticket_code,
         amount_paid=amount,
+        seat_number=seat_number,
         status='active'
     )
     db.add(db_ticket)
@@ -34,4 +39,56 @@ def get_user_tickets(db: Session, user_id: int) -> List[models.Ticket]:
 def get_ticket_by_code(db: Session, ticket_code: str) -> Optional[models.Ticket]:
     return db.query(models.Ticket).filter(
         models.Ticket.ticket_code == ticket_code
-    ).first()
\ No newline at end of file
+    ).first()
+
+# Async versions, for async def routes using get_async_db
+
+async def create_ticket_async(
+    db: AsyncSession,
+    user_id: int,
+    event_id: int,
+    amount: float
+) -> models.Ticket:
+    db_ticket = models.Ticket(
+        user_id=user_id,
+        event_id=event_id,
+        ticket_code=generate_ticket_code(),
+        amount_paid=amount,
+        status='active'
+    )
+    db.add(db_ticket)
+    await db.commit()
+    await db.refresh(db_ticket)
+    return db_ticket
+
+async def get_user_tickets_async(db: AsyncSession, user_id: int) -> List[models.Ticket]:
+    result = await db.scalars(select(models.Ticket).where(models.Ticket.user_id == user_id))
+    return list(result)
+
+async def get_user_ticket_rows_async(db: AsyncSession, user_id: int, columns: Sequence) -> List[Row]:
+    """``get_user_tickets_async`` selecting only ``columns``, as rows rather than entities"""
+    result = await db.execute(select(*columns).where(models.Ticket.user_id == user_id))
+    return list(result)
+
+async def stream_event_attendees_async(
+    db: AsyncSession, event_id: int, columns: Sequence, batch_size: int = 1000
+) -> AsyncIterator[Sequence[Row]]:
+    """Batches of ``columns`` for every ticket of an event, joined to its holder and payment
+    
+    The rows are streamed (a server-side cursor on Postgres) ``batch_size``
+    at a time, so memory does not grow with the number of tickets.
+    """
+    query = (
+        select(*columns)
+        .join(models.User, models.User.id == models.Ticket.user_id)
+        .outerjoin(models.Payment, models.Payment.ticket_id == models.Ticket.id)
+        .where(models.Ticket.event_id == event_id)
+        .order_by(models.Ticket.id)
+        .execution_options(yield_per=batch_size)
+    )
+    result = await db.stream(query)
+    async for batch in result.partitions():
+        yield batch
+
+async def get_ticket_by_code_async(db: AsyncSession, ticket_code: str) -> Optional[models.Ticket]:
+    return await db.scalar(select(models.Ticket).where(models.Ticket.ticket_code == ticket_code))
@@ -1,8 +1,12 @@
+from sqlalchemy import select
+from sqlalchemy.ext.asyncio import AsyncSession
 from sqlalchemy.orm import Session
 from sqlalchemy.exc import IntegrityError
 from .. import models, schemas
-from ..security import hash_password, verify_password
-from typing import Optional
+from ..cache import principal_cache
+from ..revocation import revocations
+from ..security import hash_password, verify_and_update_password
+from typing import List, Optional
 
 def get_user(db: Session, user_id: int) -> Optional[models.User]:
     """Get a user by ID.
@@ -41,12 +45,15 @@ def get_users(db: Session, skip: int = 0, limit: int = 100):
     """
     return db.query(models.User).offset(skip).limit(limit).all()
 
-def create_user(db: Session, user: schemas.UserCreate) -> models.User:
+def create_user(db: Session, user: schemas.UserCreate, password_hash: Optional[str] = None) -> models.User:
     """Create a new user with bcrypt hashing.
 
     Args:
         db (Session): The database session.
         user (schemas.UserCreate): The user data.
+        password_hash (Optional[str], optional): A bcrypt hash of the password
+            computed elsewhere (e.g. on the hashing pool). Defaults to hashing
+            the password inline.
 
     Raises:
         ValueError: If the email is already registered.
@@ -59,7 +66,7 @@ def create_user(db: Session, user: schemas.UserCreate) -> models.User:
     if existing_user:
         raise ValueError("Email already registered")
     
-    hashed_password = hash_password(user.password)
+    hashed_password = password_hash or hash_password(user.password)
 
     db_user = models.User(email=user.email, name=user.name, password_hash=hashed_password)
 
@@ -80,13 +87,55 @@ def authenticate_user(db: Session, email: str, password: str) -> Optional[models
         email (str): The user's email.
         password (str): The user's password.
 
+    A stored hash whose bcrypt cost differs from the current policy is
+    replaced with a fresh hash once the password has been verified.
+
     Returns:
         Optional[models.User]: The authenticated user if credentials are valid, None otherwise.
     """
     user = get_user_by_email(db, email)
-    if user and verify_password(password, str(user.password_hash)) and user.is_active is True:
-        return user
-    return None
+    if not user or user.is_active is not True:
+        return None
+    verified, new_hash = verify_and_update_password(password, str(user.password_hash))
+    if not verified:
+        return None
+    if new_hash:
+        update_password_hash(db, user, new_hash)
+    return user
+
+def update_password_hash(db: Session, db_user: models.User, password_hash: str) -> models.User:
+    """Store a new password hash for a user, e.g. after a bcrypt cost change.
+
+    Args:
+        db (Session): The database session.
+        db_user (models.User): The user whose hash is replaced.
+        password_hash (str): The new bcrypt hash.
+
+    Returns:
+        models.User: The updated user.
+    """
+    db_user.password_hash = password_hash
+    db.commit()
+    db.refresh(db_user)
+    return db_user
+
+def revoke_user_tokens(db: Session, db_user: models.User) -> models.User:
+    """Invalidate every token issued to a user so far.
+
+    Args:
+        db (Session): The database session.
+        db_user (models.User): The user whose tokens are revoked.
+
+    Returns:
+        models.User: The user with its new token version.
+    """
+    db_user.token_version = (db_user.token_version or 0) + 1
+    revocations.record(db, db_user.id, db_user.token_version)
+    db.commit()
+    db.refresh(db_user)
+    revocations.revoke(db_user.id, db_user.token_version)
+    principal_cache.invalidate_user(db_user.id)
+    return db_user
 
 def update_user(db: Session, user_id: int, user_update: schemas.UserUpdate) -> Optional[models.User]:
     """Update an existing user.
@@ -107,13 +156,23 @@ def update_user(db: Session, user_id: int, user_update: schemas.UserUpdate) -> O
     for field, value in update_data.items():
         setattr(db_user, field, value)
     
+    # Tokens carry the email and active flag, and a new password must end old sessions
+    revoke = bool(update_data.keys() & {"email", "password", "is_active"})
+    if revoke:
+        db_user.token_version = (db_user.token_version or 0) + 1
+        revocations.record(db, user_id, db_user.token_version)
+    
     try:
         db.commit()
         db.refresh(db_user)
+        if revoke:
+            revocations.revoke(user_id, db_user.token_version)
         return db_user
     except IntegrityError:
         db.rollback()
-        raise ValueError("Update Failed!")    
+        raise ValueError("Update Failed!")
+    finally:
+        principal_cache.invalidate_user(user_id)    
     
 def delete_user(db: Session, user_id: int) -> bool:
     """Delete a user by ID.
@@ -128,10 +187,112 @@ def delete_user(db: Session, user_id: int) -> bool:
     db_user = get_user(db, user_id)
     if not db_user:
         return False
+    token_version = (db_user.token_version or 0) + 1
     try:
+        revocations.record(db, user_id, token_version)
         db.delete(db_user)
         db.commit()
+        revocations.revoke(user_id, token_version)
+        principal_cache.invalidate_user(user_id)
         return True  
     except IntegrityError:
         db.rollback()
-        return False  
\ No newline at end of file
+        return False  
+
+# Async versions, for async def routes using get_async_db
+
+async def get_user_async(db: AsyncSession, user_id: int) -> Optional[models.User]:
+    """Async version of ``get_user``."""
+    return await db.scalar(select(models.User).where(models.User.id == user_id))
+
+async def get_user_by_email_async(db: AsyncSession, email: str) -> Optional[models.User]:
+    """Async version of ``get_user_by_email``."""
+    return await db.scalar(select(models.User).where(models.User.email == email))
+
+async def get_users_async(db: AsyncSession, skip: int = 0, limit: int = 100) -> List[models.User]:
+    """Async version of ``get_users``."""
+    result = await db.scalars(select(models.User).offset(skip).limit(limit))
+    return list(result)
+
+async def create_user_async(db: AsyncSession, user: schemas.UserCreate, password_hash: str) -> models.User:
+    """Async version of ``create_user``.
+
+    The hash must be computed beforehand (see ``security.password_hasher``),
+    since hashing inline would block the event loop.
+
+    Raises:
+        ValueError: If the email is already registered.
+    """
+    if await get_user_by_email_async(db, user.email):
+        raise ValueError("Email already registered")
+
+    db_user = models.User(email=user.email, name=user.name, password_hash=password_hash)
+    try:
+        db.add(db_user)
+        await db.commit()
+        await db.refresh(db_user)
+        return db_user
+    except IntegrityError:
+        await db.rollback()
+        raise ValueError("Email already registered")
+
+async def update_password_hash_async(db: AsyncSession, db_user: models.User, password_hash: str) -> models.User:
+    """Async version of ``update_password_hash``."""
+    db_user.password_hash = password_hash
+    await db.commit()
+    await db.refresh(db_user)
+    return db_user
+
+async def revoke_user_tokens_async(db: AsyncSession, db_user: models.User) -> models.User:
+    """Async version of ``revoke_user_tokens``."""
+    db_user.token_version = (db_user.token_version or 0) + 1
+    revocations.record(db, db_user.id, db_user.token_version)
+    await db.commit()
+    await db.refresh(db_user)
+    revocations.revoke(db_user.id, db_user.token_version)
+    principal_cache.invalidate_user(db_user.id)
+    return db_user
+
+async def update_user_async(db: AsyncSession, user_id: int, user_update: schemas.UserUpdate) -> Optional[models.User]:
+    """Async version of ``update_user``."""
+    db_user = await get_user_async(db, user_id)
+    if not db_user:
+        return None
+    
+    update_data = user_update.model_dump(exclude_unset=True)
+    for field, value in update_data.items():
+        setattr(db_user, field, value)
+    
+    revoke = bool(update_data.keys() & {"email", "password", "is_active"})
+    if revoke:
+        db_user.token_version = (db_user.token_version or 0) + 1
+        revocations.record(db, user_id, db_user.token_version)
+    
+    try:
+        await db.commit()
+        await db.refresh(db_user)
+        if revoke:
+            revocations.revoke(user_id, db_user.token_version)
+        return db_user
+    except IntegrityError:
+        await db.rollback()
+        raise ValueError("Update Failed!")
+    finally:
+        principal_cache.invalidate_user(user_id)
+
+async def delete_user_async(db: AsyncSession, user_id: int) -> bool:
+    """Async version of ``delete_user``."""
+    db_user = await get_user_async(db, user_id)
+    if not db_user:
+        return False
+    token_version = (db_user.token_version or 0) + 1
+    try:
+        revocations.record(db, user_id, token_version)
+        await db.delete(db_user)
+        await db.commit()
+        revocations.revoke(user_id, token_version)
+        principal_cache.invalidate_user(user_id)
+        return True
+    except IntegrityError:
+        await db.rollback()
+        return False
@@ -1,7 +1,13 @@
 from sqlalchemy import create_engine
+from sqlalchemy.engine import make_url
+from fastapi import Depends, Request
+from sqlalchemy.ext.asyncio import AsyncSession, async_sessionmaker, create_async_engine
 from sqlalchemy.orm import sessionmaker, declarative_base
 import os
 from dotenv import load_dotenv
+from .config import settings
+from .db_pool import attach_stats, engine_options, pool_limits
+from .replicas import ReplicaSet, RoutingSession, caller_key, read_your_writes
 
 load_dotenv()
 
@@ -14,11 +20,82 @@ if not DATABASE_URL:
 if DATABASE_URL and DATABASE_URL.startswith("postgres://"):
     DATABASE_URL = DATABASE_URL.replace("postgres://", "postgresql://", 1)
 
+# Async drivers for the sync URLs; anything else is used as given
+ASYNC_DRIVERS = {
+    "postgresql": "postgresql+asyncpg",
+    "postgresql+psycopg2": "postgresql+asyncpg",
+    "sqlite": "sqlite+aiosqlite",
+    "sqlite+pysqlite": "sqlite+aiosqlite",
+}
+
+def async_database_url(database_url: str) -> str:
+    """Return ``database_url`` with its driver swapped for an asyncio one"""
+    url = make_url(database_url)
+    drivername = ASYNC_DRIVERS.get(url.drivername)
+    if drivername is None:
+        return database_url
+    url = url.set(drivername=drivername)
+    if drivername == "postgresql+asyncpg" and "sslmode" in url.query:
+        # asyncpg calls libpq's sslmode "ssl"
+        query = dict(url.query)
+        query["ssl"] = query.pop("sslmode")
+        url = url.set(query=query)
+    return url.render_as_string(hide_password=False)
+
+# Pool limits per engine, split so every worker's sync and async engines fit
+POOL_SIZE, MAX_OVERFLOW = pool_limits(
+    max_connections=settings.db_max_connections,
+    reserved_connections=settings.db_reserved_connections,
+    workers=settings.web_concurrency,
+    engines=2,
+    pool_size=settings.db_pool_size,
+    max_overflow=settings.db_max_overflow
+)
+
+def pool_options(database_url: str, asyncio: bool = False) -> dict:
+    return engine_options(
+        database_url,
+        asyncio=asyncio,
+        pool_size=POOL_SIZE,
+        max_overflow=MAX_OVERFLOW,
+        pool_timeout=settings.db_pool_timeout_seconds,
+        pool_recycle=settings.db_pool_recycle_seconds,
+        pool_pre_ping=settings.db_pool_pre_ping
+    )
+
 # SQLAlchemy setup
-engine = create_engine(DATABASE_URL)
+engine = create_engine(DATABASE_URL, **pool_options(DATABASE_URL))
 SessionLocal = sessionmaker(autocommit=False, autoflush=False, bind=engine)
 Base = declarative_base()
 
+# Async engine on the same database; expire_on_commit=False keeps attributes
+# loaded after a commit, since an AsyncSession cannot lazy-load them
+ASYNC_DATABASE_URL = async_database_url(DATABASE_URL)
+async_engine = create_async_engine(ASYNC_DATABASE_URL, **pool_options(ASYNC_DATABASE_URL, asyncio=True))
+AsyncSessionLocal = async_sessionmaker(
+    bind=async_engine, sync_session_class=RoutingSession, autoflush=False, expire_on_commit=False
+)
+
+# Read replicas, async only: they serve the public read endpoints through get_read_db
+def replica_engine(database_url: str):
+    url = async_database_url(database_url)
+    return create_async_engine(url, **pool_options(url, asyncio=True))
+
+replicas = ReplicaSet(
+    {
+        f"replica{i}": replica_engine(url)
+        for i, url in enumerate(url.strip() for url in settings.database_replica_urls.split(",") if url.strip())
+    },
+    max_lag=settings.replica_max_lag_seconds,
+    interval=settings.replica_check_interval_seconds
+)
+
+# Engines whose pools are reported by /health and /metrics
+pool_engines = {"sync": engine, "async": async_engine.sync_engine}
+pool_engines.update((name, replica.sync_engine) for name, replica in replicas.engines.items())
+for _name, _engine in pool_engines.items():
+    attach_stats(_engine, _name)
+
 # Dependency to get database session
 def get_db():
     db = SessionLocal()
@@ -27,7 +104,26 @@ def get_db():
     finally:
         db.close()
 
+# Dependency to get an async database session, for async def routes
+async def get_async_db():
+    async with AsyncSessionLocal() as db:
+        yield db
+
+# Dependency for streaming responses: dependency cleanup runs before the body
+# is sent, so their generators open (and close) a session of their own
+def get_async_session_factory() -> async_sessionmaker:
+    return AsyncSessionLocal
+
+# Dependency for read-only routes: reads go to a replica unless the caller
+# wrote recently or no replica is within the lag limit
+async def get_read_db(request: Request, db: AsyncSession = Depends(get_async_db)):
+    if replicas and not read_your_writes.recent(caller_key(request.scope)):
+        replica = replicas.choose()
+        if replica is not None:
+            db.sync_session.info["replica"] = replica.sync_engine
+    return db
+
 def create_tables():
-    """Create all tables in the database"""
-    from . import models  # Fixed import
-    Base.metadata.create_all(bind=engine)
\ No newline at end of file
+    """Create all tables in the database, then apply pending migrations"""
+    from .migrations import upgrade
+    upgrade(engine)
\ No newline at end of file
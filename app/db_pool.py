@@ -0,0 +1,149 @@
+import logging
+import threading
+import time
+from typing import Dict, Optional, Tuple
+
+from sqlalchemy.engine import Engine, make_url
+from sqlalchemy.exc import TimeoutError as PoolTimeoutError
+from sqlalchemy.pool import AsyncAdaptedQueuePool, QueuePool
+
+from .metrics import Histogram
+
+logger = logging.getLogger(__name__)
+
+
+def pool_limits(
+    max_connections: int,
+    reserved_connections: int,
+    workers: int,
+    engines: int,
+    pool_size: int,
+    max_overflow: int,
+) -> Tuple[int, int]:
+    """Cap ``pool_size`` and ``max_overflow`` so all workers fit the server limit.
+
+    Every worker opens ``engines`` engines, each of which can hold up to
+    ``pool_size + max_overflow`` connections, and all of them together must
+    stay below the database's ``max_connections`` minus what is reserved for
+    migrations, consoles and monitoring.
+    """
+    per_engine = max(1, (max_connections - reserved_connections) // max(1, workers * engines))
+    capped_size = max(1, min(pool_size, per_engine))
+    capped_overflow = max(0, min(max_overflow, per_engine - capped_size))
+    if (capped_size, capped_overflow) != (pool_size, max_overflow):
+        logger.warning(
+            "Database pool capped at pool_size=%d max_overflow=%d per engine "
+            "(%d workers x %d engines within %d of %d connections)",
+            capped_size, capped_overflow, workers, engines,
+            max_connections - reserved_connections, max_connections
+        )
+    return capped_size, capped_overflow
+
+
+class PoolStats:
+    """Checkout wait times and timeouts of one pool.
+
+    Checkouts happen on threadpool threads for the sync engine, so updates
+    take a short lock.
+    """
+
+    def __init__(self, name: str):
+        self.name = name
+        self.wait = Histogram()
+        self.timeouts = 0
+        self._lock = threading.Lock()
+
+    def observe(self, seconds: float, timed_out: bool) -> None:
+        with self._lock:
+            self.wait.observe(seconds)
+            if timed_out:
+                self.timeouts += 1
+
+
+class _InstrumentedPool:
+    """Mixin timing ``_do_get``: the wait for a free (or newly opened) connection"""
+
+    stats: Optional[PoolStats] = None
+
+    def _do_get(self):
+        start = time.perf_counter()
+        timed_out = False
+        try:
+            return super()._do_get()
+        except PoolTimeoutError:
+            timed_out = True
+            raise
+        finally:
+            if self.stats is not None:
+                self.stats.observe(time.perf_counter() - start, timed_out)
+
+    def recreate(self):
+        # dispose() replaces the pool; the new one keeps counting into the same stats
+        pool = super().recreate()
+        pool.stats = self.stats
+        return pool
+
+
+class InstrumentedQueuePool(_InstrumentedPool, QueuePool):
+    pass
+
+
+class InstrumentedAsyncQueuePool(_InstrumentedPool, AsyncAdaptedQueuePool):
+    pass
+
+
+def engine_options(
+    database_url: str,
+    asyncio: bool = False,
+    pool_size: int = 5,
+    max_overflow: int = 10,
+    pool_timeout: float = 30,
+    pool_recycle: int = 1800,
+    pool_pre_ping: bool = True,
+) -> dict:
+    """Keyword arguments for ``create_engine``/``create_async_engine``.
+
+    In-memory SQLite keeps SQLAlchemy's default single-connection pool, since
+    every new connection would be a separate, empty database.
+    """
+    url = make_url(database_url)
+    if url.get_backend_name() == "sqlite" and url.database in (None, "", ":memory:"):
+        return {}
+    return {
+        "poolclass": InstrumentedAsyncQueuePool if asyncio else InstrumentedQueuePool,
+        "pool_size": pool_size,
+        "max_overflow": max_overflow,
+        "pool_timeout": pool_timeout,
+        "pool_recycle": pool_recycle,
+        "pool_pre_ping": pool_pre_ping,
+    }
+
+
+def attach_stats(engine: Engine, name: str) -> Optional[PoolStats]:
+    """Start recording checkout waits and timeouts for ``engine``'s pool."""
+    if not isinstance(engine.pool, _InstrumentedPool):
+        return None
+    engine.pool.stats = PoolStats(name)
+    return engine.pool.stats
+
+
+def pool_status(engine: Engine) -> Dict[str, float]:
+    """Current occupancy of ``engine``'s pool; saturation 1.0 means checkouts must wait."""
+    pool = engine.pool
+    if not isinstance(pool, QueuePool):
+        return {}
+    size = pool.size()
+    max_overflow = pool._max_overflow
+    checked_out = pool.checkedout()
+    status = {
+        "size": size,
+        "max_overflow": max_overflow,
+        "capacity": size + max_overflow,
+        "checked_out": checked_out,
+        "overflow": max(pool.overflow(), 0),
+        "saturation": round(checked_out / (size + max_overflow), 3),
+    }
+    stats = getattr(pool, "stats", None)
+    if stats is not None:
+        status["timeouts"] = stats.timeouts
+    return status
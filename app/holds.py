@@ -0,0 +1,79 @@
+import logging
+import threading
+from typing import Callable, Optional
+
+from sqlalchemy.exc import SQLAlchemyError
+from sqlalchemy.orm import Session
+
+from .config import settings
+from .cruds.payments import expire_holds
+from .cruds.seating import expire_seat_holds
+
+logger = logging.getLogger(__name__)
+
+
+class HoldSweeper:
+    """Releases expired ticket and seat holds from a background thread.
+
+    Every ``interval`` seconds it expires pending payments whose hold has
+    lapsed, ``batch_size`` at a time (the oldest first, from the partial
+    index on pending holds) until none is left, then deletes lapsed seat
+    holds the same way. Each worker runs one; concurrent sweeps skip the
+    payments another has already expired.
+    """
+
+    def __init__(self, interval: float = 30.0, batch_size: int = 500):
+        self.interval = interval
+        self.batch_size = batch_size
+        self.expired = 0
+        self.expired_seats = 0
+        self._stop = threading.Event()
+        self._thread: Optional[threading.Thread] = None
+
+    def sweep(self, db: Session) -> int:
+        """Expire every lapsed hold; returns how many."""
+        total = 0
+        while True:
+            expired = expire_holds(db, limit=self.batch_size)
+            total += expired
+            if expired < self.batch_size:
+                break
+        seats = 0
+        while True:
+            expired = expire_seat_holds(db, limit=self.batch_size)
+            seats += expired
+            if expired < self.batch_size:
+                break
+        self.expired += total
+        self.expired_seats += seats
+        if total or seats:
+            logger.info("Released %d expired ticket holds and %d seat holds", total, seats)
+        return total
+
+    def start(self, session_factory: Callable[[], Session]) -> None:
+        def run():
+            while not self._stop.wait(self.interval):
+                db = session_factory()
+                try:
+                    self.sweep(db)
+                except SQLAlchemyError:
+                    db.rollback()
+                    logger.exception("Could not release expired ticket holds")
+                finally:
+                    db.close()
+
+        self._stop.clear()
+        self._thread = threading.Thread(target=run, name="ticket-hold-sweeper", daemon=True)
+        self._thread.start()
+
+    def stop(self) -> None:
+        self._stop.set()
+        if self._thread is not None:
+            self._thread.join()
+            self._thread = None
+
+
+hold_sweeper = HoldSweeper(
+    interval=settings.hold_sweep_interval_seconds,
+    batch_size=settings.hold_sweep_batch_size
+)
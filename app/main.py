@@ -1,34 +1,159 @@
-from fastapi import FastAPI
-from fastapi.middleware.cors import CORSMiddleware
-from .database import create_tables
-from .middleware import SecurityMiddleware, RateLimitMiddleware, CORSMiddleware
+from fastapi import Depends, FastAPI, Response
+from fastapi.concurrency import run_in_threadpool
+from .config import settings
+from .database import SessionLocal, async_engine, engine, pool_engines, replicas
+from .db_pool import pool_status
+from .access_log import AccessLog
+from .rate_limit import create_limiter
+from .security import password_hasher
+from .revocation import revocations
+from .holds import hold_sweeper
+from .waiting_room import waiting_room
+from .replicas import bind_request_scope
+from .cache import event_cache
+from .migrations import ensure_schema
+from .query_stats import query_log
+from .metrics import SnapshotStore, ThreadpoolWaitRoute, merge, metrics, render
+from .middleware import SecurityMiddleware, RateLimitMiddleware
 from contextlib import asynccontextmanager
-from .routers import auth, events, payments, tickets
+from .routers import auth, events, payments, tickets, venues
 
 @asynccontextmanager
 async def lifespan(app: FastAPI):
-    # Startup: Create database tables
-    create_tables()
+    # Startup: Check the schema version (migrating only if this deploy's release step did not)
+    ensure_schema(engine, migrate_on_startup=settings.migrate_on_startup)
+    password_hasher.start(
+        target_verify_seconds=settings.bcrypt_target_verify_ms / 1000,
+        min_rounds=settings.bcrypt_min_rounds,
+        max_rounds=settings.bcrypt_max_rounds,
+        calibration_path=settings.bcrypt_calibration_path
+    )
+    revocations.start(SessionLocal)
+    hold_sweeper.start(SessionLocal)
+    await replicas.start()
+    access_log.start()
+    if snapshot_store is not None:
+        snapshot_store.start(metrics.snapshot)
     yield
-    # Shutdown: Nothing to clean up
+    # Shutdown: Flush pending access log records and metrics
+    access_log.stop()
+    revocations.stop()
+    hold_sweeper.stop()
+    password_hasher.shutdown()
+    await replicas.stop()
+    await async_engine.dispose()
+    if snapshot_store is not None:
+        snapshot_store.stop()
+        snapshot_store.write(metrics.snapshot())
 
 app = FastAPI(
     title="Event Ticketing System",
     description="Complete event ticketing platform with Paystack integration",
     version="1.0.0",
-    lifespan=lifespan  # Connect the lifespan function
+    lifespan=lifespan,  # Connect the lifespan function
+    dependencies=[Depends(bind_request_scope)]
 )
 
-# Add custom middleware
-app.add_middleware(SecurityMiddleware)
-app.add_middleware(RateLimitMiddleware, max_requests=100, window_seconds=60)
-app.add_middleware(CORSMiddleware)
+# The app's own routes get the routers' threadpool wait tracking too
+app.router.route_class = ThreadpoolWaitRoute
+
+# Shared so it can be inspected or reset outside the middleware stack
+rate_limiter = create_limiter(
+    settings.rate_limit_backend,
+    max_requests=settings.rate_limit_requests,
+    window_seconds=settings.rate_limit_window_seconds,
+    max_keys=settings.rate_limit_max_clients,
+    storage_path=settings.rate_limit_storage_path
+)
+
+access_log = AccessLog(
+    max_queue=settings.access_log_queue_size,
+    batch_size=settings.access_log_batch_size,
+    flush_interval=settings.access_log_flush_interval_seconds,
+    success_sample_rate=settings.access_log_success_sample_rate
+)
+
+metrics.register(
+    "access_log_records_dropped_total", "counter", "Access log records dropped because the queue was full",
+    lambda: [({}, access_log.dropped)]
+)
+
+def pool_samples(key: str):
+    statuses = {name: pool_status(bound) for name, bound in pool_engines.items()}
+    return [({"pool": name}, status[key]) for name, status in statuses.items() if key in status]
+
+for name, key, kind, help_text in (
+    ("db_pool_connections_checked_out", "checked_out", "gauge", "Database connections currently checked out"),
+    ("db_pool_connections_overflow", "overflow", "gauge", "Database connections open beyond pool_size"),
+    ("db_pool_connections_max", "capacity", "gauge", "pool_size + max_overflow of the database pool"),
+    ("db_pool_checkout_timeouts_total", "timeouts", "counter", "Checkouts that gave up after pool_timeout"),
+):
+    metrics.register(name, kind, help_text, lambda key=key: pool_samples(key))
+
+metrics.register_histogram(
+    "db_pool_checkout_wait_seconds", "Time spent waiting for a pooled database connection",
+    lambda: [({"pool": name}, bound.pool.stats.wait)
+             for name, bound in pool_engines.items() if getattr(bound.pool, "stats", None)]
+)
+
+for name, counts, help_text in (
+    ("db_statements_total", query_log.statements, "SQL statements run while handling requests"),
+    ("db_repeated_statement_requests_total", query_log.repeats, "Requests that repeated a statement (possible N+1)"),
+):
+    metrics.register(name, "counter", help_text, lambda counts=counts: query_log.samples(counts))
+
+metrics.register(
+    "db_slow_statements_total", "counter", "Statements slower than SQL_SLOW_QUERY_MS",
+    lambda: [({}, query_log.slow)]
+)
+
+metrics.register_histogram(
+    "db_request_time_seconds", "Time spent in SQL statements per request",
+    lambda: [({"method": method, "route": route}, histogram) for (method, route), histogram in list(query_log.time.items())]
+)
+
+metrics.register(
+    "event_cache_requests_total", "counter", "Cached event reads by result (hit, miss, or coalesced into a running miss)",
+    lambda: [({"result": "hit"}, event_cache.hits), ({"result": "miss"}, event_cache.misses),
+             ({"result": "coalesced"}, event_cache.coalesced)]
+)
+
+metrics.register(
+    "ticket_holds_expired_total", "counter", "Ticket holds released by this worker's sweeper after expiring",
+    lambda: [({}, hold_sweeper.expired)]
+)
+
+metrics.register(
+    "seat_holds_expired_total", "counter", "Seat holds released by this worker's sweeper after expiring",
+    lambda: [({}, hold_sweeper.expired_seats)]
+)
+
+metrics.register(
+    "waiting_room_joins_total", "counter", "Callers this worker queued in an event's waiting room",
+    lambda: [({}, waiting_room.joined)]
+)
+
+snapshot_store = (
+    SnapshotStore(settings.metrics_multiprocess_dir, interval=settings.metrics_snapshot_interval_seconds)
+    if settings.metrics_enabled and settings.metrics_multiprocess_dir else None
+)
+
+# Add custom middleware (the last one added is the outermost)
+app.add_middleware(RateLimitMiddleware, limiter=rate_limiter)
+app.add_middleware(
+    SecurityMiddleware,
+    access_log=access_log if settings.access_log_enabled else None,
+    metrics=metrics if settings.metrics_enabled else None,
+    queries=query_log if settings.metrics_enabled or settings.debug else None,
+    query_header=settings.debug
+)
 
 # Include routers
 app.include_router(auth.router)
 app.include_router(events.router)
 app.include_router(payments.router)
 app.include_router(tickets.router)
+app.include_router(venues.router)
 
 @app.get("/")
 def root():
@@ -39,5 +164,27 @@ def root():
     }
 
 @app.get("/health")
-def health_check():
-    return {"status": "healthy"}
\ No newline at end of file
+async def health_check():
+    """Report database pool occupancy; "saturated" when a pool has no free connection
+    
+    Async so it still answers while the threadpool is exhausted.
+    """
+    pools = {name: pool_status(bound) for name, bound in pool_engines.items()}
+    saturated = any(status.get("saturation", 0) >= 1 for status in pools.values())
+    health = {"status": "saturated" if saturated else "healthy", "pools": pools}
+    if replicas:
+        health["replica_lag_seconds"] = replicas.status()
+    return health
+
+@app.get("/metrics", include_in_schema=False)
+async def metrics_endpoint():
+    """Prometheus metrics for this worker, or for all workers when a snapshot directory is set"""
+    snapshot = metrics.snapshot()
+    if snapshot_store is None:
+        return Response(render(merge([snapshot])), media_type="text/plain; version=0.0.4")
+    
+    def aggregate():
+        snapshot_store.write(snapshot)
+        return render(merge(snapshot_store.read_all()))
+    
+    return Response(await run_in_threadpool(aggregate), media_type="text/plain; version=0.0.4")
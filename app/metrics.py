@@ -0,0 +1,317 @@
+import asyncio
+import json
+import os
+import threading
+import time
+from bisect import bisect_left
+from typing import Callable, Dict, Iterable, List, Optional, Tuple
+
+import anyio.to_thread
+from fastapi import Depends
+from fastapi.routing import APIRoute
+
+from .config import settings
+
+# Seconds; chosen around the latencies this API actually sees (cache hits to Paystack calls)
+LATENCY_BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0)
+
+UNMATCHED_ROUTE = "<unmatched>"
+
+HELP = {
+    "http_request_duration_seconds": ("histogram", "Request latency by route template"),
+    "http_responses_total": ("counter", "Responses by route template and status"),
+    "http_requests_in_flight": ("gauge", "Requests currently being handled"),
+    "threadpool_queue_wait_seconds": ("histogram", "Time sync endpoints waited for a threadpool thread"),
+    "threadpool_threads_busy": ("gauge", "Threadpool threads currently running sync code"),
+    "threadpool_tasks_waiting": ("gauge", "Sync calls queued for a threadpool thread"),
+}
+
+Labels = Tuple[Tuple[str, str], ...]
+
+
+class Histogram:
+    """Fixed-bucket histogram; ``counts`` holds per-bucket (not cumulative) counts."""
+
+    __slots__ = ("buckets", "counts", "sum")
+
+    def __init__(self, buckets: Tuple[float, ...] = LATENCY_BUCKETS):
+        self.buckets = buckets
+        self.counts = [0] * (len(buckets) + 1)
+        self.sum = 0.0
+
+    def observe(self, value: float) -> None:
+        self.counts[bisect_left(self.buckets, value)] += 1
+        self.sum += value
+
+
+class Metrics:
+    """Per-worker request metrics rendered in the Prometheus text format.
+
+    Request metrics are only updated from the event loop thread, so plain
+    dicts and ints are enough and nothing on the request path takes a lock.
+    Threadpool wait samples come from worker threads and go to a histogram
+    owned by each thread, which are merged when a snapshot is taken.
+
+    Other components expose their own numbers through ``register``; the
+    callbacks run when a snapshot is taken, never on the request path.
+    """
+
+    def __init__(self, buckets: Tuple[float, ...] = LATENCY_BUCKETS):
+        self.buckets = buckets
+        self.latency: Dict[Tuple[str, str], Histogram] = {}
+        self.responses: Dict[Tuple[str, str, int], int] = {}
+        self.in_flight = 0
+        self._thread_local = threading.local()
+        self._thread_waits: List[Histogram] = []
+        self._callbacks: List[Tuple[str, Callable[[], Iterable[Tuple[dict, float]]]]] = []
+        self._histogram_callbacks: List[Tuple[str, Callable[[], Iterable[Tuple[dict, Histogram]]]]] = []
+
+    def observe_request(self, method: str, route: Optional[str], status: int, duration: float) -> None:
+        route = route or UNMATCHED_ROUTE
+        histogram = self.latency.get((method, route))
+        if histogram is None:
+            histogram = self.latency[(method, route)] = Histogram(self.buckets)
+        histogram.observe(duration)
+        key = (method, route, status)
+        self.responses[key] = self.responses.get(key, 0) + 1
+
+    def observe_threadpool_wait(self, seconds: float) -> None:
+        histogram = getattr(self._thread_local, "wait", None)
+        if histogram is None:
+            histogram = self._thread_local.wait = Histogram(self.buckets)
+            self._thread_waits.append(histogram)
+        histogram.observe(seconds)
+
+    def register(self, name: str, kind: str, help_text: str, callback: Callable[[], Iterable[Tuple[dict, float]]]) -> None:
+        """Expose ``callback``'s (labels, value) samples as metric ``name``."""
+        HELP[name] = (kind, help_text)
+        self._callbacks.append((name, callback))
+
+    def register_histogram(
+        self, name: str, help_text: str, callback: Callable[[], Iterable[Tuple[dict, Histogram]]]
+    ) -> None:
+        """Expose ``callback``'s (labels, histogram) series as histogram ``name``.
+
+        The histograms must use this instance's buckets.
+        """
+        HELP[name] = ("histogram", help_text)
+        self._histogram_callbacks.append((name, callback))
+
+    def reset(self) -> None:
+        self.latency.clear()
+        self.responses.clear()
+        for histogram in self._thread_waits:
+            histogram.counts = [0] * len(histogram.counts)
+            histogram.sum = 0.0
+
+    def snapshot(self) -> dict:
+        """Return this worker's metrics as JSON-serialisable samples."""
+        histograms = {
+            "http_request_duration_seconds": [
+                [{"method": method, "route": route}, list(h.counts), h.sum]
+                for (method, route), h in list(self.latency.items())
+            ],
+        }
+        waits = Histogram(self.buckets)
+        for histogram in list(self._thread_waits):
+            waits.counts = [a + b for a, b in zip(waits.counts, histogram.counts)]
+            waits.sum += histogram.sum
+        histograms["threadpool_queue_wait_seconds"] = [[{}, waits.counts, waits.sum]]
+        for name, callback in self._histogram_callbacks:
+            histograms.setdefault(name, []).extend(
+                [labels, list(histogram.counts), histogram.sum] for labels, histogram in callback()
+            )
+
+        samples = {
+            "http_responses_total": [
+                [{"method": method, "route": route, "status": str(status)}, value]
+                for (method, route, status), value in list(self.responses.items())
+            ],
+            "http_requests_in_flight": [[{}, self.in_flight]],
+        }
+        samples.update(threadpool_samples())
+        for name, callback in self._callbacks:
+            samples.setdefault(name, []).extend([labels, value] for labels, value in callback())
+
+        return {"time": time.time(), "buckets": list(self.buckets), "histograms": histograms, "samples": samples}
+
+
+def threadpool_samples() -> dict:
+    """Busy threads and queued calls of the anyio default thread limiter."""
+    try:
+        stats = anyio.to_thread.current_default_thread_limiter().statistics()
+    except RuntimeError:
+        # Not called from the event loop thread
+        return {}
+    return {
+        "threadpool_threads_busy": [[{}, stats.borrowed_tokens]],
+        "threadpool_tasks_waiting": [[{}, stats.tasks_waiting]],
+    }
+
+
+def merge(snapshots: List[dict]) -> dict:
+    """Sum the samples of several worker snapshots."""
+    histograms: Dict[str, Dict[Labels, list]] = {}
+    samples: Dict[str, Dict[Labels, float]] = {}
+    buckets = snapshots[0]["buckets"] if snapshots else list(LATENCY_BUCKETS)
+    for snapshot in snapshots:
+        for name, series in snapshot["histograms"].items():
+            merged = histograms.setdefault(name, {})
+            for labels, counts, total in series:
+                key = tuple(sorted(labels.items()))
+                if key in merged:
+                    current = merged[key]
+                    current[0] = [a + b for a, b in zip(current[0], counts)]
+                    current[1] += total
+                else:
+                    merged[key] = [list(counts), total]
+        for name, series in snapshot["samples"].items():
+            merged = samples.setdefault(name, {})
+            for labels, value in series:
+                key = tuple(sorted(labels.items()))
+                merged[key] = merged.get(key, 0) + value
+    return {"buckets": buckets, "histograms": histograms, "samples": samples}
+
+
+def _escape(value: str) -> str:
+    return value.replace("\\", "\\\\").replace("\n", "\\n").replace('"', '\\"')
+
+
+def _labels(labels: Labels, extra: str = "") -> str:
+    parts = [f'{name}="{_escape(value)}"' for name, value in labels]
+    if extra:
+        parts.append(extra)
+    return "{" + ",".join(parts) + "}" if parts else ""
+
+
+def render(merged: dict) -> str:
+    """Render merged samples in the Prometheus text exposition format."""
+    lines = []
+    bounds = [repr(float(b)) for b in merged["buckets"]] + ["+Inf"]
+    for name, series in sorted(merged["histograms"].items()):
+        kind, help_text = HELP.get(name, ("histogram", name))
+        lines.append(f"# HELP {name} {help_text}")
+        lines.append(f"# TYPE {name} histogram")
+        for labels, (counts, total) in sorted(series.items()):
+            cumulative = 0
+            for bound, count in zip(bounds, counts):
+                cumulative += count
+                le = f'le="{bound}"'
+                lines.append(f"{name}_bucket{_labels(labels, le)} {cumulative}")
+            lines.append(f"{name}_sum{_labels(labels)} {total}")
+            lines.append(f"{name}_count{_labels(labels)} {cumulative}")
+    for name, series in sorted(merged["samples"].items()):
+        kind, help_text = HELP.get(name, ("gauge", name))
+        lines.append(f"# HELP {name} {help_text}")
+        lines.append(f"# TYPE {name} {kind}")
+        for labels, value in sorted(series.items()):
+            lines.append(f"{name}{_labels(labels)} {value}")
+    return "\n".join(lines) + "\n"
+
+
+class SnapshotStore:
+    """Directory of per-worker snapshot files used to aggregate across workers.
+
+    Each worker writes its snapshot to ``<directory>/<pid>.json`` whenever it
+    serves /metrics and every ``interval`` seconds from a background thread,
+    so any worker can answer a scrape for the whole server. Counters of
+    workers that have exited stay in the total; their gauges are ignored once
+    the file is older than ``stale_after`` seconds.
+    """
+
+    GAUGES = (
+        "http_requests_in_flight", "threadpool_threads_busy", "threadpool_tasks_waiting",
+        "db_pool_connections_checked_out", "db_pool_connections_overflow", "db_pool_connections_max",
+    )
+
+    def __init__(self, directory: str, interval: float = 10.0, stale_after: float = 60.0):
+        self.directory = directory
+        self.interval = interval
+        self.stale_after = stale_after
+        self._stop = threading.Event()
+        self._thread: Optional[threading.Thread] = None
+
+    def write(self, snapshot: dict) -> None:
+        os.makedirs(self.directory, exist_ok=True)
+        path = os.path.join(self.directory, f"{os.getpid()}.json")
+        tmp_path = f"{path}.tmp"
+        with open(tmp_path, "w") as f:
+            json.dump(snapshot, f)
+        os.replace(tmp_path, path)
+
+    def read_all(self) -> List[dict]:
+        snapshots = []
+        now = time.time()
+        for filename in os.listdir(self.directory):
+            if not filename.endswith(".json"):
+                continue
+            try:
+                with open(os.path.join(self.directory, filename)) as f:
+                    snapshot = json.load(f)
+            except (OSError, ValueError):
+                continue
+            if now - snapshot.get("time", 0) > self.stale_after:
+                for name in self.GAUGES:
+                    snapshot["samples"].pop(name, None)
+            snapshots.append(snapshot)
+        return snapshots
+
+    def start(self, snapshot_func: Callable[[], dict]) -> None:
+        def run():
+            while not self._stop.wait(self.interval):
+                try:
+                    self.write(snapshot_func())
+                except OSError:
+                    pass
+
+        self._stop.clear()
+        self._thread = threading.Thread(target=run, name="metrics-snapshot-writer", daemon=True)
+        self._thread.start()
+
+    def stop(self) -> None:
+        self._stop.set()
+        if self._thread is not None:
+            self._thread.join()
+            self._thread = None
+
+
+metrics = Metrics()
+
+
+async def threadpool_dispatch() -> float:
+    """Time on the event loop just before the dependant is sent to the threadpool."""
+    return time.perf_counter()
+
+
+def track_threadpool_wait(dispatched: float = Depends(threadpool_dispatch)) -> None:
+    """Dependency recording how long a sync endpoint waited for a threadpool thread.
+
+    FastAPI resolves ``threadpool_dispatch`` on the event loop right before
+    handing this plain ``def`` to the threadpool, so the time between the two
+    is the wait for a free thread alone, not the parsing and async
+    dependencies that came before.
+    """
+    metrics.observe_threadpool_wait(time.perf_counter() - dispatched)
+
+
+THREADPOOL_WAIT = Depends(track_threadpool_wait)
+
+
+class ThreadpoolWaitRoute(APIRoute):
+    """Route class adding ``track_threadpool_wait`` to every sync endpoint.
+
+    The dependency goes after the route's own, so callers those turn away
+    never take a thread. Async endpoints stay off the threadpool and are left
+    alone, as is everything when metrics are disabled.
+    """
+
+    def __init__(self, path: str, endpoint: Callable, *, dependencies=None, **kwargs):
+        dependencies = list(dependencies or ())
+        if (
+            settings.metrics_enabled
+            and not asyncio.iscoroutinefunction(endpoint)
+            and not any(dependency is THREADPOOL_WAIT for dependency in dependencies)
+        ):
+            # include_router re-creates routes with their dependencies, so only add it once
+            dependencies.append(THREADPOOL_WAIT)
+        super().__init__(path, endpoint, dependencies=dependencies, **kwargs)
@@ -1,135 +1,195 @@
+import math
 import time
 import logging
-from fastapi import Request, Response
 from fastapi.responses import JSONResponse
-import json
-from datetime import datetime
+from typing import Optional
+from .access_log import AccessLog
+from .config import settings
+from .metrics import Metrics
+from .query_stats import QueryLog
+from .rate_limit import RateLimiter, SlidingWindowLimiter
 
 # Set up logging
 logging.basicConfig(level=logging.INFO)
 logger = logging.getLogger(__name__)
 
+SECURITY_HEADERS = [
+    (b"x-content-type-options", b"nosniff"),
+    (b"x-frame-options", b"DENY"),
+    (b"x-xss-protection", b"1; mode=block"),
+    (b"strict-transport-security", b"max-age=31536000; includeSubDomains"),
+]
+
+def add_vary_origin(headers: list) -> None:
+    """Add ``Origin`` to the raw ``headers``' Vary value, or add a Vary header."""
+    for index, (name, value) in enumerate(headers):
+        if name == b"vary":
+            if value.strip() != b"*" and b"origin" not in value.lower():
+                headers[index] = (name, value + b", Origin")
+            return
+    headers.append((b"vary", b"Origin"))
+
 class SecurityMiddleware:
-    """Custom security middleware for logging and monitoring"""
+    """Security headers, CORS, access logging and metrics in a single ASGI layer.
     
-    def __init__(self, app):
+    Every header the layer adds is encoded once at startup, so a response only
+    gets a precomputed list appended to its raw headers (replacing any the
+    application set under the same names, except that ``Origin`` is added to
+    the application's own ``Vary``). Origins default to
+    ``settings.cors_origins``. Request details are read straight from the ASGI
+    scope and CORS preflights (``OPTIONS`` with both ``Origin`` and
+    ``Access-Control-Request-Method``) are answered with prebuilt messages
+    without reaching the application. Each request is timed
+    once and reported to the non-blocking ``access_log`` and to ``metrics``
+    when they are given. With ``queries`` the request's SQL statements are
+    counted and timed, and ``query_header`` returns the totals in an
+    ``X-DB-Stats`` header (meant for debug mode).
+    """
+    
+    def __init__(
+        self,
+        app,
+        allowed_origins=None,
+        allowed_methods=None,
+        access_log: Optional[AccessLog] = None,
+        metrics: Optional[Metrics] = None,
+        queries: Optional[QueryLog] = None,
+        query_header: bool = False
+    ):
         self.app = app
+        self.access_log = access_log
+        self.metrics = metrics
+        self.queries = queries
+        self.query_header = query_header and queries is not None
+        self.allowed_origins = allowed_origins or settings.cors_origins
+        self.allowed_methods = allowed_methods or ["GET", "POST", "PUT", "DELETE", "OPTIONS"]
+        
+        self.default_headers = SECURITY_HEADERS + [
+            (b"access-control-allow-methods", ", ".join(self.allowed_methods).encode()),
+            (b"access-control-allow-headers", b"Content-Type, Authorization"),
+            (b"access-control-allow-credentials", b"true"),
+        ]
+        # Allowed origins are echoed back, so each one gets its own header list
+        self.origin_headers = {
+            origin.encode("latin-1"): self.default_headers + [
+                (b"access-control-allow-origin", origin.encode("latin-1")),
+            ]
+            for origin in self.allowed_origins
+        }
+        # Names to drop from the application's headers before ours are appended;
+        # Vary is merged instead, so the application's own variants survive
+        self.replaced_names = frozenset(name for name, _ in self.default_headers) | {b"access-control-allow-origin"}
+        self.default_preflight = {"type": "http.response.start", "status": 204, "headers": self.default_headers}
+        self.origin_preflights = {
+            origin: {"type": "http.response.start", "status": 204, "headers": headers + [(b"vary", b"Origin")]}
+            for origin, headers in self.origin_headers.items()
+        }
     
     async def __call__(self, scope, receive, send):
         if scope["type"] != "http":
             await self.app(scope, receive, send)
             return
         
-        request = Request(scope, receive)
-        start_time = time.time()
+        method = scope["method"]
+        origin = None
+        preflight = False
+        for name, value in scope["headers"]:
+            if name == b"origin":
+                origin = value
+            elif name == b"access-control-request-method":
+                preflight = method == "OPTIONS"
+        extra_headers = self.origin_headers.get(origin)
+        vary_origin = extra_headers is not None
+        if extra_headers is None:
+            extra_headers = self.default_headers
+        replaced_names = self.replaced_names
+        
+        # Handle preflight requests; a plain OPTIONS goes to the routes
+        if preflight and origin is not None:
+            await send(self.origin_preflights.get(origin, self.default_preflight))
+            await send({"type": "http.response.body", "body": b""})
+            return
+        
+        response_status = 500
+        request_queries = None
         
-        # Security headers
         async def send_wrapper(message):
+            nonlocal response_status
             if message["type"] == "http.response.start":
-                headers = dict(message.get("headers", []))
-                
-                # Add security headers
-                headers[b"x-content-type-options"] = b"nosniff"
-                headers[b"x-frame-options"] = b"DENY"
-                headers[b"x-xss-protection"] = b"1; mode=block"
-                headers[b"strict-transport-security"] = b"max-age=31536000; includeSubDomains"
-                
-                message["headers"] = [(k, v) for k, v in headers.items()]
-            
+                response_status = message["status"]
+                headers = [header for header in message.get("headers", ()) if header[0] not in replaced_names]
+                if vary_origin:
+                    add_vary_origin(headers)
+                headers += extra_headers
+                message["headers"] = headers
+                if self.query_header and request_queries is not None:
+                    message["headers"].append(
+                        (b"x-db-stats", request_queries.header(self.queries.repeat_threshold).encode())
+                    )
             await send(message)
         
-        # Log request
-        client_ip = request.client.host if request.client else "unknown"
-        
-        method = request.method
-        url = str(request.url)
-        
-        logger.info(f"Request: {method} {url} from {client_ip}")
-        
-        await self.app(scope, receive, send_wrapper)
+        access_log = self.access_log
+        metrics = self.metrics
+        queries = self.queries
+        if access_log is None and metrics is None and queries is None:
+            await self.app(scope, receive, send_wrapper)
+            return
         
-        # Log response time
-        process_time = time.time() - start_time
-        logger.info(f"Response time: {process_time:.4f}s for {method} {url}")
+        start_time = time.perf_counter()
+        if metrics is not None:
+            metrics.in_flight += 1
+        if queries is not None:
+            request_queries, token = queries.begin()
+        try:
+            await self.app(scope, receive, send_wrapper)
+        finally:
+            duration = time.perf_counter() - start_time
+            route = scope.get("route")
+            route_path = route.path if route is not None else None
+            if queries is not None:
+                queries.finish(method, route_path, request_queries, token)
+            if metrics is not None:
+                metrics.in_flight -= 1
+                metrics.observe_request(method, route_path, response_status, duration)
+            if access_log is not None:
+                client = scope.get("client")
+                access_log.record(
+                    method,
+                    route_path or scope["path"],
+                    response_status,
+                    duration,
+                    client[0] if client else "unknown"
+                )
 
 class RateLimitMiddleware:
-    """Simple rate limiting middleware"""
+    """Per-client rate limiting middleware backed by a pluggable limiter"""
     
-    def __init__(self, app, max_requests: int = 100, window_seconds: int = 60):
+    def __init__(
+        self,
+        app,
+        max_requests: int = 100,
+        window_seconds: int = 60,
+        limiter: Optional[RateLimiter] = None
+    ):
         self.app = app
-        self.max_requests = max_requests
-        self.window_seconds = window_seconds
-        self.requests = {}  # In production, use Redis or similar
+        self.limiter = limiter if limiter is not None else SlidingWindowLimiter(max_requests, window_seconds)
     
     async def __call__(self, scope, receive, send):
         if scope["type"] != "http":
             await self.app(scope, receive, send)
             return
         
-        request = Request(scope, receive)
-        client_ip = request.client.host if request.client else "unknown"
-        current_time = time.time()
+        client = scope.get("client")
+        client_ip = client[0] if client else "unknown"
         
-        # Clean old requests
-        self.requests = {
-            ip: [req_time for req_time in times if current_time - req_time < self.window_seconds]
-            for ip, times in self.requests.items()
-        }
-        
-        # Check rate limit
-        if client_ip not in self.requests:
-            self.requests[client_ip] = []
-        
-        if len(self.requests[client_ip]) >= self.max_requests:
-            # Rate limited
+        allowed, retry_after = self.limiter.hit(client_ip)
+        if not allowed:
             response = JSONResponse(
                 status_code=429,
-                content={"detail": "Too many requests. Please try again later."}
+                content={"detail": "Too many requests. Please try again later."},
+                headers={"Retry-After": str(math.ceil(retry_after))}
             )
             await response(scope, receive, send)
             return
         
-        # Add current request
-        self.requests[client_ip].append(current_time)
-        
         await self.app(scope, receive, send)
-
-class CORSMiddleware:
-    """Custom CORS middleware"""
-    
-    def __init__(self, app, allowed_origins=None, allowed_methods=None):
-        self.app = app
-        self.allowed_origins = allowed_origins or ["http://localhost:3000", "http://127.0.0.1:3000"]
-        self.allowed_methods = allowed_methods or ["GET", "POST", "PUT", "DELETE", "OPTIONS"]
-    
-    async def __call__(self, scope, receive, send):
-        if scope["type"] != "http":
-            await self.app(scope, receive, send)
-            return
-        
-        request = Request(scope, receive)
-        
-        async def send_wrapper(message):
-            if message["type"] == "http.response.start":
-                headers = dict(message.get("headers", []))
-                
-                # Add CORS headers
-                origin = request.headers.get("origin")
-                if origin in self.allowed_origins:
-                    headers[b"access-control-allow-origin"] = origin.encode() if origin else b"*"
-                
-                headers[b"access-control-allow-methods"] = ", ".join(self.allowed_methods).encode()
-                headers[b"access-control-allow-headers"] = b"Content-Type, Authorization"
-                headers[b"access-control-allow-credentials"] = b"true"
-                
-                message["headers"] = [(k, v) for k, v in headers.items()]
-            
-            await send(message)
-        
-        # Handle preflight requests
-        if request.method == "OPTIONS":
-            response = Response(status_code=204)
-            await response(scope, receive, send_wrapper)
-            return
-        
-        await self.app(scope, receive, send_wrapper)
\ No newline at end of file
@@ -0,0 +1,264 @@
+"""Versioned schema changes, applied once per deploy.
+
+``create_all`` creates missing tables but never touches existing ones, so
+anything added to the schema (tables, columns, indexes) ships as a
+migration here. Each migration runs once per database and is recorded in
+``schema_migrations``; on a fresh database ``create_all`` has already done
+the work and the migration only finds everything in place.
+
+Run ``python -m app.migrations`` as the deploy's release step. Workers then
+only compare the recorded version with ``SCHEMA_VERSION`` at boot, a single
+query, and migrate themselves (under the same lock) only when it is behind
+and ``MIGRATE_ON_STARTUP`` allows it.
+"""
+import hashlib
+import logging
+import os
+import tempfile
+from contextlib import contextmanager
+from typing import Callable, Iterator, List, Tuple
+
+try:
+    import fcntl
+except ImportError:  # Windows has no flock; migrate from a single process there
+    fcntl = None
+
+from sqlalchemy import Column, DateTime, Index, Integer, MetaData, String, Table, func, insert, inspect, select, text
+from sqlalchemy.engine import Engine
+from sqlalchemy.exc import SQLAlchemyError
+from sqlalchemy.schema import CreateIndex
+
+from . import models
+from .database import Base
+
+logger = logging.getLogger(__name__)
+
+# Arbitrary application-wide key for pg_advisory_lock
+MIGRATION_LOCK_KEY = 7_245_001
+
+schema_migrations = Table(
+    "schema_migrations",
+    MetaData(),
+    Column("version", Integer, primary_key=True),
+    Column("description", String(200), nullable=False),
+    Column("applied_at", DateTime(timezone=True), nullable=False, server_default=func.now()),
+)
+
+# (version, description, function taking the engine), in version order
+MIGRATIONS: List[Tuple[int, str, Callable[[Engine], None]]] = []
+
+
+def migration(version: int, description: str):
+    """Register the decorated function as migration ``version``."""
+    def register(fn: Callable[[Engine], None]):
+        assert not MIGRATIONS or MIGRATIONS[-1][0] < version, "migrations must be added in version order"
+        MIGRATIONS.append((version, description, fn))
+        return fn
+    return register
+
+
+def create_index(engine: Engine, index: Index) -> None:
+    """Create ``index`` unless it exists, without blocking writes on Postgres.
+
+    ``CREATE INDEX CONCURRENTLY`` cannot run inside a transaction, so on
+    Postgres the statement runs in autocommit mode.
+    """
+    if engine.dialect.name == "postgresql":
+        ddl = str(CreateIndex(index, if_not_exists=True).compile(dialect=engine.dialect))
+        ddl = ddl.replace("CREATE INDEX", "CREATE INDEX CONCURRENTLY", 1)
+        with engine.connect().execution_options(isolation_level="AUTOCOMMIT") as conn:
+            conn.exec_driver_sql(ddl)
+    else:
+        with engine.begin() as conn:
+            index.create(conn, checkfirst=True)
+
+
+def drop_index(engine: Engine, name: str) -> None:
+    """Drop the index called ``name`` if it exists, without blocking writes on Postgres."""
+    if engine.dialect.name == "postgresql":
+        with engine.connect().execution_options(isolation_level="AUTOCOMMIT") as conn:
+            conn.exec_driver_sql(f"DROP INDEX CONCURRENTLY IF EXISTS {name}")
+    else:
+        with engine.begin() as conn:
+            conn.exec_driver_sql(f"DROP INDEX IF EXISTS {name}")
+
+
+def add_column(engine: Engine, column: Column) -> None:
+    """Add a model's ``column`` (with its foreign keys) to its existing table unless it is there already."""
+    table = column.table
+    if column.name in {existing["name"] for existing in inspect(engine).get_columns(table.name)}:
+        return
+    ddl = f"ALTER TABLE {table.name} ADD COLUMN {column.name} {column.type.compile(dialect=engine.dialect)}"
+    # Postgres and SQLite take the constraint inline, as create_all would make it
+    if engine.dialect.name in ("postgresql", "sqlite"):
+        for foreign_key in column.foreign_keys:
+            ddl += f" REFERENCES {foreign_key.column.table.name} ({foreign_key.column.name})"
+    if column.server_default is not None:
+        ddl += f" DEFAULT {column.server_default.arg}"
+    if not column.nullable:
+        ddl += " NOT NULL"
+    with engine.begin() as conn:
+        conn.exec_driver_sql(ddl)
+
+
+def applied_versions(engine: Engine) -> List[int]:
+    with engine.begin() as conn:
+        schema_migrations.create(conn, checkfirst=True)
+        return list(conn.scalars(select(schema_migrations.c.version).order_by(schema_migrations.c.version)))
+
+
+def schema_version(engine: Engine) -> int:
+    """Highest migration applied to the database, 0 when none is recorded."""
+    try:
+        with engine.connect() as conn:
+            return conn.scalar(select(func.max(schema_migrations.c.version))) or 0
+    except SQLAlchemyError:  # no schema_migrations table yet
+        return 0
+
+
+def migrate(engine: Engine) -> List[int]:
+    """Apply the migrations this database has not had yet; returns their versions."""
+    done = set(applied_versions(engine))
+    applied = []
+    for version, description, fn in MIGRATIONS:
+        if version in done:
+            continue
+        logger.info("Applying migration %d: %s", version, description)
+        fn(engine)
+        with engine.begin() as conn:
+            conn.execute(insert(schema_migrations).values(version=version, description=description))
+        applied.append(version)
+    return applied
+
+
+@contextmanager
+def migration_lock(engine: Engine) -> Iterator[None]:
+    """Let one process at a time migrate ``engine``'s database.
+
+    Postgres uses an advisory lock, so it also covers release steps on other
+    hosts. Other databases lock a file in the temp directory, which only
+    serialises processes on this host.
+    """
+    if engine.dialect.name == "postgresql":
+        # Autocommit: an open transaction here would block CREATE INDEX CONCURRENTLY
+        with engine.connect().execution_options(isolation_level="AUTOCOMMIT") as conn:
+            conn.execute(text("SELECT pg_advisory_lock(:key)"), {"key": MIGRATION_LOCK_KEY})
+            try:
+                yield
+            finally:
+                conn.execute(text("SELECT pg_advisory_unlock(:key)"), {"key": MIGRATION_LOCK_KEY})
+        return
+    if fcntl is None:
+        yield
+        return
+    digest = hashlib.sha1(engine.url.render_as_string(hide_password=False).encode()).hexdigest()[:16]
+    fd = os.open(os.path.join(tempfile.gettempdir(), f"etix-migrate-{digest}.lock"), os.O_RDWR | os.O_CREAT, 0o600)
+    try:
+        fcntl.flock(fd, fcntl.LOCK_EX)
+        yield
+    finally:
+        os.close(fd)
+
+
+def upgrade(engine: Engine) -> List[int]:
+    """Create missing tables and apply pending migrations, one process at a time."""
+    with migration_lock(engine):
+        Base.metadata.create_all(bind=engine)
+        return migrate(engine)
+
+
+def ensure_schema(engine: Engine, migrate_on_startup: bool = True) -> None:
+    """Worker boot check: a single query when the database is up to date.
+
+    A database behind ``SCHEMA_VERSION`` is upgraded under the lock, so the
+    first worker migrates and the others wait and find nothing left to do;
+    with ``migrate_on_startup`` off the worker refuses to start instead.
+    """
+    version = schema_version(engine)
+    if version >= SCHEMA_VERSION:
+        return
+    if not migrate_on_startup:
+        raise RuntimeError(
+            f"Database schema is at version {version}, this code needs {SCHEMA_VERSION}; "
+            "run `python -m app.migrations` first"
+        )
+    upgrade(engine)
+
+
+def model_index(table: Table, name: str) -> Index:
+    return next(index for index in table.indexes if index.name == name)
+
+
+@migration(1, "Indexes for event listing, tickets by event and payments by user and event")
+def add_query_indexes(engine: Engine) -> None:
+    for table, name in (
+        (models.Event.__table__, "ix_events_active_event_date"),
+        (models.Ticket.__table__, "ix_tickets_event_id"),
+        (models.Payment.__table__, "ix_payments_user_id"),
+        (models.Payment.__table__, "ix_payments_event_id"),
+    ):
+        create_index(engine, model_index(table, name))
+
+
+@migration(2, "Full-text event search and indexes for the category and price filters")
+def add_search_indexes(engine: Engine) -> None:
+    events = models.Event.__table__
+    for name in ("ix_events_active_category_date", "ix_events_active_price"):
+        create_index(engine, model_index(events, name))
+    if engine.dialect.name == "postgresql":
+        create_index(engine, model_index(events, "ix_events_search"))
+    elif engine.dialect.name == "sqlite":
+        with engine.begin() as conn:
+            for ddl in models.EVENT_FTS_DDL:
+                conn.exec_driver_sql(ddl)
+            # Index the events that existed before the triggers
+            conn.exec_driver_sql("INSERT INTO events_fts(events_fts) VALUES ('rebuild')")
+
+
+@migration(3, "Index payments by ticket for attendee exports")
+def add_payment_ticket_index(engine: Engine) -> None:
+    create_index(engine, model_index(models.Payment.__table__, "ix_payments_ticket_id"))
+
+
+@migration(4, "Inventory shard table for sharded ticket counters")
+def add_inventory_shards(engine: Engine) -> None:
+    models.EventInventoryShard.__table__.create(engine, checkfirst=True)
+
+
+@migration(5, "Ticket holds: held counts on events, hold expiry on payments")
+def add_ticket_holds(engine: Engine) -> None:
+    add_column(engine, models.Event.__table__.c.tickets_held)
+    add_column(engine, models.Payment.__table__.c.hold_expires_at)
+    create_index(engine, model_index(models.Payment.__table__, "ix_payments_pending_hold_expires_at"))
+
+
+@migration(6, "Reserved seating: venue seat maps, held and sold event seats")
+def add_reserved_seating(engine: Engine) -> None:
+    for model in (models.Venue, models.VenueSection, models.VenueRow, models.EventSeat):
+        model.__table__.create(engine, checkfirst=True)
+    add_column(engine, models.Event.__table__.c.venue_id)
+
+
+@migration(7, "Token versions on users, for revoking access tokens")
+def add_token_versions(engine: Engine) -> None:
+    add_column(engine, models.User.__table__.c.token_version)
+
+
+@migration(8, "Ticket holds counted on inventory shards")
+def add_shard_holds(engine: Engine) -> None:
+    add_column(engine, models.EventInventoryShard.__table__.c.held)
+
+
+@migration(9, "Drop the unused index of pending payments by creation time")
+def drop_pending_created_at_index(engine: Engine) -> None:
+    drop_index(engine, "ix_payments_pending_created_at")
+
+
+SCHEMA_VERSION = MIGRATIONS[-1][0]
+
+
+if __name__ == "__main__":
+    from .database import engine
+    logging.basicConfig(level=logging.INFO)
+    applied = upgrade(engine)
+    print(f"Schema at version {SCHEMA_VERSION}" + (f", applied {applied}" if applied else ", nothing to apply"))
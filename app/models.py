@@ -1,5 +1,5 @@
-from sqlalchemy import Column, Integer, String, Boolean, DateTime, Text, DECIMAL, ForeignKey, UniqueConstraint
-from sqlalchemy.orm import relationship
+from sqlalchemy import Column, Integer, String, Boolean, DateTime, Text, DECIMAL, DDL, ForeignKey, Index, UniqueConstraint, event, literal_column, select
+from sqlalchemy.orm import column_property, relationship
 from sqlalchemy.sql import func
 from .database import Base
 
@@ -14,6 +14,8 @@ class User(Base):
     phone = Column(String(20))
     is_verified = Column(Boolean, default=False)
     is_active = Column(Boolean, default=True)
+    # Bumped whenever existing tokens must stop working (password, email or status change)
+    token_version = Column(Integer, nullable=False, default=0, server_default="0")
     created_at = Column(DateTime(timezone=True), server_default=func.now())
     updated_at = Column(DateTime(timezone=True), server_default=func.now(), onupdate=func.now())
 
@@ -22,6 +24,17 @@ class User(Base):
     tickets = relationship("Ticket", back_populates="user")
     payments = relationship("Payment", back_populates="user")
 
+class TokenRevocation(Base):
+    __tablename__ = "token_revocations"
+    
+    id = Column(Integer, primary_key=True, index=True)
+    # No foreign key: the row must outlive a deleted user until their tokens expire
+    user_id = Column(Integer, nullable=False, index=True)
+    # Tokens of this user with a lower version are revoked
+    token_version = Column(Integer, nullable=False)
+    # After this no access token issued before the revocation can still be alive
+    expires_at = Column(DateTime(timezone=True), nullable=False, index=True)
+
 class Category(Base):
     __tablename__ = "categories"
     
@@ -34,6 +47,60 @@ class Category(Base):
     # Relationships
     events = relationship("Event", back_populates="category")
 
+class Venue(Base):
+    """A seated venue: sections of rows, in best-first order (see app.seating)"""
+    __tablename__ = "venues"
+    
+    id = Column(Integer, primary_key=True, index=True)
+    name = Column(String(200), nullable=False)
+    owner_id = Column(Integer, ForeignKey("users.id"))
+    created_at = Column(DateTime(timezone=True), server_default=func.now())
+    
+    sections = relationship("VenueSection", back_populates="venue", order_by="VenueSection.position")
+
+class VenueSection(Base):
+    __tablename__ = "venue_sections"
+    
+    id = Column(Integer, primary_key=True, index=True)
+    venue_id = Column(Integer, ForeignKey("venues.id"), nullable=False, index=True)
+    name = Column(String(8), nullable=False)
+    position = Column(Integer, nullable=False)
+    
+    venue = relationship("Venue", back_populates="sections")
+    rows = relationship("VenueRow", back_populates="section", order_by="VenueRow.position")
+    
+    __table_args__ = (
+        UniqueConstraint('venue_id', 'name', name='unique_venue_section'),
+    )
+
+class VenueRow(Base):
+    """A row of ``seats`` seats numbered from 1; rows come front to back by ``position``"""
+    __tablename__ = "venue_rows"
+    
+    id = Column(Integer, primary_key=True, index=True)
+    section_id = Column(Integer, ForeignKey("venue_sections.id"), nullable=False, index=True)
+    label = Column(String(5), nullable=False)
+    seats = Column(Integer, nullable=False)
+    position = Column(Integer, nullable=False)
+    
+    section = relationship("VenueSection", back_populates="rows")
+    
+    __table_args__ = (
+        UniqueConstraint('section_id', 'label', name='unique_section_row'),
+    )
+
+def event_search_document(title, description, location):
+    """Postgres full-text document of an event.
+    
+    Search queries must build this exact expression, with literals rather
+    than bound parameters, for Postgres to match it to ix_events_search.
+    """
+    blank, space = literal_column("''"), literal_column("' '")
+    return func.to_tsvector(
+        literal_column("'english'::regconfig"),
+        func.coalesce(title, blank) + space + func.coalesce(description, blank) + space + func.coalesce(location, blank)
+    )
+
 class Event(Base):
     __tablename__ = "events"
     
@@ -47,8 +114,12 @@ class Event(Base):
     price = Column(DECIMAL(10, 2), nullable=False)
     capacity = Column(Integer, nullable=False)
     tickets_sold = Column(Integer, default=0)
+    # Tickets reserved by pending payments (see Payment.hold_expires_at)
+    tickets_held = Column(Integer, nullable=False, default=0, server_default="0")
     category_id = Column(Integer, ForeignKey("categories.id"))
     organizer_id = Column(Integer, ForeignKey("users.id"))
+    # Reserved seating: buyers hold seats of this venue's seat map before checkout
+    venue_id = Column(Integer, ForeignKey("venues.id"))
     image_url = Column(String(500))
     is_active = Column(Boolean, default=True)
     requires_approval = Column(Boolean, default=False)
@@ -60,13 +131,102 @@ class Event(Base):
     organizer = relationship("User", back_populates="organized_events")
     tickets = relationship("Ticket", back_populates="event")
     payments = relationship("Payment", back_populates="event")
+    
+    # Indexes: events are listed and searched by date and only while active,
+    # so only active rows are indexed. Full-text search uses a GIN index on
+    # Postgres and the events_fts table (below) on SQLite.
+    __table_args__ = (
+        Index(
+            "ix_events_active_event_date", event_date, id,
+            postgresql_where=is_active == True, sqlite_where=is_active == True
+        ),
+        Index(
+            "ix_events_active_category_date", category_id, event_date, id,
+            postgresql_where=is_active == True, sqlite_where=is_active == True
+        ),
+        Index(
+            "ix_events_active_price", price, id,
+            postgresql_where=is_active == True, sqlite_where=is_active == True
+        ),
+        Index(
+            "ix_events_search",
+            event_search_document(title, description, location),
+            postgresql_using="gin", postgresql_where=is_active == True
+        ).ddl_if(dialect="postgresql"),
+    )
+
+# SQLite full-text index over events, kept in step by triggers. External
+# content: the table only holds the index and reads the text from events.
+EVENT_FTS_DDL = (
+    "CREATE VIRTUAL TABLE IF NOT EXISTS events_fts USING fts5("
+    "title, description, location, content='events', content_rowid='id', "
+    "tokenize='porter unicode61 remove_diacritics 2')",
+    "CREATE TRIGGER IF NOT EXISTS events_fts_insert AFTER INSERT ON events BEGIN "
+    "INSERT INTO events_fts(rowid, title, description, location) "
+    "VALUES (new.id, new.title, new.description, new.location); END",
+    "CREATE TRIGGER IF NOT EXISTS events_fts_delete AFTER DELETE ON events BEGIN "
+    "INSERT INTO events_fts(events_fts, rowid, title, description, location) "
+    "VALUES ('delete', old.id, old.title, old.description, old.location); END",
+    "CREATE TRIGGER IF NOT EXISTS events_fts_update AFTER UPDATE OF title, description, location ON events BEGIN "
+    "INSERT INTO events_fts(events_fts, rowid, title, description, location) "
+    "VALUES ('delete', old.id, old.title, old.description, old.location); "
+    "INSERT INTO events_fts(rowid, title, description, location) "
+    "VALUES (new.id, new.title, new.description, new.location); END",
+)
+
+for _ddl in EVENT_FTS_DDL:
+    event.listen(Event.__table__, "after_create", DDL(_ddl).execute_if(dialect="sqlite"))
+event.listen(Event.__table__, "before_drop", DDL("DROP TABLE IF EXISTS events_fts").execute_if(dialect="sqlite"))
+
+class EventInventoryShard(Base):
+    """A slice of an event's capacity that purchases can claim without locking the event row.
+    
+    Used when INVENTORY_SHARDS is set: each sale increments ``sold``, and
+    each ticket hold ``held``, on one shard while their sum is below
+    ``allotment``, and allotments are moved between an event's shards when
+    one runs dry. Sales and holds counted on the event row (before sharding,
+    or sales after every shard ran out) stay there.
+    """
+    __tablename__ = "event_inventory_shards"
+    
+    event_id = Column(Integer, ForeignKey("events.id"), primary_key=True)
+    shard = Column(Integer, primary_key=True)
+    allotment = Column(Integer, nullable=False)
+    sold = Column(Integer, nullable=False, default=0, server_default="0")
+    held = Column(Integer, nullable=False, default=0, server_default="0")
+
+# Tickets sold on the event row plus on its inventory shards; this, not the
+# tickets_sold column, is what the API reports
+Event.tickets_sold_total = column_property(
+    Event.tickets_sold + func.coalesce(
+        select(func.sum(EventInventoryShard.sold))
+        .where(EventInventoryShard.event_id == Event.id)
+        .correlate_except(EventInventoryShard)
+        .scalar_subquery(),
+        0
+    )
+)
+
+# Likewise for tickets held by pending payments; only checkout needs it, so
+# it is loaded on first access rather than with every event
+Event.tickets_held_total = column_property(
+    Event.tickets_held + func.coalesce(
+        select(func.sum(EventInventoryShard.held))
+        .where(EventInventoryShard.event_id == Event.id)
+        .correlate_except(EventInventoryShard)
+        .scalar_subquery(),
+        0
+    ),
+    deferred=True
+)
 
 class Ticket(Base):
     __tablename__ = "tickets"
     
     id = Column(Integer, primary_key=True, index=True)
+    # Lookups by user_id use unique_user_event_seat, which starts with it
     user_id = Column(Integer, ForeignKey("users.id"), nullable=False)
-    event_id = Column(Integer, ForeignKey("events.id"), nullable=False)
+    event_id = Column(Integer, ForeignKey("events.id"), nullable=False, index=True)
     ticket_code = Column(String(50), unique=True, nullable=False)
     qr_code_data = Column(Text)
     qr_code_path = Column(String(255))
@@ -90,9 +250,10 @@ class Payment(Base):
     __tablename__ = "payments"
     
     id = Column(Integer, primary_key=True, index=True)
-    user_id = Column(Integer, ForeignKey("users.id"), nullable=False)
-    event_id = Column(Integer, ForeignKey("events.id"), nullable=False)
-    ticket_id = Column(Integer, ForeignKey("tickets.id"))
+    user_id = Column(Integer, ForeignKey("users.id"), nullable=False, index=True)
+    event_id = Column(Integer, ForeignKey("events.id"), nullable=False, index=True)
+    # Indexed for joining tickets to their payments (attendee exports)
+    ticket_id = Column(Integer, ForeignKey("tickets.id"), index=True)
     paystack_reference = Column(String(100), unique=True, nullable=False)
     paystack_access_code = Column(String(100))
     amount = Column(DECIMAL(10, 2), nullable=False)
@@ -101,10 +262,47 @@ class Payment(Base):
     payment_method = Column(String(50))
     gateway_response = Column(Text)
     paid_at = Column(DateTime(timezone=True))
+    # Set while the payment holds one of the event's tickets; the hold is
+    # released when it expires, fails, or becomes a sale
+    hold_expires_at = Column(DateTime(timezone=True))
     created_at = Column(DateTime(timezone=True), server_default=func.now())
     updated_at = Column(DateTime(timezone=True), server_default=func.now(), onupdate=func.now())
     
     # Relationships
     user = relationship("User", back_populates="payments")
     event = relationship("Event", back_populates="payments")
-    ticket = relationship("Ticket", back_populates="payment")
\ No newline at end of file
+    ticket = relationship("Ticket", back_populates="payment")
+    
+    # Indexes: pending payments are the few still being worked on, so only they
+    # are indexed, by hold expiry for the hold sweeper
+    __table_args__ = (
+        Index(
+            "ix_payments_pending_hold_expires_at", hold_expires_at,
+            postgresql_where=status == 'pending', sqlite_where=status == 'pending'
+        ),
+    )
+
+class EventSeat(Base):
+    """A seat of a reserved-seating event that is held or sold; free seats have no row.
+    
+    The primary key makes taking a seat an insert that fails when any
+    worker took it first. Holds belong to ``user_id`` until
+    ``hold_expires_at``; checkout attaches one to a payment
+    (``payment_reference``) and verification marks it sold.
+    """
+    __tablename__ = "event_seats"
+    
+    event_id = Column(Integer, ForeignKey("events.id"), primary_key=True)
+    seat_number = Column(String(20), primary_key=True)
+    status = Column(String(10), nullable=False, default='held')
+    user_id = Column(Integer, ForeignKey("users.id"), nullable=False)
+    payment_reference = Column(String(100), index=True)
+    hold_expires_at = Column(DateTime(timezone=True))
+    
+    # Holds are swept by expiry; sold seats are never swept
+    __table_args__ = (
+        Index(
+            "ix_event_seats_held_expires_at", hold_expires_at,
+            postgresql_where=status == 'held', sqlite_where=status == 'held'
+        ),
+    )
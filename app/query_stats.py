@@ -0,0 +1,156 @@
+import contextvars
+import logging
+import threading
+import time
+from typing import Dict, Iterable, Optional, Tuple
+
+from sqlalchemy import event
+from sqlalchemy.engine import Engine
+
+from .config import settings
+from .metrics import UNMATCHED_ROUTE, Histogram
+
+logger = logging.getLogger(__name__)
+
+# Characters of a statement kept in log lines
+STATEMENT_PREVIEW = 300
+
+
+class RequestQueries:
+    """Statements run while handling one request.
+
+    Statements are keyed by their SQL text: parameters are bound separately,
+    so the same query with different values has the same key, and a key seen
+    ``repeat_threshold`` times or more is probably a lookup run once per row
+    of an earlier result (N+1).
+    """
+
+    __slots__ = ("count", "seconds", "slowest", "slowest_statement", "shapes")
+
+    def __init__(self):
+        self.count = 0
+        self.seconds = 0.0
+        self.slowest = 0.0
+        self.slowest_statement: Optional[str] = None
+        self.shapes: Dict[str, int] = {}
+
+    def record(self, statement: str, seconds: float) -> None:
+        self.count += 1
+        self.seconds += seconds
+        if seconds > self.slowest:
+            self.slowest = seconds
+            self.slowest_statement = statement
+        self.shapes[statement] = self.shapes.get(statement, 0) + 1
+
+    def repeated(self, threshold: int) -> Dict[str, int]:
+        return {statement: count for statement, count in self.shapes.items() if count >= threshold}
+
+    def header(self, threshold: int) -> str:
+        return (
+            f"count={self.count}; time_ms={self.seconds * 1000:.3f}; "
+            f"slowest_ms={self.slowest * 1000:.3f}; repeated={len(self.repeated(threshold))}"
+        )
+
+
+# Statements of the request being handled; threadpool calls share the object
+current_queries: contextvars.ContextVar[Optional[RequestQueries]] = contextvars.ContextVar(
+    "current_queries", default=None
+)
+
+
+def redact(parameters) -> object:
+    """Parameter types without their values, which may hold emails, hashes or tokens."""
+    if isinstance(parameters, dict):
+        return {name: type(value).__name__ for name, value in parameters.items()}
+    if isinstance(parameters, (list, tuple)):
+        if parameters and isinstance(parameters[0], (dict, list, tuple)):
+            return f"<{len(parameters)} parameter sets>"
+        return tuple(type(value).__name__ for value in parameters)
+    return type(parameters).__name__
+
+
+class QueryLog:
+    """Per-request statement counts and DB time, N+1 warnings and slow statements.
+
+    Statement timings come from cursor events on every engine, so they also
+    cover the test and replica engines. ``finish`` runs on the event loop
+    thread once per request and aggregates per route, like ``Metrics``.
+    Statements also finish on threadpool threads, so the slow statement
+    counter takes a lock; only slow statements get that far.
+    """
+
+    def __init__(self, slow_threshold: float = 0.2, repeat_threshold: int = 5):
+        self.slow_threshold = slow_threshold
+        self.repeat_threshold = repeat_threshold
+        self.statements: Dict[Tuple[str, str], int] = {}
+        self.time: Dict[Tuple[str, str], Histogram] = {}
+        self.repeats: Dict[Tuple[str, str], int] = {}
+        self.slow = 0
+        self._lock = threading.Lock()
+
+    def begin(self) -> Tuple[RequestQueries, contextvars.Token]:
+        queries = RequestQueries()
+        return queries, current_queries.set(queries)
+
+    def observe(self, statement: str, parameters, seconds: float) -> None:
+        queries = current_queries.get()
+        if queries is not None:
+            queries.record(statement, seconds)
+        if seconds >= self.slow_threshold:
+            with self._lock:
+                self.slow += 1
+            logger.warning(
+                "Slow query (%.1f ms): %s params=%s",
+                seconds * 1000, statement[:STATEMENT_PREVIEW], redact(parameters)
+            )
+
+    def finish(self, method: str, route: Optional[str], queries: RequestQueries, token: contextvars.Token) -> None:
+        current_queries.reset(token)
+        if not queries.count:
+            return
+        key = (method, route or UNMATCHED_ROUTE)
+        self.statements[key] = self.statements.get(key, 0) + queries.count
+        histogram = self.time.get(key)
+        if histogram is None:
+            histogram = self.time[key] = Histogram()
+        histogram.observe(queries.seconds)
+        logger.debug(
+            "%s %s: %d statements in %.1f ms, slowest %.1f ms: %s",
+            method, key[1], queries.count, queries.seconds * 1000, queries.slowest * 1000,
+            (queries.slowest_statement or "")[:STATEMENT_PREVIEW]
+        )
+        repeated = queries.repeated(self.repeat_threshold)
+        if repeated:
+            self.repeats[key] = self.repeats.get(key, 0) + 1
+            statement, count = max(repeated.items(), key=lambda item: item[1])
+            logger.warning(
+                "Possible N+1 in %s %s: %d statements, %dx %s",
+                method, key[1], queries.count, count, statement[:STATEMENT_PREVIEW]
+            )
+
+    def samples(self, counts: Dict[Tuple[str, str], int]) -> Iterable[Tuple[dict, float]]:
+        return [({"method": method, "route": route}, value) for (method, route), value in list(counts.items())]
+
+    def reset(self) -> None:
+        self.statements.clear()
+        self.time.clear()
+        self.repeats.clear()
+        self.slow = 0
+
+
+query_log = QueryLog(
+    slow_threshold=settings.sql_slow_query_ms / 1000,
+    repeat_threshold=settings.sql_repeated_statement_threshold
+)
+
+
+@event.listens_for(Engine, "before_cursor_execute")
+def _statement_started(conn, cursor, statement, parameters, context, executemany):
+    context._query_start = time.perf_counter()
+
+
+@event.listens_for(Engine, "after_cursor_execute")
+def _statement_finished(conn, cursor, statement, parameters, context, executemany):
+    start = getattr(context, "_query_start", None)
+    if start is not None:
+        query_log.observe(statement, parameters, time.perf_counter() - start)
@@ -0,0 +1,357 @@
+import hashlib
+import mmap
+import os
+import struct
+import threading
+import time
+from collections import OrderedDict
+from typing import Callable, Protocol, Tuple
+
+try:
+    import fcntl
+except ImportError:  # Windows has no flock, only the memory backend is available there
+    fcntl = None
+
+# The backend enforcing one budget across the host's workers, where flock exists
+SHARED_BACKEND = "shared" if fcntl is not None else "memory"
+
+
+class RateLimiter(Protocol):
+    """Interface shared by the rate limiter backends"""
+
+    max_requests: int
+    window_seconds: int
+
+    def hit(self, key: str) -> Tuple[bool, float]: ...
+
+    def peek(self, key: str) -> Tuple[bool, float]: ...
+
+    def reset(self, key: str) -> None: ...
+
+    def clear(self) -> None: ...
+
+
+class SlidingWindowLimiter:
+    """Sliding-window counter rate limiter.
+
+    Every key keeps three integers: the index of its current fixed window, the
+    hits counted in that window and the hits counted in the window before it.
+    The rate over the sliding window is estimated by weighting the previous
+    window by how much of it still overlaps, so a check only ever touches the
+    calling key and costs O(1) regardless of how many clients are tracked.
+
+    Keys are kept in least-recently-used order. Idle keys are dropped lazily by
+    a bounded sweep of the oldest entries on every hit, and the table never
+    grows past ``max_keys`` (the least recently seen client is evicted first).
+    """
+
+    def __init__(
+        self,
+        max_requests: int = 100,
+        window_seconds: int = 60,
+        max_keys: int = 100_000,
+        sweep_batch: int = 4,
+        clock: Callable[[], float] = time.monotonic,
+    ):
+        self.max_requests = max_requests
+        self.window_seconds = window_seconds
+        self.max_keys = max_keys
+        self.sweep_batch = sweep_batch
+        self.clock = clock
+        # key -> [window index, hits in current window, hits in previous window]
+        self._entries: "OrderedDict[str, list]" = OrderedDict()
+
+    def __len__(self) -> int:
+        return len(self._entries)
+
+    def hit(self, key: str) -> Tuple[bool, float]:
+        """Register a request for ``key``.
+
+        Returns:
+            Tuple[bool, float]: Whether the request is allowed and, when it is
+            not, the number of seconds after which the client may retry.
+        """
+        now = self.clock()
+        window = int(now // self.window_seconds)
+        entries = self._entries
+
+        entry = entries.get(key)
+        if entry is None:
+            if len(entries) >= self.max_keys:
+                entries.popitem(last=False)
+            entry = [window, 0, 0]
+            entries[key] = entry
+        else:
+            entries.move_to_end(key)
+            if entry[0] != window:
+                entry[2] = entry[1] if entry[0] == window - 1 else 0
+                entry[1] = 0
+                entry[0] = window
+
+        self._sweep(window)
+
+        elapsed = now - window * self.window_seconds
+        overlap = 1.0 - elapsed / self.window_seconds
+        if entry[2] * overlap + entry[1] >= self.max_requests:
+            return False, _retry_after(self.max_requests, self.window_seconds, entry[1], entry[2], elapsed)
+
+        entry[1] += 1
+        return True, 0.0
+
+    def peek(self, key: str) -> Tuple[bool, float]:
+        """Check whether a hit for ``key`` would be allowed, without counting one."""
+        entry = self._entries.get(key)
+        if entry is None:
+            return self.max_requests > 0, 0.0
+        now = self.clock()
+        window = int(now // self.window_seconds)
+        current, previous = _rolled(entry[0], entry[1], entry[2], window)
+        elapsed = now - window * self.window_seconds
+        if previous * (1.0 - elapsed / self.window_seconds) + current >= self.max_requests:
+            return False, _retry_after(self.max_requests, self.window_seconds, current, previous, elapsed)
+        return True, 0.0
+
+    def reset(self, key: str) -> None:
+        """Forget everything recorded for ``key``."""
+        self._entries.pop(key, None)
+
+    def clear(self) -> None:
+        """Forget every tracked key."""
+        self._entries.clear()
+
+    def _sweep(self, window: int) -> None:
+        """Drop up to ``sweep_batch`` keys whose both windows have expired."""
+        entries = self._entries
+        for _ in range(self.sweep_batch):
+            if not entries:
+                return
+            key, entry = next(iter(entries.items()))
+            # Entries are ordered by last access, so the first live one ends the sweep.
+            if entry[0] >= window - 1:
+                return
+            del entries[key]
+
+
+def _rolled(slot_window: int, current: int, previous: int, window: int) -> Tuple[int, int]:
+    """Current and previous counts of a key as seen from ``window``."""
+    if slot_window == window:
+        return current, previous
+    return 0, (current if slot_window == window - 1 else 0)
+
+
+def _retry_after(max_requests: int, window_seconds: int, current: int, previous: int, elapsed: float) -> float:
+    """Seconds until the estimated rate drops below the limit again."""
+    if current >= max_requests or previous == 0:
+        return window_seconds - elapsed
+    # Solve previous * (1 - t / window) + current < max_requests for t.
+    needed = 1.0 - (max_requests - current) / previous
+    return max(needed * window_seconds - elapsed, 0.0) or 1.0
+
+
+class SharedSlidingWindowLimiter:
+    """Sliding-window counter limiter whose table lives in a shared mmap'd file.
+
+    Every worker process on the host maps the same file, so they all enforce
+    one global budget instead of one budget each. The table is a fixed array
+    of ``slots`` records (key digest, window index, current and previous hit
+    counts) addressed by open addressing over a short probe sequence, which
+    caps memory at ``slots`` * 24 bytes. Slots whose windows have expired are
+    reused lazily; when a probe sequence is full the stalest slot is evicted.
+
+    Updates are serialised with an exclusive ``flock`` on the file, held only
+    for the few unpack/pack operations of a single hit.
+    """
+
+    _SLOT = struct.Struct("<QqII")
+    _HEAD = struct.Struct("<Qq")
+    _PROBE = 8
+
+    def __init__(
+        self,
+        path: str,
+        max_requests: int = 100,
+        window_seconds: int = 60,
+        slots: int = 65_536,
+        clock: Callable[[], float] = time.time,
+    ):
+        self.path = path
+        self.max_requests = max_requests
+        self.window_seconds = window_seconds
+        self.slots = slots
+        self.clock = clock
+        self._lock = threading.Lock()
+        self._map = None
+        self._fd = -1
+        self._pid = None
+
+    def _table(self) -> mmap.mmap:
+        # Mappings and descriptors must not cross a fork, so each worker opens its own.
+        if self._map is None or self._pid != os.getpid():
+            size = self.slots * self._SLOT.size
+            fd = os.open(self.path, os.O_RDWR | os.O_CREAT, 0o600)
+            fcntl.flock(fd, fcntl.LOCK_EX)
+            try:
+                if os.fstat(fd).st_size < size:
+                    os.ftruncate(fd, size)
+            finally:
+                fcntl.flock(fd, fcntl.LOCK_UN)
+            self._map = mmap.mmap(fd, size)
+            self._fd = fd
+            self._pid = os.getpid()
+        return self._map
+
+    @staticmethod
+    def _digest(key: str) -> int:
+        # Zero marks an empty slot, so it is never used as a key digest.
+        digest = hashlib.blake2b(key.encode(), digest_size=8).digest()
+        return int.from_bytes(digest, "little") or 1
+
+    def _find(self, table: mmap.mmap, digest: int, window: int) -> Tuple[int, bool]:
+        """Return the offset for ``digest`` and whether it already lives there."""
+        slot_size = self._SLOT.size
+        unpack_head = self._HEAD.unpack_from
+        start = digest % self.slots
+        reusable = -1
+        stalest_offset, stalest_window = -1, None
+        for i in range(self._PROBE):
+            offset = (start + i) % self.slots * slot_size
+            slot_digest, slot_window = unpack_head(table, offset)
+            if slot_digest == digest:
+                return offset, True
+            if reusable < 0 and (slot_digest == 0 or slot_window < window - 1):
+                reusable = offset
+            if stalest_window is None or slot_window < stalest_window:
+                stalest_offset, stalest_window = offset, slot_window
+        return (reusable if reusable >= 0 else stalest_offset), False
+
+    def hit(self, key: str) -> Tuple[bool, float]:
+        """Register a request for ``key`` against the shared budget."""
+        digest = self._digest(key)
+        now = self.clock()
+        window = int(now // self.window_seconds)
+        elapsed = now - window * self.window_seconds
+        overlap = 1.0 - elapsed / self.window_seconds
+
+        with self._lock:
+            table = self._table()
+            fcntl.flock(self._fd, fcntl.LOCK_EX)
+            try:
+                offset, found = self._find(table, digest, window)
+                current = previous = 0
+                if found:
+                    _, slot_window, current, previous = self._SLOT.unpack_from(table, offset)
+                    current, previous = _rolled(slot_window, current, previous, window)
+
+                allowed = previous * overlap + current < self.max_requests
+                if allowed:
+                    current += 1
+                self._SLOT.pack_into(table, offset, digest, window, current, previous)
+            finally:
+                fcntl.flock(self._fd, fcntl.LOCK_UN)
+
+        if allowed:
+            return True, 0.0
+        return False, _retry_after(self.max_requests, self.window_seconds, current, previous, elapsed)
+
+    def peek(self, key: str) -> Tuple[bool, float]:
+        """Check whether a hit for ``key`` would be allowed, without counting one."""
+        digest = self._digest(key)
+        now = self.clock()
+        window = int(now // self.window_seconds)
+        elapsed = now - window * self.window_seconds
+
+        with self._lock:
+            table = self._table()
+            fcntl.flock(self._fd, fcntl.LOCK_SH)
+            try:
+                offset, found = self._find(table, digest, window)
+                if not found:
+                    return self.max_requests > 0, 0.0
+                _, slot_window, current, previous = self._SLOT.unpack_from(table, offset)
+            finally:
+                fcntl.flock(self._fd, fcntl.LOCK_UN)
+
+        current, previous = _rolled(slot_window, current, previous, window)
+        if previous * (1.0 - elapsed / self.window_seconds) + current >= self.max_requests:
+            return False, _retry_after(self.max_requests, self.window_seconds, current, previous, elapsed)
+        return True, 0.0
+
+    def reset(self, key: str) -> None:
+        """Forget everything recorded for ``key``."""
+        digest = self._digest(key)
+        with self._lock:
+            table = self._table()
+            fcntl.flock(self._fd, fcntl.LOCK_EX)
+            try:
+                offset, found = self._find(table, digest, 0)
+                if found:
+                    self._SLOT.pack_into(table, offset, 0, 0, 0, 0)
+            finally:
+                fcntl.flock(self._fd, fcntl.LOCK_UN)
+
+    def clear(self) -> None:
+        """Forget every tracked key."""
+        with self._lock:
+            table = self._table()
+            fcntl.flock(self._fd, fcntl.LOCK_EX)
+            try:
+                table[:] = bytes(len(table))
+            finally:
+                fcntl.flock(self._fd, fcntl.LOCK_UN)
+
+
+class LoginAttemptTracker:
+    """Failed login counters per account and per client address.
+
+    Each side is a limiter whose window is the lockout duration: a failed
+    login counts one hit, and once the decaying count reaches the limit the
+    account or address stays locked until it decays below it again. Checks
+    only read the counters, so locked attempts cost no database query and no
+    bcrypt work. With the shared backend (``SHARED_BACKEND``, what the app
+    uses) every worker sees the same counts.
+    """
+
+    def __init__(self, accounts: RateLimiter, addresses: RateLimiter):
+        self.accounts = accounts
+        self.addresses = addresses
+
+    @staticmethod
+    def _account_key(email: str) -> str:
+        return f"account:{email.strip().lower()}"
+
+    def check(self, email: str, address: str) -> Tuple[bool, float]:
+        """Return whether a login may be attempted and, if not, when to retry."""
+        allowed, retry_after = self.accounts.peek(self._account_key(email))
+        if not allowed:
+            return False, retry_after
+        return self.addresses.peek(address)
+
+    def record_failure(self, email: str, address: str) -> None:
+        self.accounts.hit(self._account_key(email))
+        self.addresses.hit(address)
+
+    def record_success(self, email: str) -> None:
+        self.accounts.reset(self._account_key(email))
+
+    def clear(self) -> None:
+        self.accounts.clear()
+        self.addresses.clear()
+
+
+def create_limiter(
+    backend: str,
+    max_requests: int,
+    window_seconds: int,
+    max_keys: int = 100_000,
+    storage_path: str | None = None,
+) -> RateLimiter:
+    """Build the limiter selected by ``backend`` ("memory" or "shared")."""
+    if backend == "memory":
+        return SlidingWindowLimiter(max_requests, window_seconds, max_keys=max_keys)
+    if backend == "shared":
+        if fcntl is None:
+            raise ValueError("The shared rate limit backend needs fcntl, which this platform lacks")
+        if not storage_path:
+            raise ValueError("The shared rate limit backend needs a storage path")
+        return SharedSlidingWindowLimiter(storage_path, max_requests, window_seconds, slots=max_keys)
+    raise ValueError(f"Unknown rate limit backend: {backend}")
@@ -0,0 +1,168 @@
+import asyncio
+import contextvars
+import itertools
+import logging
+from typing import Dict, Optional
+
+from fastapi import Request
+from sqlalchemy import event, text
+from sqlalchemy.ext.asyncio import AsyncEngine
+from sqlalchemy.orm import Session
+from sqlalchemy.sql import Select
+
+from .cache import TTLCache
+from .config import settings
+
+logger = logging.getLogger(__name__)
+
+# Postgres standby lag; 0 while the replica has replayed everything it received,
+# so an idle primary does not make a caught-up replica look stale
+POSTGRES_LAG_QUERY = text(
+    "SELECT CASE WHEN pg_last_wal_receive_lsn() = pg_last_wal_replay_lsn() THEN 0 "
+    "ELSE COALESCE(EXTRACT(EPOCH FROM now() - pg_last_xact_replay_timestamp()), 0) END"
+)
+
+# ASGI scope of the request being handled, for attributing commits to a caller
+request_scope: contextvars.ContextVar[Optional[dict]] = contextvars.ContextVar("request_scope", default=None)
+
+
+async def bind_request_scope(request: Request) -> None:
+    """App-wide dependency making the current request visible to session events
+
+    Async so the context variable is set in the request's own context, which
+    sync endpoints inherit when they are sent to the threadpool.
+    """
+    request_scope.set(request.scope)
+
+
+def caller_key(scope: Optional[dict]) -> Optional[str]:
+    """Identify the caller: their bearer token, or their address when anonymous."""
+    if scope is None:
+        return None
+    for name, value in scope.get("headers", ()):
+        if name == b"authorization":
+            return value.decode("latin-1")
+    client = scope.get("client")
+    return client[0] if client else None
+
+
+class RoutingSession(Session):
+    """Session that sends reads to ``info["replica"]`` when one is set.
+
+    Everything else, and every statement once the session has flushed, goes
+    to the primary it is bound to, so a request always reads its own writes.
+    """
+
+    def get_bind(self, mapper=None, clause=None, **kwargs):
+        replica = self.info.get("replica")
+        if replica is not None and isinstance(clause, Select) and not self.info.get("wrote") and not self._flushing:
+            return replica
+        return super().get_bind(mapper=mapper, clause=clause, **kwargs)
+
+
+class ReadYourWrites:
+    """Callers who committed a write recently; their reads stay on the primary.
+
+    Tracked per worker, so a caller whose next request lands on another
+    worker may still be served by a replica there; reads that must never be
+    stale should use the primary session (``get_async_db``) directly.
+    """
+
+    def __init__(self, window: float, max_entries: int = 100_000):
+        self.window = window
+        self._callers: TTLCache[bool] = TTLCache(max_entries, window)
+
+    def mark(self, key: Optional[str]) -> None:
+        if key is not None:
+            self._callers.set(key, True)
+
+    def recent(self, key: Optional[str]) -> bool:
+        return key is not None and self._callers.get(key) is not None
+
+    def clear(self) -> None:
+        self._callers.clear()
+
+
+read_your_writes = ReadYourWrites(settings.read_your_writes_seconds)
+
+
+@event.listens_for(Session, "after_flush")
+def _session_wrote(session, flush_context):
+    session.info["wrote"] = True
+
+
+@event.listens_for(Session, "after_commit")
+def _session_committed(session):
+    # "wrote" stays set: sessions live for one request, whose later reads stay on the primary
+    if session.info.get("wrote"):
+        read_your_writes.mark(caller_key(request_scope.get()))
+
+
+class ReplicaSet:
+    """Read replicas with their last measured lag.
+
+    A background task measures every replica's replication lag each
+    ``interval`` seconds. ``choose`` round-robins over the replicas whose lag
+    is at most ``max_lag`` and returns None (use the primary) when there is
+    none, including when a replica cannot be reached.
+    """
+
+    def __init__(self, engines: Dict[str, AsyncEngine], max_lag: float = 5.0, interval: float = 5.0):
+        self.engines = engines
+        self.max_lag = max_lag
+        self.interval = interval
+        self.lag: Dict[str, Optional[float]] = {name: None for name in engines}
+        self._cycle = itertools.count()
+        self._task: Optional[asyncio.Task] = None
+
+    def __bool__(self) -> bool:
+        return bool(self.engines)
+
+    async def measure(self, engine: AsyncEngine) -> float:
+        if engine.dialect.name != "postgresql":
+            return 0.0
+        async with engine.connect() as conn:
+            return float((await conn.execute(POSTGRES_LAG_QUERY)).scalar() or 0.0)
+
+    async def check(self) -> None:
+        for name, engine in self.engines.items():
+            try:
+                self.lag[name] = await asyncio.wait_for(self.measure(engine), timeout=self.interval)
+            except Exception:
+                logger.warning("Replica %s is unreachable, reading from the primary", name, exc_info=True)
+                self.lag[name] = None
+
+    def choose(self) -> Optional[AsyncEngine]:
+        healthy = [
+            engine for name, engine in self.engines.items()
+            if self.lag[name] is not None and self.lag[name] <= self.max_lag
+        ]
+        if not healthy:
+            return None
+        return healthy[next(self._cycle) % len(healthy)]
+
+    async def start(self) -> None:
+        if not self.engines:
+            return
+        await self.check()
+
+        async def run():
+            while True:
+                await asyncio.sleep(self.interval)
+                await self.check()
+
+        self._task = asyncio.create_task(run())
+
+    async def stop(self) -> None:
+        if self._task is not None:
+            self._task.cancel()
+            try:
+                await self._task
+            except asyncio.CancelledError:
+                pass
+            self._task = None
+        for engine in self.engines.values():
+            await engine.dispose()
+
+    def status(self) -> Dict[str, Optional[float]]:
+        return dict(self.lag)
@@ -0,0 +1,179 @@
+import logging
+import threading
+import time
+from datetime import datetime, timezone
+from typing import Callable, Dict, Optional, Set, Tuple, Union
+
+from sqlalchemy import or_
+from sqlalchemy.exc import SQLAlchemyError
+from sqlalchemy.ext.asyncio import AsyncSession
+from sqlalchemy.orm import Session
+
+from . import models
+from .config import settings
+
+logger = logging.getLogger(__name__)
+
+
+def _timestamp(value: datetime) -> float:
+    # SQLite hands back naive datetimes; everything is stored in UTC
+    if value.tzinfo is None:
+        value = value.replace(tzinfo=timezone.utc)
+    return value.timestamp()
+
+
+class RevocationSet:
+    """Minimum valid token version per user, mirrored from token_revocations.
+
+    Tokens carry the ``token_version`` their user had when they were issued.
+    Revoking a user's tokens bumps that version and appends a row; a token is
+    revoked when its version is below the newest row for its user. A row only
+    matters while an access token issued before it can still be alive, so
+    rows expire after the access token lifetime and the set only ever holds
+    the users revoked in that window.
+
+    Revocations made by this worker apply immediately. Those made by other
+    workers are picked up by a background thread that loads the rows past
+    the highest id seen every ``interval`` seconds. Ids are assigned when a
+    row is inserted but it only becomes visible when its transaction
+    commits, so a row can show up behind one with a higher id: each refresh
+    also re-reads the rows written up to ``overlap`` seconds before the
+    previous one.
+    """
+
+    def __init__(
+        self, retention: float, interval: float = 5.0, overlap: float = 60.0, clock: Callable[[], float] = time.time
+    ):
+        self.retention = retention
+        self.interval = interval
+        self.overlap = overlap
+        self.clock = clock
+        # user id -> (minimum valid version, time the entry can be forgotten)
+        self._versions: Dict[int, Tuple[int, float]] = {}
+        self._last_id = 0
+        self._refreshed_at: Optional[float] = None
+        # Ids of the rows the next refresh re-reads, so they are counted once
+        self._recent_ids: Set[int] = set()
+        self._lock = threading.Lock()
+        self._stop = threading.Event()
+        self._thread: Optional[threading.Thread] = None
+
+    def __len__(self) -> int:
+        return len(self._versions)
+
+    def is_revoked(self, user_id: int, version: int) -> bool:
+        entry = self._versions.get(user_id)
+        return entry is not None and version < entry[0]
+
+    def revoke(self, user_id: int, version: int, expires_at: Optional[float] = None) -> None:
+        """Mark tokens of ``user_id`` older than ``version`` as revoked."""
+        if expires_at is None:
+            expires_at = self.clock() + self.retention
+        with self._lock:
+            current = self._versions.get(user_id)
+            if current is None or version >= current[0]:
+                self._versions[user_id] = (version, max(expires_at, current[1] if current else 0.0))
+
+    def record(self, db: Union[Session, AsyncSession], user_id: int, version: int) -> None:
+        """Add a revocation row to ``db``'s session; call ``revoke`` after the commit."""
+        expires_at = self.clock() + self.retention
+        db.add(models.TokenRevocation(
+            user_id=user_id,
+            token_version=version,
+            expires_at=datetime.fromtimestamp(expires_at, timezone.utc)
+        ))
+
+    def refresh(self, db: Session) -> int:
+        """Load the rows written since the last refresh; returns how many were new."""
+        now = self.clock()
+        revocation = models.TokenRevocation
+        query = db.query(revocation).filter(revocation.expires_at > datetime.fromtimestamp(now, timezone.utc))
+        if self._refreshed_at is not None:
+            # A row expires ``retention`` after it was written
+            written_since = self._refreshed_at - self.overlap + self.retention
+            query = query.filter(or_(
+                revocation.id > self._last_id,
+                revocation.expires_at > datetime.fromtimestamp(written_since, timezone.utc)
+            ))
+        new = 0
+        recent_ids = set()
+        reread_after = now - self.overlap + self.retention
+        for row in query.order_by(revocation.id).all():
+            expires_at = _timestamp(row.expires_at)
+            if row.id not in self._recent_ids:
+                self.revoke(row.user_id, row.token_version, expires_at)
+                new += 1
+            if expires_at > reread_after:
+                recent_ids.add(row.id)
+            self._last_id = max(self._last_id, row.id)
+        self._recent_ids = recent_ids
+        self._refreshed_at = now
+        self.prune(now)
+        return new
+
+    def prune(self, now: Optional[float] = None) -> None:
+        """Forget entries no live access token can be affected by."""
+        now = self.clock() if now is None else now
+        with self._lock:
+            expired = [user_id for user_id, (_, expires_at) in self._versions.items() if expires_at <= now]
+            for user_id in expired:
+                del self._versions[user_id]
+
+    def purge(self, db: Session) -> int:
+        """Delete expired rows from the database."""
+        deleted = (
+            db.query(models.TokenRevocation)
+            .filter(models.TokenRevocation.expires_at <= datetime.fromtimestamp(self.clock(), timezone.utc))
+            .delete(synchronize_session=False)
+        )
+        db.commit()
+        return deleted
+
+    def start(self, session_factory: Callable[[], Session]) -> None:
+        """Load current revocations, then keep following the table in the background."""
+        def load():
+            db = session_factory()
+            try:
+                self.refresh(db)
+            except SQLAlchemyError:
+                logger.exception("Could not load token revocations")
+            finally:
+                db.close()
+
+        def run():
+            purged_at = self.clock()
+            while not self._stop.wait(self.interval):
+                load()
+                if self.clock() - purged_at >= self.retention:
+                    purged_at = self.clock()
+                    db = session_factory()
+                    try:
+                        self.purge(db)
+                    except SQLAlchemyError:
+                        db.rollback()
+                    finally:
+                        db.close()
+
+        load()
+        self._stop.clear()
+        self._thread = threading.Thread(target=run, name="token-revocation-refresher", daemon=True)
+        self._thread.start()
+
+    def stop(self) -> None:
+        self._stop.set()
+        if self._thread is not None:
+            self._thread.join()
+            self._thread = None
+
+    def clear(self) -> None:
+        with self._lock:
+            self._versions.clear()
+        self._last_id = 0
+        self._refreshed_at = None
+        self._recent_ids = set()
+
+
+revocations = RevocationSet(
+    retention=settings.jwt_access_token_expire_minutes * 60,
+    interval=settings.token_revocation_refresh_seconds
+)
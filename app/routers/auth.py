@@ -1,50 +1,142 @@
-from fastapi import APIRouter, Depends, HTTPException, status
-from sqlalchemy.orm import Session
+from fastapi import APIRouter, Depends, HTTPException, Request, status
+from sqlalchemy.ext.asyncio import AsyncSession
 from datetime import timedelta
+import math
 from typing import List
 
 from .. import schemas
-from ..database import get_db
+from ..database import get_async_db
 from ..cruds import users as user_crud
-from ..security import create_access_token, ACCESS_TOKEN_EXPIRE_MINUTES
+from ..security import (
+    create_access_token, create_refresh_token, login_attempts, password_hasher, token_claims, verify_token,
+    PasswordHasherBusy, ACCESS_TOKEN_EXPIRE_MINUTES
+)
 from ..auth import get_current_user
+from ..metrics import ThreadpoolWaitRoute
 from .. import models
 
-router = APIRouter(prefix="/auth", tags=["Authentication"])
+router = APIRouter(prefix="/auth", tags=["Authentication"], route_class=ThreadpoolWaitRoute)
+
+def hasher_busy(error: PasswordHasherBusy) -> HTTPException:
+    return HTTPException(
+        status_code=status.HTTP_503_SERVICE_UNAVAILABLE,
+        detail="Too many sign-in attempts in progress. Please try again shortly.",
+        headers={"Retry-After": str(error.retry_after)}
+    )
 
 @router.post("/register", response_model=schemas.UserResponse, status_code=status.HTTP_201_CREATED)
-def register_user(user: schemas.UserCreate, db: Session = Depends(get_db)):
-    """Register a new user"""
+async def register_user(user: schemas.UserCreate, db: AsyncSession = Depends(get_async_db)):
+    """Register a new user
+    
+    bcrypt runs on the password hashing pool and database work on the async
+    engine, so no request thread is held at any point.
+    """
+    if await user_crud.get_user_by_email_async(db, user.email):
+        raise HTTPException(status_code=status.HTTP_400_BAD_REQUEST, detail="Email already registered")
     try:
-        db_user = user_crud.create_user(db=db, user=user)
-        return db_user
+        password_hash = await password_hasher.hash(user.password)
+    except PasswordHasherBusy as e:
+        raise hasher_busy(e)
+    try:
+        return await user_crud.create_user_async(db, user, password_hash)
     except ValueError as e:
         raise HTTPException(status_code=status.HTTP_400_BAD_REQUEST, detail=str(e))
 
 @router.post("/login", response_model=schemas.LoginResponse)
-def login(user_login: schemas.UserLogin, db: Session = Depends(get_db)):
-    """Login and get JWT token"""
-    user = user_crud.authenticate_user(db, user_login.email, user_login.password)
+async def login(user_login: schemas.UserLogin, request: Request, db: AsyncSession = Depends(get_async_db)):
+    """Login and get JWT token
+    
+    Accounts and client addresses with too many recent failures are refused
+    before any database or bcrypt work is done. Hashes made with another
+    bcrypt cost than the current one are replaced on a successful login.
+    """
+    client_ip = request.client.host if request.client else "unknown"
+    allowed, retry_after = login_attempts.check(user_login.email, client_ip)
+    if not allowed:
+        raise HTTPException(
+            status_code=status.HTTP_429_TOO_MANY_REQUESTS,
+            detail="Too many failed login attempts. Please try again later.",
+            headers={"Retry-After": str(math.ceil(retry_after))}
+        )
+    
+    user = await user_crud.get_user_by_email_async(db, user_login.email)
     
-    if not user:
+    authenticated, new_hash = False, None
+    if user is not None and user.is_active is True:
+        try:
+            authenticated, new_hash = await password_hasher.verify_and_update(
+                user_login.password, str(user.password_hash)
+            )
+        except PasswordHasherBusy as e:
+            raise hasher_busy(e)
+    
+    if not authenticated:
+        login_attempts.record_failure(user_login.email, client_ip)
         raise HTTPException(
             status_code=status.HTTP_401_UNAUTHORIZED,
             detail="Incorrect email or password"
         )
+    login_attempts.record_success(user_login.email)
+    if new_hash:
+        # The stored hash predates the current bcrypt cost
+        user = await user_crud.update_password_hash_async(db, user, new_hash)
     
-    access_token = create_access_token(
-        data={"sub": user.email}, 
-        expires_delta=timedelta(minutes=ACCESS_TOKEN_EXPIRE_MINUTES)
-    )
-    
+    claims = token_claims(user)
     return schemas.LoginResponse(
         message="Login successful",
-        access_token=access_token,
+        access_token=create_access_token(claims, expires_delta=timedelta(minutes=ACCESS_TOKEN_EXPIRE_MINUTES)),
         token_type="bearer",
+        refresh_token=create_refresh_token(claims),
+        expires_in=ACCESS_TOKEN_EXPIRE_MINUTES * 60,
         user=schemas.UserResponse.model_validate(user)
     )
 
+@router.post("/refresh", response_model=schemas.Token)
+async def refresh_token(request: schemas.RefreshRequest, db: AsyncSession = Depends(get_async_db)):
+    """Exchange a refresh token for a new access and refresh token
+    
+    Unlike access tokens, refresh tokens are checked against the user's
+    current token version and status, so a revoked session cannot mint new
+    access tokens.
+    """
+    credentials_exception = HTTPException(
+        status_code=status.HTTP_401_UNAUTHORIZED,
+        detail="Invalid refresh token",
+        headers={"WWW-Authenticate": "Bearer"},
+    )
+    token_data = verify_token(request.refresh_token, token_type="refresh")
+    if token_data is None or token_data["user_id"] is None:
+        raise credentials_exception
+    
+    user = await user_crud.get_user_async(db, token_data["user_id"])
+    if user is None or user.is_active is not True or (user.token_version or 0) != token_data["version"]:
+        raise credentials_exception
+    
+    claims = token_claims(user)
+    return schemas.Token(
+        access_token=create_access_token(claims, expires_delta=timedelta(minutes=ACCESS_TOKEN_EXPIRE_MINUTES)),
+        token_type="bearer",
+        refresh_token=create_refresh_token(claims),
+        expires_in=ACCESS_TOKEN_EXPIRE_MINUTES * 60
+    )
+
+@router.post("/logout", status_code=status.HTTP_204_NO_CONTENT)
+async def logout(
+    current_user: schemas.AuthenticatedUser = Depends(get_current_user),
+    db: AsyncSession = Depends(get_async_db)
+):
+    """Revoke every access and refresh token issued to the current user"""
+    user = await user_crud.get_user_async(db, current_user.id)
+    if user is not None:
+        await user_crud.revoke_user_tokens_async(db, user)
+
 @router.get("/me", response_model=schemas.UserResponse)
-def get_current_user_info(current_user: models.User = Depends(get_current_user)):
+async def get_current_user_info(
+    current_user: schemas.AuthenticatedUser = Depends(get_current_user),
+    db: AsyncSession = Depends(get_async_db)
+):
     """Get current user information"""
-    return current_user
\ No newline at end of file
+    user = await user_crud.get_user_async(db, current_user.id)
+    if user is None:
+        raise HTTPException(status_code=status.HTTP_404_NOT_FOUND, detail="User not found")
+    return user
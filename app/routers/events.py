@@ -1,33 +1,237 @@
-from fastapi import APIRouter, Depends, HTTPException, status
-from sqlalchemy.orm import Session
-from typing import Any, List
+from fastapi import APIRouter, Depends, Header, HTTPException, Query, Request, Response, status
+from fastapi.responses import StreamingResponse
+from pydantic import TypeAdapter
+from sqlalchemy.ext.asyncio import AsyncSession, async_sessionmaker
+from datetime import datetime
+from decimal import Decimal
+from typing import Any, AsyncIterator, Awaitable, Callable, Dict, List, Literal, Optional, Tuple, cast
+import math
 
 from .. import schemas
-from ..database import get_db
+from ..cache import CachedResponse, event_cache
+from ..config import settings
+from ..database import get_async_db, get_async_session_factory, get_read_db
 from ..cruds import events as event_crud
+from ..cruds import seating as seating_crud
+from ..cruds import tickets as ticket_crud
 from ..auth import get_current_user
+from ..metrics import ThreadpoolWaitRoute
+from ..pagination import MAX_PAGE_SIZE, decode_cursor, encode_cursor
+from ..replicas import caller_key, read_your_writes
+from ..seating import EventSeats
+from ..serialization import RowSerializer
+from ..waiting_room import Place, waiting_room
 from .. import models
 
-router = APIRouter(prefix="/events", tags=["Events"])
+EVENT = TypeAdapter(schemas.EventResponse)
+EVENT_ROWS = RowSerializer(models.Event, schemas.EventResponse, overrides={"tickets_sold": models.Event.tickets_sold_total})
+ATTENDEE_ROWS = RowSerializer(models.Ticket, schemas.AttendeeExport, overrides={
+    "name": models.User.name,
+    "email": models.User.email,
+    "phone": models.User.phone,
+    "payment_reference": models.Payment.paystack_reference,
+    "payment_status": models.Payment.status,
+    "paid_at": models.Payment.paid_at,
+})
+EXPORT_MEDIA_TYPES = {"csv": "text/csv; charset=utf-8", "ndjson": "application/x-ndjson"}
+
+router = APIRouter(prefix="/events", tags=["Events"], route_class=ThreadpoolWaitRoute)
 
 @router.post("/", response_model=schemas.EventResponse, status_code=status.HTTP_201_CREATED)
-def create_event(
+async def create_event(
     event: schemas.EventCreate,
-    db: Session = Depends(get_db),
+    db: AsyncSession = Depends(get_async_db),
     current_user: Any = Depends(get_current_user)
 ):
     """Create a new event (requires authentication)"""
-    return event_crud.create_event(db, event, current_user.id)
+    if event.venue_id is not None and await db.get(models.Venue, event.venue_id) is None:
+        raise HTTPException(status_code=status.HTTP_404_NOT_FOUND, detail="Venue not found")
+    return await event_crud.create_event_async(db, event, current_user.id)
+
+def next_page(request: Request, events: list, limit: int) -> Tuple[list, Dict[str, str]]:
+    """Trim the extra row fetched past ``limit``, with headers announcing the next page's cursor"""
+    if len(events) <= limit:
+        return events, {}
+    events = events[:limit]
+    next_cursor = encode_cursor(events[-1].event_date, events[-1].id)
+    next_url = request.url.remove_query_params("skip").include_query_params(cursor=next_cursor)
+    return events, {"X-Next-Cursor": next_cursor, "Link": f'<{next_url}>; rel="next"'}
+
+async def cached_json(request: Request, load: Callable[[], Awaitable[CachedResponse]]) -> Response:
+    """Serve ``load``'s response from the event cache, or 304 if the client has it
+    
+    Callers who wrote recently read the primary rather than what other
+    callers cached from a replica, so they skip the cache.
+    """
+    if read_your_writes.recent(caller_key(request.scope)):
+        cached = await load()
+    else:
+        cached = await event_cache.get_or_load(str(request.url), load)
+    if cached.matches(request.headers.get("if-none-match")):
+        return Response(status_code=status.HTTP_304_NOT_MODIFIED, headers={"ETag": cached.etag})
+    return Response(cached.body, media_type="application/json", headers={"ETag": cached.etag, **cached.headers})
 
 @router.get("/", response_model=List[schemas.EventResponse])
-def list_events(skip: int = 0, limit: int = 100, db: Session = Depends(get_db)):
-    """List all active events (public endpoint)"""
-    return event_crud.get_events(db, skip, limit)
+async def list_events(
+    request: Request,
+    skip: int = Query(0, ge=0),
+    limit: int = Query(MAX_PAGE_SIZE, ge=1, le=MAX_PAGE_SIZE),
+    cursor: Optional[str] = None,
+    db: AsyncSession = Depends(get_read_db)
+):
+    """List active events by date (public endpoint)
+    
+    When there are more events, the ``X-Next-Cursor`` header (and a ``Link``
+    header with rel="next") holds the cursor for the following page. Cursor
+    pages seek past the previous page in the (event_date, id) index, so they
+    stay as fast as the first page however deep they go; ``skip`` is kept
+    for existing clients.
+    
+    Pages are cached as encoded JSON with an ``ETag``; a request whose
+    ``If-None-Match`` holds it gets a 304.
+    """
+    after = decode_cursor(cursor) if cursor else None
+    
+    async def load() -> CachedResponse:
+        # One extra row tells whether a next page exists without another query
+        events = await event_crud.get_event_rows_async(db, EVENT_ROWS.columns, skip, limit + 1, after)
+        events, headers = next_page(request, events, limit)
+        return CachedResponse.from_body(EVENT_ROWS.dump_json(events), headers)
+    
+    return await cached_json(request, load)
+
+@router.get("/search", response_model=List[schemas.EventResponse])
+async def search_events(
+    request: Request,
+    q: Optional[str] = Query(None, max_length=200),
+    category_id: Optional[int] = None,
+    date_from: Optional[datetime] = None,
+    date_to: Optional[datetime] = None,
+    min_price: Optional[Decimal] = Query(None, ge=0),
+    max_price: Optional[Decimal] = Query(None, ge=0),
+    limit: int = Query(MAX_PAGE_SIZE, ge=1, le=MAX_PAGE_SIZE),
+    cursor: Optional[str] = None,
+    db: AsyncSession = Depends(get_read_db)
+):
+    """Search active events by text, category, date and price (public endpoint)
+    
+    ``q`` matches every word against the title, description and location,
+    the last word as a prefix. Date and price bounds are inclusive. Results
+    come by date and page with cursors like the event list.
+    """
+    after = decode_cursor(cursor) if cursor else None
+    events = await event_crud.search_event_rows_async(
+        db, EVENT_ROWS.columns, limit + 1, after,
+        query=q, category_id=category_id, date_from=date_from, date_to=date_to,
+        min_price=min_price, max_price=max_price
+    )
+    events, headers = next_page(request, events, limit)
+    return Response(EVENT_ROWS.dump_json(events), media_type="application/json", headers=headers)
 
 @router.get("/{event_id}", response_model=schemas.EventResponse)
-def get_event(event_id: int, db: Session = Depends(get_db)):
-    """Get event details (public endpoint)"""
-    event = event_crud.get_event(db, event_id)
-    if not event:
+async def get_event(request: Request, event_id: int, db: AsyncSession = Depends(get_read_db)):
+    """Get event details (public endpoint), cached like the event list"""
+    async def load() -> CachedResponse:
+        event = await event_crud.get_event_async(db, event_id)
+        if not event:
+            raise HTTPException(status_code=status.HTTP_404_NOT_FOUND, detail="Event not found")
+        return CachedResponse.from_body(EVENT.dump_json(EVENT.validate_python(event)))
+    
+    return await cached_json(request, load)
+
+def queue_position(response: Response, token: str, place: Place) -> schemas.QueuePosition:
+    response.headers["Cache-Control"] = "no-store"
+    if not place.admitted:
+        response.headers["Retry-After"] = str(max(1, math.ceil(place.wait_seconds)))
+    return schemas.QueuePosition(
+        token=token, admitted=place.admitted, position=place.position, wait_seconds=place.wait_seconds
+    )
+
+@router.post("/{event_id}/queue", response_model=schemas.QueuePosition)
+async def join_queue(event_id: int, response: Response, current_user: Any = Depends(get_current_user)):
+    """Join the event's waiting room; checkout opens once the returned token is admitted"""
+    token = waiting_room.join(event_id, current_user.id)
+    return queue_position(response, token, cast(Place, waiting_room.place(token)))
+
+@router.get("/{event_id}/queue", response_model=schemas.QueuePosition)
+async def queue_status(event_id: int, response: Response, x_queue_token: str = Header()):
+    """Position of a waiting room token, answered from the token alone (no database access)"""
+    place = waiting_room.place(x_queue_token)
+    if place is None or place.event_id != event_id:
+        raise HTTPException(status_code=status.HTTP_403_FORBIDDEN, detail="Invalid queue token")
+    if place.expired:
+        raise HTTPException(status_code=status.HTTP_410_GONE, detail="Queue token expired; join the waiting room again")
+    return queue_position(response, x_queue_token, place)
+
+async def seated_event(db: AsyncSession, event_id: int) -> models.Event:
+    event = await db.get(models.Event, event_id)
+    if event is None:
+        raise HTTPException(status_code=status.HTTP_404_NOT_FOUND, detail="Event not found")
+    if event.venue_id is None:
+        raise HTTPException(status_code=status.HTTP_404_NOT_FOUND, detail="Event has no reserved seating")
+    return event
+
+@router.get("/{event_id}/seats", response_model=schemas.SeatAvailability)
+async def get_seats(event_id: int, db: AsyncSession = Depends(get_async_db)):
+    """Seat availability of a reserved-seating event as one bitmap per section (public endpoint)
+    
+    Served from this worker's copy of the event's seats, so it can be up to
+    SEAT_MAP_REFRESH_SECONDS behind holds made on other workers.
+    """
+    event = await seated_event(db, event_id)
+    state = cast(EventSeats, await seating_crud.event_seats_async(db, event.id, event.venue_id))
+    with state.lock:
+        return {"event_id": event_id, "available": state.available(), "sections": state.snapshot()}
+
+@router.post("/{event_id}/seats/hold", response_model=schemas.SeatHoldResponse)
+async def hold_seats(
+    event_id: int,
+    request: schemas.SeatHoldRequest,
+    db: AsyncSession = Depends(get_async_db),
+    current_user: Any = Depends(get_current_user)
+):
+    """Hold the best adjacent seats for checkout (requires authentication)
+    
+    Each held seat is bought with its own payment (``seat_number`` in
+    POST /payments/initialize) before the hold expires.
+    """
+    event = await seated_event(db, event_id)
+    held = await seating_crud.hold_seats_async(
+        db, event.id, cast(int, event.venue_id), current_user.id, request.count, request.section,
+        settings.seat_hold_seconds
+    )
+    if held is None:
+        raise HTTPException(status_code=status.HTTP_409_CONFLICT, detail=f"No {request.count} adjacent seats available")
+    seats, expires_at = held
+    return schemas.SeatHoldResponse(seats=seats, expires_at=expires_at)
+
+@router.get("/{event_id}/attendees", response_class=StreamingResponse)
+async def export_attendees(
+    event_id: int,
+    format: Literal["csv", "ndjson"] = "csv",
+    db: AsyncSession = Depends(get_async_db),
+    session_factory: async_sessionmaker = Depends(get_async_session_factory),
+    current_user: Any = Depends(get_current_user)
+):
+    """Download every ticket of an event with its holder and payment (event organizer only)
+    
+    The export is streamed as CSV (with a header row) or NDJSON, one batch
+    of tickets at a time, so it costs the same memory for any event size.
+    """
+    event = await db.get(models.Event, event_id)
+    if event is None:
         raise HTTPException(status_code=status.HTTP_404_NOT_FOUND, detail="Event not found")
-    return event
\ No newline at end of file
+    if event.organizer_id != current_user.id:
+        raise HTTPException(status_code=status.HTTP_403_FORBIDDEN, detail="Only the event's organizer can export attendees")
+    
+    async def chunks() -> AsyncIterator[Any]:
+        if format == "csv":
+            yield ATTENDEE_ROWS.csv_header()
+        async with session_factory() as export_db:
+            async for batch in ticket_crud.stream_event_attendees_async(export_db, event_id, ATTENDEE_ROWS.columns):
+                yield ATTENDEE_ROWS.dump_csv(batch) if format == "csv" else ATTENDEE_ROWS.dump_ndjson(batch)
+    
+    return StreamingResponse(
+        chunks(), media_type=EXPORT_MEDIA_TYPES[format],
+        headers={"Content-Disposition": f'attachment; filename="event-{event_id}-attendees.{format}"'}
+    )
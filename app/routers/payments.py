@@ -1,42 +1,129 @@
-from fastapi import APIRouter, Depends, HTTPException, status, Request
+from fastapi import APIRouter, Depends, Header, HTTPException, status, Request
+from sqlalchemy.exc import IntegrityError
 from sqlalchemy.orm import Session
+import math
 import secrets
 import logging
-from typing import cast, Any
+from typing import cast, Any, Optional
 
 from .. import schemas, models
+from ..config import settings
 from ..database import get_db
 from ..cruds import payments as payment_crud
 from ..cruds import events as event_crud
+from ..cruds import seating as seat_crud
 from ..cruds import tickets as ticket_crud
-from ..services import paystack, qr_service, email_service
+from ..cruds import users as user_crud
 from ..auth import get_current_user
+from ..metrics import ThreadpoolWaitRoute
+from ..waiting_room import Place, waiting_room
 
-router = APIRouter(prefix="/payments", tags=["Payments"])
+router = APIRouter(prefix="/payments", tags=["Payments"], route_class=ThreadpoolWaitRoute)
 logger = logging.getLogger(__name__)
 
-@router.post("/initialize", response_model=schemas.PaymentResponse)
+QUEUE_TOKEN_USED = "Queue token already used for a checkout"
+
+async def admitted_to_checkout(
+    payment_data: schemas.PaymentInitiate,
+    current_user: models.User = Depends(get_current_user),
+    x_queue_token: Optional[str] = Header(None)
+) -> Optional[Place]:
+    """Refuse checkout to callers the waiting room has not admitted
+    
+    With the waiting room on, X-Queue-Token must have been issued to this
+    caller for this event, and its slot must have come. Async, so callers
+    still queueing are turned away on the event loop, before the endpoint
+    takes a threadpool thread or a database connection. Returns the token's
+    place, None with the waiting room off.
+    """
+    if not waiting_room.enabled:
+        return None
+    place = waiting_room.place(x_queue_token) if x_queue_token else None
+    user_id = cast(int, getattr(current_user, "id"))
+    if place is None or place.event_id != payment_data.event_id or place.user_id != user_id:
+        raise HTTPException(status_code=status.HTTP_403_FORBIDDEN, detail="Join the event's waiting room first")
+    if place.expired:
+        raise HTTPException(status_code=status.HTTP_403_FORBIDDEN, detail="Queue token expired; join the waiting room again")
+    if not place.admitted:
+        raise HTTPException(
+            status_code=status.HTTP_429_TOO_MANY_REQUESTS,
+            detail="Still in the waiting room",
+            headers={"Retry-After": str(max(1, math.ceil(place.wait_seconds)))}
+        )
+    return place
+
+@router.post(
+    "/initialize",
+    response_model=schemas.PaymentResponse,
+    dependencies=[Depends(admitted_to_checkout)]
+)
 def initialize_payment(
     payment_data: schemas.PaymentInitiate,
     db: Session = Depends(get_db),
-    current_user: models.User = Depends(get_current_user)
+    current_user: models.User = Depends(get_current_user),
+    place: Optional[Place] = Depends(admitted_to_checkout)
 ):
     """Initialize payment with Paystack"""
+    # Services are imported on first use: requests, qrcode/PIL and sendgrid
+    # would otherwise add to every worker's startup
+    from ..services import paystack
     
     event = event_crud.get_event(db, payment_data.event_id)
     if not event:
         raise HTTPException(status_code=status.HTTP_404_NOT_FOUND, detail="Event not found")
     # evaluate ORM attributes as native Python types for type checkers and runtime safety
-    tickets_sold = cast(int, getattr(event, "tickets_sold"))
+    tickets_taken = cast(int, getattr(event, "tickets_sold_total")) + cast(int, getattr(event, "tickets_held_total"))
     capacity = cast(int, getattr(event, "capacity"))
-    if tickets_sold >= capacity:
+    if tickets_taken >= capacity:
         raise HTTPException(status_code=status.HTTP_400_BAD_REQUEST, detail="Event sold out")
+    seated = getattr(event, "venue_id") is not None
+    if seated and not payment_data.seat_number:
+        raise HTTPException(
+            status_code=status.HTTP_400_BAD_REQUEST,
+            detail="Hold a seat with POST /events/{id}/seats/hold and pass its seat_number"
+        )
+    
+    if place is None:
+        reference = f"TXN-{secrets.token_hex(16).upper()}"
+    else:
+        # A queue token starts one checkout at a time, whichever worker issued it
+        reference = payment_crud.queue_checkout_reference(db, f"{place.event_id}.{place.user_id}.{place.admit_at}")
+        if reference is None:
+            raise HTTPException(status_code=status.HTTP_403_FORBIDDEN, detail=QUEUE_TOKEN_USED)
+    event_price = cast(Any, getattr(event, "price"))
     
-    reference = f"TXN-{secrets.token_hex(16).upper()}"
+    # Hold a ticket before calling Paystack, so checkouts past capacity never reach it
+    try:
+        payment = payment_crud.reserve_payment(
+            db=db,
+            user_id=cast(int, getattr(current_user, "id")),
+            event_id=cast(int, getattr(event, "id")),
+            reference=reference,
+            amount=float(event_price),
+            hold_seconds=settings.ticket_hold_seconds
+        )
+    except IntegrityError:
+        # A concurrent checkout of the same queue token took this reference
+        db.rollback()
+        raise HTTPException(status_code=status.HTTP_403_FORBIDDEN, detail=QUEUE_TOKEN_USED)
+    if payment is None:
+        raise HTTPException(status_code=status.HTTP_400_BAD_REQUEST, detail="Event sold out")
+    if seated:
+        attached = seat_crud.attach_seat(
+            db,
+            event_id=cast(int, getattr(event, "id")),
+            seat_number=cast(str, payment_data.seat_number),
+            user_id=cast(int, getattr(current_user, "id")),
+            reference=reference,
+            expires_at=getattr(payment, "hold_expires_at")
+        )
+        db.commit()
+        if not attached:
+            payment_crud.release_hold(db, reference, 'failed')
+            raise HTTPException(status_code=status.HTTP_409_CONFLICT, detail="Seat is not held by you")
     
     try:
         user_email = cast(str, getattr(current_user, "email"))
-        event_price = cast(Any, getattr(event, "price"))
         response = paystack.initialize_payment(
             email=user_email,
             amount=int(event_price),
@@ -46,14 +133,7 @@ def initialize_payment(
         if response.get('status'):
             data = response.get('data', {})
             
-            payment_crud.create_payment(
-                db=db,
-                user_id=cast(int, getattr(current_user, "id")),
-                event_id=cast(int, getattr(event, "id")),
-                reference=reference,
-                amount=float(event_price),
-                access_code=data.get('access_code', '')
-            )
+            payment_crud.set_access_code(db, payment, data.get('access_code', ''))
             
             return schemas.PaymentResponse(
                 authorization_url=data.get('authorization_url'),
@@ -61,18 +141,33 @@ def initialize_payment(
                 access_code=data.get('access_code')
             )
         else:
+            payment_crud.release_hold(db, reference, 'failed')
+            seat_crud.release_seat(db, reference)
             raise HTTPException(
                 status_code=status.HTTP_400_BAD_REQUEST,
                 detail="Payment initialization failed"
             )
-            
+    
+    except HTTPException:
+        raise
     except Exception as e:
         logger.error(f"Payment initialization error: {str(e)}")
+        db.rollback()
+        payment_crud.release_hold(db, reference, 'failed')
+        seat_crud.release_seat(db, reference)
         raise HTTPException(
             status_code=status.HTTP_503_SERVICE_UNAVAILABLE,
             detail=f"Payment service unavailable: {str(e)}"
         )
 
+def already_verified(payment: models.Payment) -> dict:
+    ticket = getattr(payment, "ticket")
+    return {
+        "message": "Payment already verified",
+        "ticket_code": ticket.ticket_code if ticket else None,
+        "qr_code_path": ticket.qr_code_path if ticket else None
+    }
+
 @router.get("/verify/{reference}")
 def verify_payment(
     reference: str,
@@ -80,6 +175,7 @@ def verify_payment(
     current_user: models.User = Depends(get_current_user)
 ):
     """Verify payment and generate ticket"""
+    from ..services import email_service, paystack, qr_service
     
     payment = payment_crud.get_payment_by_reference(db, reference)
     if not payment:
@@ -87,12 +183,7 @@ def verify_payment(
     
     # cast status to str to avoid SQLAlchemy boolean-expression comparisons
     if cast(str, getattr(payment, "status")) == 'success':
-        ticket = getattr(payment, "ticket")
-        return {
-            "message": "Payment already verified",
-            "ticket_code": ticket.ticket_code if ticket else None,
-            "qr_code_path": ticket.qr_code_path if ticket else None
-        }
+        return already_verified(payment)
     
     try:
         # Verify with Paystack
@@ -100,12 +191,34 @@ def verify_payment(
         
         if response.get('status') and response.get('data', {}).get('status') == 'success':
             
+            # Count the sale, using up the ticket held since initialization
+            event_id = cast(int, getattr(payment, "event_id"))
+            held = payment_crud.convert_hold(db, payment)
+            if held == payment_crud.HOLD_USED:
+                # A concurrent verification of this payment sold its ticket first
+                db.rollback()
+                db.refresh(payment)
+                return already_verified(payment)
+            if held is None:
+                logger.error(f"Payment {reference} succeeded after its hold expired and the event sold out")
+                seat_crud.release_seat(db, reference)
+                raise HTTPException(
+                    status_code=status.HTTP_409_CONFLICT,
+                    detail="Event sold out while the payment was pending"
+                )
+            # The seat held for this payment is sold in the same commit
+            seat_number = seat_crud.sell_seat(db, reference)
+            event_crud.update_tickets_sold(db, event_id, held=held)
+            if seat_number is None and getattr(payment, "event").venue_id is not None:
+                logger.warning(f"Payment {reference} succeeded after its seat hold expired; ticket has no seat")
+            
             # Create ticket
             ticket = ticket_crud.create_ticket(
                 db=db,
                 user_id=cast(int, getattr(current_user, "id")),
                 event_id=cast(int, getattr(payment, "event_id")),
-                amount=float(cast(Any, getattr(payment, "amount")))
+                amount=float(cast(Any, getattr(payment, "amount"))),
+                seat_number=seat_number
             )
 
             # Ensure ticket_code is always defined for later use
@@ -127,17 +240,16 @@ def verify_payment(
             # Update payment status
             payment_crud.update_payment_status(db, reference, 'success', cast(int, getattr(ticket, "id")))
             
-            # Update tickets sold
-            event_crud.update_tickets_sold(db, cast(int, getattr(payment, "event_id")))
-            
             # Get event details for email
-            event = event_crud.get_event(db, cast(int, getattr(payment, "event_id")))
+            event = event_crud.get_event(db, event_id)
             
             # Send email with error handling
             email_sent = False
             try:
                 to_email = cast(str, getattr(current_user, "email"))
-                user_name = cast(str, getattr(current_user, "name"))
+                # Principals carry only the token's claims; the name is on the user row
+                user = user_crud.get_user(db, cast(int, getattr(current_user, "id")))
+                user_name = cast(str, getattr(user, "name")) if user else ""
                 event_title = event.title if event else ""
                 # ticket_code already set above
                 event_date = str(event.event_date) if event else ""
@@ -170,7 +282,8 @@ def verify_payment(
                 "email_sent": email_sent
             }
         else:
-            payment_crud.update_payment_status(db, reference, 'failed')
+            payment_crud.release_hold(db, reference, 'failed')
+            seat_crud.release_seat(db, reference)
             raise HTTPException(
                 status_code=status.HTTP_400_BAD_REQUEST,
                 detail="Payment verification failed"
@@ -1,27 +1,36 @@
-from fastapi import APIRouter, Depends, HTTPException
-from sqlalchemy.orm import Session
-from typing import List, cast
+from fastapi import APIRouter, Depends, HTTPException, Response
+from sqlalchemy.ext.asyncio import AsyncSession
+from typing import List
 
 from .. import schemas
-from ..database import get_db
+from ..database import get_async_db, get_read_db
 from ..cruds import tickets as ticket_crud
 from ..auth import get_current_user
+from ..metrics import ThreadpoolWaitRoute
+from ..serialization import RowSerializer
 from .. import models
 
-router = APIRouter(prefix="/tickets", tags=["Tickets"])
+router = APIRouter(prefix="/tickets", tags=["Tickets"], route_class=ThreadpoolWaitRoute)
+
+TICKET_ROWS = RowSerializer(models.Ticket, schemas.TicketResponse)
 
 @router.get("/my-tickets", response_model=List[schemas.TicketResponse])
-def get_my_tickets(
-    db: Session = Depends(get_db),
-    current_user: models.User = Depends(get_current_user)
+async def get_my_tickets(
+    db: AsyncSession = Depends(get_async_db),
+    current_user: schemas.AuthenticatedUser = Depends(get_current_user)
 ):
-    """Get all tickets for current user"""
-    return ticket_crud.get_user_tickets(db, cast(int, current_user.id))
+    """Get all tickets for current user
+    
+    Selects only the response's columns and encodes them in one pass, without
+    loading ticket entities.
+    """
+    tickets = await ticket_crud.get_user_ticket_rows_async(db, current_user.id, TICKET_ROWS.columns)
+    return Response(TICKET_ROWS.dump_json(tickets), media_type="application/json")
 
 @router.get("/{ticket_code}", response_model=schemas.TicketResponse)
-def get_ticket(ticket_code: str, db: Session = Depends(get_db)):
+async def get_ticket(ticket_code: str, db: AsyncSession = Depends(get_read_db)):
     """Get ticket by code (public for verification)"""
-    ticket = ticket_crud.get_ticket_by_code(db, ticket_code)
+    ticket = await ticket_crud.get_ticket_by_code_async(db, ticket_code)
     if not ticket:
         raise HTTPException(status_code=404, detail="Ticket not found")
     return ticket
\ No newline at end of file
@@ -0,0 +1,28 @@
+from fastapi import APIRouter, Depends, HTTPException, status
+from sqlalchemy.ext.asyncio import AsyncSession
+from typing import Any
+
+from .. import schemas
+from ..database import get_async_db
+from ..cruds import seating as seating_crud
+from ..auth import get_current_user
+from ..metrics import ThreadpoolWaitRoute
+
+router = APIRouter(prefix="/venues", tags=["Venues"], route_class=ThreadpoolWaitRoute)
+
+@router.post("/", response_model=schemas.VenueResponse, status_code=status.HTTP_201_CREATED)
+async def create_venue(
+    venue: schemas.VenueCreate,
+    db: AsyncSession = Depends(get_async_db),
+    current_user: Any = Depends(get_current_user)
+):
+    """Create a seated venue: sections (best first) of rows (front first) (requires authentication)"""
+    return await seating_crud.create_venue_async(db, venue, current_user.id)
+
+@router.get("/{venue_id}", response_model=schemas.VenueResponse)
+async def get_venue(venue_id: int, db: AsyncSession = Depends(get_async_db)):
+    """Get a venue's seat map (public endpoint)"""
+    venue = await seating_crud.get_venue_async(db, venue_id)
+    if venue is None:
+        raise HTTPException(status_code=status.HTTP_404_NOT_FOUND, detail="Venue not found")
+    return venue
@@ -1,6 +1,6 @@
-from pydantic import BaseModel, EmailStr, Field, ConfigDict
+from pydantic import AliasChoices, BaseModel, EmailStr, Field, ConfigDict, field_validator
 from datetime import datetime
-from typing import Optional
+from typing import List, Optional
 from decimal import Decimal
 
 class UserBase(BaseModel):
@@ -25,6 +25,15 @@ class UserResponse(UserBase):
 
     model_config = ConfigDict(from_attributes=True)
 
+class AuthenticatedUser(BaseModel):
+    """Immutable principal behind a verified token, built from its claims"""
+    id: int
+    email: str
+    is_active: bool
+    token_version: int = 0
+
+    model_config = ConfigDict(from_attributes=True, frozen=True)
+
 class UserLogin(BaseModel):
     email: EmailStr
     password: str = Field(..., min_length=8)
@@ -33,6 +42,11 @@ class UserLogin(BaseModel):
 class Token(BaseModel):
     access_token: str
     token_type: str
+    refresh_token: Optional[str] = None
+    expires_in: Optional[int] = None
+
+class RefreshRequest(BaseModel):
+    refresh_token: str
 
 class TokenData(BaseModel):
     email: Optional[str] = None
@@ -41,6 +55,8 @@ class LoginResponse(BaseModel):
     message: str
     access_token: str
     token_type: str
+    refresh_token: Optional[str] = None
+    expires_in: Optional[int] = None
     user : UserResponse    
 
 # Event Schemas
@@ -52,6 +68,8 @@ class EventCreate(BaseModel):
     price: Decimal = Field(ge=0)
     capacity: int = Field(gt=0)
     category_id: Optional[int] = None
+    # Reserved seating at this venue
+    venue_id: Optional[int] = None
 
 class EventResponse(BaseModel):
     id: int
@@ -61,11 +79,65 @@ class EventResponse(BaseModel):
     location: str
     price: Decimal
     capacity: int
-    tickets_sold: int
+    # Read from Event.tickets_sold_total, which includes inventory shards
+    tickets_sold: int = Field(validation_alias=AliasChoices("tickets_sold_total", "tickets_sold"))
     is_active: bool
     created_at: datetime
     model_config = ConfigDict(from_attributes=True)
 
+# Venue Schemas (reserved seating). Names and labels are letters and digits,
+# since seat numbers join them with dashes: "A-12-7"
+class VenueRowCreate(BaseModel):
+    label: str = Field(min_length=1, max_length=5, pattern=r"^[A-Za-z0-9]+$")
+    seats: int = Field(gt=0, le=999)
+    model_config = ConfigDict(from_attributes=True)
+
+class VenueSectionCreate(BaseModel):
+    name: str = Field(min_length=1, max_length=8, pattern=r"^[A-Za-z0-9]+$")
+    rows: List[VenueRowCreate] = Field(min_length=1, description="Front row first")
+    model_config = ConfigDict(from_attributes=True)
+
+    @field_validator("rows")
+    @classmethod
+    def unique_labels(cls, rows: List[VenueRowCreate]) -> List[VenueRowCreate]:
+        if len({row.label for row in rows}) != len(rows):
+            raise ValueError("row labels must be unique within a section")
+        return rows
+
+class VenueCreate(BaseModel):
+    name: str = Field(min_length=3, max_length=200)
+    sections: List[VenueSectionCreate] = Field(min_length=1, description="Best section first")
+
+    @field_validator("sections")
+    @classmethod
+    def unique_names(cls, sections: List[VenueSectionCreate]) -> List[VenueSectionCreate]:
+        if len({section.name for section in sections}) != len(sections):
+            raise ValueError("section names must be unique")
+        return sections
+
+class VenueResponse(VenueCreate):
+    id: int
+    model_config = ConfigDict(from_attributes=True)
+
+class SectionAvailability(VenueSectionCreate):
+    """A section's rows, and ``taken``: base64 of a bitmap with a bit per seat, set when it
+    is held or sold. Seats count row after row from the front row's first; seat ``k`` is bit
+    ``k % 8`` of byte ``k // 8``."""
+    taken: str
+
+class SeatAvailability(BaseModel):
+    event_id: int
+    available: int
+    sections: List[SectionAvailability]
+
+class SeatHoldRequest(BaseModel):
+    count: int = Field(1, ge=1, le=10, description="Adjacent seats in one row")
+    section: Optional[str] = Field(None, description="Only this section (default: the best one with room)")
+
+class SeatHoldResponse(BaseModel):
+    seats: List[str]
+    expires_at: datetime
+
 # Ticket Schemas
 class TicketResponse(BaseModel):
     id: int
@@ -75,17 +147,41 @@ class TicketResponse(BaseModel):
     purchase_date: datetime
     amount_paid: Decimal
     qr_code_path: Optional[str] = None
+    seat_number: Optional[str] = None
     model_config = ConfigDict(from_attributes=True)
 
+class AttendeeExport(BaseModel):
+    """One row of an event's attendee export: the ticket, its holder and its payment"""
+    ticket_code: str
+    status: str
+    seat_number: Optional[str] = None
+    purchase_date: Optional[datetime] = None
+    amount_paid: Decimal
+    name: str
+    email: str
+    phone: Optional[str] = None
+    payment_reference: Optional[str] = None
+    payment_status: Optional[str] = None
+    paid_at: Optional[datetime] = None
+
 # Payment Schemas
 class PaymentInitiate(BaseModel):
     event_id: int
     email: EmailStr
+    # Required for reserved-seating events: one of the seats the buyer holds
+    seat_number: Optional[str] = None
 
 class PaymentResponse(BaseModel):
     authorization_url: str
     reference: str
     access_code: str
 
+class QueuePosition(BaseModel):
+    """A place in an event's waiting room; send ``token`` as X-Queue-Token"""
+    token: str
+    admitted: bool
+    position: int
+    wait_seconds: float
+
 class PaymentVerify(BaseModel):
     reference: str
\ No newline at end of file
@@ -0,0 +1,199 @@
+"""Reserved seating: seat maps and per-event seat availability as bitsets.
+
+Each section of a venue is one Python integer with a bit per seat, rows laid
+out front to back and each row followed by a separator bit that is always
+set. Availability searches then run as a handful of whole-integer bit
+operations (CPython works on them 30 bits per machine word) instead of a
+loop over seats, and a block of free bits can never straddle two rows.
+
+Seats are numbered ``<section>-<row>-<seat>``, as in ``A-12-7``, which is
+what ``Ticket.seat_number`` and ``EventSeat.seat_number`` store.
+"""
+import base64
+import threading
+from bisect import bisect_right
+from typing import Dict, Iterable, List, Optional, Sequence, Tuple
+
+from .cache import TTLCache
+from .config import settings
+
+
+def block_starts(free: int, n: int) -> int:
+    """Bits of ``free`` that start a run of ``n`` set bits, in O(log n) shifts."""
+    width = 1
+    while width < n:
+        step = min(width, n - width)
+        free &= free >> step
+        width += step
+    return free
+
+
+class Section:
+    """A section's rows on one bitset: row ``i`` owns bits ``offsets[i]`` onwards, one per seat."""
+
+    def __init__(self, name: str, rows: Sequence[Tuple[str, int]]):
+        self.name = name
+        self.labels = [label for label, _ in rows]
+        self.seats = [seats for _, seats in rows]
+        self.offsets: List[int] = []
+        self.separators = 0
+        offset = 0
+        for seats in self.seats:
+            self.offsets.append(offset)
+            offset += seats
+            self.separators |= 1 << offset
+            offset += 1
+        self.mask = (1 << offset) - 1
+        self.row_index = {label: index for index, label in enumerate(self.labels)}
+
+    def seat_number(self, bit: int) -> str:
+        row = bisect_right(self.offsets, bit) - 1
+        return f"{self.name}-{self.labels[row]}-{bit - self.offsets[row] + 1}"
+
+    def bit(self, label: str, seat: int) -> Optional[int]:
+        row = self.row_index.get(label)
+        if row is None or not 1 <= seat <= self.seats[row]:
+            return None
+        return self.offsets[row] + seat - 1
+
+
+class SeatMap:
+    """A venue's sections in best-first order; immutable once built."""
+
+    def __init__(self, sections: Sequence[Tuple[str, Sequence[Tuple[str, int]]]]):
+        self.sections = [Section(name, rows) for name, rows in sections]
+        self.section_index = {section.name: index for index, section in enumerate(self.sections)}
+        self.capacity = sum(sum(section.seats) for section in self.sections)
+
+    def locate(self, seat_number: str) -> Optional[Tuple[int, int]]:
+        """(section index, bit) of a seat number; None when the venue has no such seat."""
+        parts = seat_number.split("-")
+        if len(parts) != 3 or not parts[2].isdigit():
+            return None
+        index = self.section_index.get(parts[0])
+        if index is None:
+            return None
+        bit = self.sections[index].bit(parts[1], int(parts[2]))
+        return None if bit is None else (index, bit)
+
+
+class EventSeats:
+    """One event's seat availability: a bitset per section, set for seats held or sold.
+
+    A worker's view: seats it holds are marked at once, those taken by other
+    workers when the view is reloaded (see ``SeatingCache``). The database
+    decides who gets a seat; this only decides which seats are worth asking
+    for. Callers take ``lock`` around a search and the ``take`` that follows.
+    """
+
+    def __init__(self, seat_map: SeatMap, taken: Iterable[str] = ()):
+        self.map = seat_map
+        self.taken = [section.separators for section in seat_map.sections]
+        self.lock = threading.Lock()
+        self.take(taken)
+
+    def _mark(self, seat_numbers: Iterable[str], taken: bool) -> None:
+        for seat_number in seat_numbers:
+            location = self.map.locate(seat_number)
+            if location is None:
+                continue
+            index, bit = location
+            if taken:
+                self.taken[index] |= 1 << bit
+            else:
+                self.taken[index] &= ~(1 << bit)
+
+    def take(self, seat_numbers: Iterable[str]) -> None:
+        self._mark(seat_numbers, True)
+
+    def release(self, seat_numbers: Iterable[str]) -> None:
+        self._mark(seat_numbers, False)
+
+    def is_free(self, seat_number: str) -> bool:
+        location = self.map.locate(seat_number)
+        return location is not None and not self.taken[location[0]] >> location[1] & 1
+
+    def available(self) -> int:
+        separators = sum(len(section.seats) for section in self.map.sections)
+        return self.map.capacity + separators - sum(taken.bit_count() for taken in self.taken)
+
+    def best_block(self, index: int, n: int) -> Optional[int]:
+        """First bit of the best ``n`` adjacent free seats in section ``index``, None if there are none
+
+        Best is the front-most row with room, then the block closest to the
+        middle of that row.
+        """
+        section = self.map.sections[index]
+        starts = block_starts(~self.taken[index] & section.mask, n)
+        if not starts:
+            return None
+        # Rows are laid out front first, so the lowest start is in the best row
+        row = bisect_right(section.offsets, (starts & -starts).bit_length() - 1) - 1
+        offset, seats = section.offsets[row], section.seats[row]
+        row_starts = (starts >> offset) & ((1 << (seats - n + 1)) - 1)
+        middle = (seats - n) // 2
+        candidates = []
+        left = row_starts & ((1 << (middle + 1)) - 1)
+        if left:
+            candidates.append(left.bit_length() - 1)
+        right = row_starts >> middle
+        if right:
+            candidates.append(middle + (right & -right).bit_length() - 1)
+        return offset + min(candidates, key=lambda start: abs(start - middle))
+
+    def best_available(self, n: int, section: Optional[str] = None) -> Optional[List[str]]:
+        """Seat numbers of the best ``n`` adjacent free seats, in ``section`` or the best section with room."""
+        if section is not None:
+            if section not in self.map.section_index:
+                return None
+            indexes: Iterable[int] = [self.map.section_index[section]]
+        else:
+            indexes = range(len(self.map.sections))
+        for index in indexes:
+            start = self.best_block(index, n)
+            if start is not None:
+                section_map = self.map.sections[index]
+                return [section_map.seat_number(bit) for bit in range(start, start + n)]
+        return None
+
+    def snapshot(self) -> List[Dict[str, object]]:
+        """Per section, its rows and a base64 bitmap of its taken seats
+        
+        Seats are counted row after row from the front row's first seat;
+        seat ``k`` is bit ``k % 8`` of byte ``k // 8``.
+        """
+        sections = []
+        for section, taken in zip(self.map.sections, self.taken):
+            packed, position = 0, 0
+            for offset, seats in zip(section.offsets, section.seats):
+                packed |= ((taken >> offset) & ((1 << seats) - 1)) << position
+                position += seats
+            sections.append({
+                "name": section.name,
+                "rows": [{"label": label, "seats": seats} for label, seats in zip(section.labels, section.seats)],
+                "taken": base64.b64encode(packed.to_bytes((position + 7) // 8, "little")).decode(),
+            })
+        return sections
+
+
+class SeatingCache:
+    """Seat maps by venue, and each event's ``EventSeats`` for ``refresh_seconds``.
+
+    Seat maps never change once a venue exists. Event availability is
+    reloaded from the database after ``refresh_seconds``, or at once with
+    ``forget`` when a hold lost a race to another worker.
+    """
+
+    def __init__(self, refresh_seconds: float = 2.0, max_events: int = 1_000):
+        self.maps: TTLCache[SeatMap] = TTLCache(max_events, float("inf"))
+        self.events: TTLCache[EventSeats] = TTLCache(max_events, refresh_seconds)
+
+    def forget(self, event_id: int) -> None:
+        self.events.pop(event_id)
+
+    def clear(self) -> None:
+        self.maps = TTLCache(self.maps.max_entries, float("inf"))
+        self.events = TTLCache(self.events.max_entries, self.events.ttl)
+
+
+seating = SeatingCache(refresh_seconds=settings.seat_map_refresh_seconds)
@@ -1,27 +1,244 @@
 from passlib.context import CryptContext
 from jose import JWTError, jwt
 from datetime import datetime, timedelta, timezone
+from concurrent.futures import Future, ProcessPoolExecutor, wait
+from functools import lru_cache
+from typing import Any, Callable, Optional, Tuple
+import asyncio
+import multiprocessing
 import os
+import threading
+import time
+from anyio import to_thread
 from dotenv import load_dotenv
+from .config import settings
+from .rate_limit import SHARED_BACKEND, LoginAttemptTracker, create_limiter
 
 load_dotenv()
 
+try:
+    import fcntl
+except ImportError:  # Windows: every worker calibrates on its own
+    fcntl = None
+
+@lru_cache(maxsize=None)
+def password_context(rounds: int) -> CryptContext:
+    """bcrypt context hashing at ``rounds`` that flags any other cost for rehash"""
+    return CryptContext(
+        schemes=["bcrypt"],
+        deprecated="auto",
+        bcrypt__default_rounds=rounds,
+        bcrypt__min_rounds=rounds,
+        bcrypt__max_rounds=rounds
+    )
+
 # Password hashing context
-pwd_context = CryptContext(schemes=["bcrypt"], deprecated="auto")
+pwd_context = password_context(settings.bcrypt_rounds)
 
 # JWT settings
 SECRET_KEY = os.getenv("JWT_SECRET_KEY", "your-super-secret-key-change-this-in-production")
 ALGORITHM = "HS256"
-ACCESS_TOKEN_EXPIRE_MINUTES = 30
+ACCESS_TOKEN_EXPIRE_MINUTES = settings.jwt_access_token_expire_minutes
+REFRESH_TOKEN_EXPIRE_DAYS = settings.jwt_refresh_token_expire_days
 
-def hash_password(password: str) -> str:
-    """Hash password using bcrypt"""
-    return pwd_context.hash(password)
+def hash_password(password: str, rounds: Optional[int] = None) -> str:
+    """Hash password using bcrypt at ``rounds`` (default: the current policy)"""
+    return password_context(rounds or password_hasher.rounds).hash(password)
+
+def warm_up() -> None:
+    """Load bcrypt in a pool process, at the cheapest cost, before its first real hash"""
+    password_context(4).hash("warm-up")
 
 def verify_password(plain_password: str, hashed_password: str) -> bool:
     """Verify password against bcrypt hash"""
     return pwd_context.verify(plain_password, hashed_password)
 
+def verify_and_update_password(
+    plain_password: str,
+    hashed_password: str,
+    rounds: Optional[int] = None
+) -> Tuple[bool, Optional[str]]:
+    """Verify password and rehash it when its cost differs from ``rounds``
+    
+    Returns:
+        Tuple[bool, Optional[str]]: Whether the password matches and, if the
+        stored hash needs upgrading, the new hash to store.
+    """
+    return password_context(rounds or password_hasher.rounds).verify_and_update(plain_password, hashed_password)
+
+def calibrate_rounds(target_seconds: float, min_rounds: int = 10, max_rounds: int = 16) -> int:
+    """Highest bcrypt cost whose verify takes at most ``target_seconds`` here
+    
+    Each extra round doubles the work, so a single timing at ``min_rounds``
+    is enough to extrapolate; the best of three runs filters out noise.
+    """
+    context = password_context(min_rounds)
+    hashed = context.hash("calibration")
+    elapsed = float("inf")
+    for _ in range(3):
+        start = time.perf_counter()
+        context.verify("calibration", hashed)
+        elapsed = min(elapsed, time.perf_counter() - start)
+    rounds = min_rounds
+    while rounds < max_rounds and elapsed * 2 ** (rounds + 1 - min_rounds) <= target_seconds:
+        rounds += 1
+    return rounds
+
+def load_calibrated_rounds(path: str, target_seconds: float, min_rounds: int = 10, max_rounds: int = 16) -> int:
+    """Calibrate once per host and share the result between workers
+    
+    Workers that picked different costs would keep rehashing each other's
+    hashes on login, so the first worker stores its result at ``path`` and
+    the others reuse it as long as the target and bounds are unchanged.
+    """
+    key = f"{target_seconds!r} {min_rounds} {max_rounds}"
+    if fcntl is None:
+        return calibrate_rounds(target_seconds, min_rounds, max_rounds)
+    fd = os.open(path, os.O_RDWR | os.O_CREAT, 0o600)
+    try:
+        fcntl.flock(fd, fcntl.LOCK_EX)
+        stored = os.read(fd, 256).decode(errors="replace").split("\n")
+        if len(stored) >= 2 and stored[0] == key and stored[1].isdigit():
+            return int(stored[1])
+        rounds = calibrate_rounds(target_seconds, min_rounds, max_rounds)
+        os.ftruncate(fd, 0)
+        os.pwrite(fd, f"{key}\n{rounds}\n".encode(), 0)
+        return rounds
+    finally:
+        os.close(fd)
+
+class PasswordHasherBusy(Exception):
+    """Raised when the password hashing pool has no free queue slot"""
+    
+    def __init__(self, retry_after: int):
+        super().__init__("Password hashing pool is saturated")
+        self.retry_after = retry_after
+
+class PasswordHasher:
+    """Runs bcrypt off the request threads on a dedicated process pool.
+    
+    Hashing and verification happen in ``processes`` worker processes, so a
+    login storm neither holds anyio threadpool threads nor competes for this
+    process's GIL. At most ``max_pending`` operations may be queued or
+    running; beyond that ``PasswordHasherBusy`` is raised straight away so
+    callers can shed load with a fast 503 instead of queueing. With
+    ``processes=0`` the work runs on the anyio threadpool instead, which is
+    meant for tests and platforms without process pools.
+    
+    ``rounds`` is the bcrypt cost new hashes get. It is passed along with
+    every call, so the pool processes follow a cost calibrated by ``start``.
+    """
+    
+    def __init__(self, processes: int = 2, max_pending: int = 32, retry_after: int = 1, rounds: int = 12):
+        self.processes = processes
+        self.max_pending = max_pending
+        self.retry_after = retry_after
+        self.rounds = rounds
+        self._slots = threading.BoundedSemaphore(max_pending)
+        self._pool: Optional[ProcessPoolExecutor] = None
+        self._pool_lock = threading.Lock()
+    
+    def _executor(self) -> ProcessPoolExecutor:
+        with self._pool_lock:
+            if self._pool is None:
+                # spawn: forking a process that already runs threads is unsafe
+                self._pool = ProcessPoolExecutor(
+                    max_workers=self.processes,
+                    mp_context=multiprocessing.get_context("spawn"),
+                    initializer=warm_up
+                )
+            return self._pool
+    
+    async def _run(self, func: Callable[..., Any], *args) -> Any:
+        if not self._slots.acquire(blocking=False):
+            raise PasswordHasherBusy(self.retry_after)
+        if self.processes <= 0:
+            try:
+                return await to_thread.run_sync(func, *args)
+            finally:
+                self._slots.release()
+        try:
+            future: Future = self._executor().submit(func, *args)
+        except BaseException:
+            self._slots.release()
+            raise
+        # The slot is held until the process finishes, even if the request goes away
+        future.add_done_callback(lambda _: self._slots.release())
+        return await asyncio.wrap_future(future)
+    
+    async def hash(self, password: str) -> str:
+        """Hash ``password`` on the pool"""
+        return await self._run(hash_password, password, self.rounds)
+    
+    async def verify(self, plain_password: str, hashed_password: str) -> bool:
+        """Verify ``plain_password`` against ``hashed_password`` on the pool"""
+        return await self._run(verify_password, plain_password, hashed_password)
+    
+    async def verify_and_update(self, plain_password: str, hashed_password: str) -> Tuple[bool, Optional[str]]:
+        """Verify on the pool, returning a new hash when the stored cost is outdated"""
+        return await self._run(verify_and_update_password, plain_password, hashed_password, self.rounds)
+    
+    def start(
+        self,
+        target_verify_seconds: float = 0,
+        min_rounds: int = 10,
+        max_rounds: int = 16,
+        calibration_path: Optional[str] = None
+    ) -> None:
+        """Calibrate the cost if asked to and start the worker processes ahead of the first login
+        
+        The pool spawns processes lazily, one for each submit that finds none
+        idle, so one warm-up task per process starts them all; this waits
+        until they have run, so the first logins do not pay for spawning.
+        """
+        if target_verify_seconds > 0:
+            if calibration_path:
+                self.rounds = load_calibrated_rounds(calibration_path, target_verify_seconds, min_rounds, max_rounds)
+            else:
+                self.rounds = calibrate_rounds(target_verify_seconds, min_rounds, max_rounds)
+        if self.processes > 0:
+            pool = self._executor()
+            wait([pool.submit(warm_up) for _ in range(self.processes)])
+    
+    def shutdown(self) -> None:
+        with self._pool_lock:
+            if self._pool is not None:
+                self._pool.shutdown(cancel_futures=True)
+                self._pool = None
+
+password_hasher = PasswordHasher(
+    processes=settings.password_hash_processes,
+    max_pending=settings.password_hash_max_pending,
+    retry_after=settings.password_hash_retry_after_seconds,
+    rounds=settings.bcrypt_rounds
+)
+
+# Failed login counters, shared between the host's workers whatever
+# RATE_LIMIT_BACKEND is, so the lockout budget does not grow with WEB_CONCURRENCY
+login_attempts = LoginAttemptTracker(
+    accounts=create_limiter(
+        SHARED_BACKEND,
+        max_requests=settings.max_login_attempts,
+        window_seconds=settings.lockout_duration_minutes * 60,
+        storage_path=settings.login_attempts_storage_path
+    ),
+    addresses=create_limiter(
+        SHARED_BACKEND,
+        max_requests=settings.max_login_attempts_per_ip,
+        window_seconds=settings.lockout_duration_minutes * 60,
+        storage_path=f"{settings.login_attempts_storage_path}.ip"
+    )
+)
+
+def token_claims(user: Any) -> dict:
+    """Claims that let a token be validated without loading the user"""
+    return {
+        "sub": user.email,
+        "uid": user.id,
+        "act": bool(user.is_active),
+        "ver": user.token_version or 0
+    }
+
 def create_access_token(data: dict, expires_delta: timedelta):
     """Create JWT access token"""
     to_encode = data.copy()
@@ -31,17 +248,36 @@ def create_access_token(data: dict, expires_delta: timedelta):
     else:
         expire = datetime.now(timezone.utc) + timedelta(minutes=ACCESS_TOKEN_EXPIRE_MINUTES)
 
-    to_encode.update({"exp": expire})
+    to_encode.update({"exp": expire, "typ": "access"})
     encoded_jwt = jwt.encode(to_encode, SECRET_KEY, algorithm=ALGORITHM)
     return encoded_jwt
 
-def verify_token(token: str):
-    """Verify JWT token and extract user info"""
+def create_refresh_token(data: dict, expires_delta: Optional[timedelta] = None):
+    """Create JWT refresh token, only accepted by the refresh endpoint"""
+    expire = datetime.now(timezone.utc) + (expires_delta or timedelta(days=REFRESH_TOKEN_EXPIRE_DAYS))
+    to_encode = data.copy()
+    to_encode.update({"exp": expire, "typ": "refresh"})
+    return jwt.encode(to_encode, SECRET_KEY, algorithm=ALGORITHM)
+
+def verify_token(token: str, token_type: str = "access"):
+    """Verify JWT token and extract user info
+    
+    Tokens issued before the uid/act/ver claims existed carry only ``sub``;
+    for those ``user_id`` is None and callers fall back to a database lookup.
+    """
     try:
         payload = jwt.decode(token, SECRET_KEY, algorithms=[ALGORITHM])
         email: str | None = payload.get("sub")
         if email is None:
             return None
-        return {"email": email, "exp": payload.get("exp")}
+        if payload.get("typ", "access") != token_type:
+            return None
+        return {
+            "email": email,
+            "exp": payload.get("exp"),
+            "user_id": payload.get("uid"),
+            "active": payload.get("act", True),
+            "version": payload.get("ver", 0)
+        }
     except JWTError:
-        return None
\ No newline at end of file
+        return None
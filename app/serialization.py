@@ -0,0 +1,71 @@
+import csv
+import io
+from typing import Any, Iterable, List, Mapping, Optional, Tuple, Type
+
+from pydantic import BaseModel, TypeAdapter
+from sqlalchemy.engine import Row
+from typing_extensions import TypedDict
+
+# Spreadsheets evaluate cells starting with these as formulas
+FORMULA_PREFIXES = ("=", "+", "-", "@", "\t", "\r")
+
+
+def escape_formula(value: str) -> str:
+    """Text as a spreadsheet shows it, never as a formula to run (CSV injection)"""
+    return f"'{value}" if value.startswith(FORMULA_PREFIXES) else value
+
+
+class RowSerializer:
+    """Encodes query rows of a response schema's columns as a JSON list in one call.
+
+    List endpoints select ``columns`` (the model attributes named like the
+    schema's fields, or the labelled ``overrides`` for fields from other
+    tables) instead of whole entities, so rows skip ORM hydration and the
+    identity map, and are not validated into schema instances. The rows go
+    through a ``TypedDict`` with the schema's field types, which gives the
+    same JSON as the schema (Decimal as a string, ISO datetimes) for values
+    already of those types, as database columns are.
+
+    Exports encode batches of rows as NDJSON or CSV with the same value
+    formatting.
+    """
+
+    def __init__(self, model: Type[Any], schema: Type[BaseModel], overrides: Optional[Mapping[str, Any]] = None):
+        fields = schema.model_fields
+        overrides = overrides or {}
+        self.names: Tuple[str, ...] = tuple(fields)
+        self.columns: Tuple[Any, ...] = tuple(
+            overrides[name].label(name) if name in overrides else getattr(model, name) for name in fields
+        )
+        row_type = TypedDict(f"{schema.__name__}Row", {name: field.annotation for name, field in fields.items()})
+        self._adapter = TypeAdapter(List[row_type])
+        self._row_adapter = TypeAdapter(row_type)
+
+    def dump_json(self, rows: Iterable[Row]) -> bytes:
+        return self._adapter.dump_json([row._asdict() for row in rows])
+
+    def dump_ndjson(self, rows: Iterable[Row]) -> bytes:
+        """One JSON object per line"""
+        return b"".join(self._row_adapter.dump_json(row._asdict()) + b"\n" for row in rows)
+
+    def csv_header(self) -> str:
+        return self._csv([self.names])
+
+    def dump_csv(self, rows: Iterable[Row]) -> str:
+        """CSV lines without a header; values are formatted as in JSON and nulls are empty
+
+        Text columns hold what users typed, so those starting like a formula
+        get a leading ``'`` (numbers and dates are left alone).
+        """
+        rows = [row._asdict() for row in rows]
+        values = self._adapter.dump_python(rows, mode="json")
+        return self._csv(
+            [escape_formula(value) if isinstance(raw, str) else value for raw, value in zip(row.values(), dumped.values())]
+            for row, dumped in zip(rows, values)
+        )
+
+    @staticmethod
+    def _csv(rows: Iterable[Iterable[Any]]) -> str:
+        buffer = io.StringIO()
+        csv.writer(buffer).writerows(rows)
+        return buffer.getvalue()
@@ -0,0 +1,123 @@
+import base64
+import hashlib
+import hmac
+import math
+import threading
+import time
+from typing import Callable, Dict, NamedTuple, Optional, Tuple
+
+from .config import settings
+from .security import SECRET_KEY
+
+
+class Place(NamedTuple):
+    """Where a queue token stands: admitted to checkout, still waiting, or past its checkout window."""
+    event_id: int
+    user_id: int
+    admit_at: float
+    admitted: bool
+    expired: bool
+    position: int
+    wait_seconds: float
+
+
+class WaitingRoom:
+    """Admission queue per event, so an on-sale reaches checkout at a steady rate.
+
+    Joining gives the caller the event's next admission slot, ``1 / rate``
+    seconds after the previous one (or now, when nobody is waiting), in a
+    token signed with the app secret. The token carries everything needed
+    to answer "how far along am I": its slot, so polling is a signature
+    check and a subtraction, with no database access or shared state, and
+    any worker can answer it. A token is good for checkout from its slot
+    until ``checkout_seconds`` later.
+
+    Each worker hands out its own slots, so ``rate`` is this worker's share
+    of the admission rate and positions count the callers ahead on this
+    worker. A caller joining the same worker again while their token is
+    still good gets the same token back, so they cannot take many slots or
+    push the queue back there. That rule holds per worker only: with
+    ``WEB_CONCURRENCY > 1`` joins that reach other workers get a slot from
+    each. Whichever slot comes first, a token starts one checkout (the
+    payments router refuses it once it has a live or paid payment). Slots
+    are only remembered for events with callers waiting, and callers' slots
+    until their checkout window ends.
+    """
+
+    def __init__(
+        self,
+        rate: float,
+        checkout_seconds: float = 600.0,
+        secret: str = SECRET_KEY,
+        clock: Callable[[], float] = time.time
+    ):
+        self.rate = rate
+        self.checkout_seconds = checkout_seconds
+        self.clock = clock
+        self.joined = 0
+        self._key = secret.encode()
+        # event id -> next free admission slot
+        self._next_slot: Dict[int, float] = {}
+        # (event id, user id) -> their slot, in milliseconds as in their token
+        self._slots: Dict[Tuple[int, int], int] = {}
+        self._prune_at = 1_000
+        self._lock = threading.Lock()
+
+    @property
+    def enabled(self) -> bool:
+        return self.rate > 0
+
+    def join(self, event_id: int, user_id: int) -> str:
+        """Queue ``user_id`` for the event's checkout; returns their token, the one they have if it is still good."""
+        now = self.clock()
+        with self._lock:
+            admit_ms = self._slots.get((event_id, user_id))
+            if admit_ms is None or now > admit_ms / 1000 + self.checkout_seconds:
+                admit_at = max(now, self._next_slot.get(event_id, now))
+                self._next_slot[event_id] = admit_at + (1 / self.rate if self.enabled else 0.0)
+                admit_ms = self._slots[(event_id, user_id)] = int(admit_at * 1000)
+                self.joined += 1
+            if len(self._next_slot) > 1_000:
+                self._next_slot = {event: slot for event, slot in self._next_slot.items() if slot > now}
+            if len(self._slots) > self._prune_at:
+                cutoff = (now - self.checkout_seconds) * 1000
+                self._slots = {caller: slot for caller, slot in self._slots.items() if slot >= cutoff}
+                self._prune_at = max(1_000, 2 * len(self._slots))
+        return self._sign(f"{event_id}.{user_id}.{admit_ms}")
+
+    def place(self, token: str) -> Optional[Place]:
+        """Where ``token`` stands now; None when it is malformed or not signed by this app."""
+        payload = token.rpartition(".")[0]
+        if not hmac.compare_digest(self._sign(payload).encode(), token.encode()):
+            return None
+        try:
+            event_id, user_id, admit_ms = (int(part) for part in payload.split("."))
+        except ValueError:
+            return None
+        now = self.clock()
+        admit_at = admit_ms / 1000
+        wait = max(admit_at - now, 0.0)
+        return Place(
+            event_id=event_id,
+            user_id=user_id,
+            admit_at=admit_at,
+            admitted=wait == 0,
+            expired=now > admit_at + self.checkout_seconds,
+            position=math.ceil(wait * self.rate),
+            wait_seconds=round(wait, 3)
+        )
+
+    def _sign(self, payload: str) -> str:
+        digest = hashlib.blake2b(payload.encode(), key=self._key[:64], digest_size=16).digest()
+        return f"{payload}.{base64.urlsafe_b64encode(digest).rstrip(b'=').decode()}"
+
+    def clear(self) -> None:
+        with self._lock:
+            self._next_slot.clear()
+            self._slots.clear()
+
+
+waiting_room = WaitingRoom(
+    rate=settings.waiting_room_admissions_per_second / max(settings.web_concurrency, 1),
+    checkout_seconds=settings.waiting_room_checkout_seconds
+)
@@ -0,0 +1,166 @@
+"""Throughput of sync (threadpool) vs async database routes under high concurrency.
+
+Usage:
+    python -m benchmarks.async_db [--concurrency 500] [--requests 5000] [--latency-ms 5]
+                                  [--pool-size 100] [--database-url postgresql://...]
+
+Two routes serve the same event list, one as a ``def`` route using
+``get_events`` on a sync engine and one as an ``async def`` route using
+``get_events_async`` on an async engine with the same pool size. Each request
+first runs a query that sleeps for ``--latency-ms`` on the database side
+(``pg_sleep`` on Postgres, a registered function on SQLite) to stand in for
+the network round trip to a real server.
+
+The app is driven in-process through httpx's ASGI transport by
+``--concurrency`` clients. Sync routes can only have as many requests in
+flight as the anyio threadpool has threads; async routes are bounded by the
+connection pool instead. Defaults to a throwaway SQLite file.
+
+The clients share the server's CPU, so on small machines raise
+``--latency-ms`` until the database wait, not Python, dominates a request;
+on one core, 200 ms gave about 180 req/s sync vs 320 req/s async.
+"""
+import argparse
+import asyncio
+import os
+import tempfile
+import time
+from datetime import datetime, timedelta, timezone
+
+import anyio.to_thread
+import httpx
+from fastapi import Depends, FastAPI
+from sqlalchemy import create_engine, event, text
+from sqlalchemy.ext.asyncio import AsyncSession, async_sessionmaker, create_async_engine
+from sqlalchemy.orm import Session, sessionmaker
+
+from app import models
+from app.cruds import events as event_crud
+from app.database import Base, async_database_url
+
+
+def sleep_query(url: str, latency: float):
+    if url.startswith("postgresql"):
+        return text("SELECT pg_sleep(:seconds)").bindparams(seconds=latency)
+    return text("SELECT benchmark_sleep(:seconds)").bindparams(seconds=latency)
+
+
+def register_sqlite_sleep(sync_engine) -> None:
+    @event.listens_for(sync_engine, "connect")
+    def connect(dbapi_connection, connection_record):
+        dbapi_connection.create_function("benchmark_sleep", 1, time.sleep)
+
+
+def build_app(url: str, pool_size: int, latency: float) -> FastAPI:
+    engine = create_engine(url, pool_size=pool_size, max_overflow=0, pool_timeout=120)
+    async_engine = create_async_engine(async_database_url(url), pool_size=pool_size, max_overflow=0, pool_timeout=120)
+    if url.startswith("sqlite"):
+        register_sqlite_sleep(engine)
+        register_sqlite_sleep(async_engine.sync_engine)
+    SyncSession = sessionmaker(bind=engine, autoflush=False)
+    AsyncSessionFactory = async_sessionmaker(bind=async_engine, autoflush=False, expire_on_commit=False)
+    query = sleep_query(url, latency)
+
+    Base.metadata.create_all(bind=engine)
+    with SyncSession() as db:
+        if not db.query(models.Event).count():
+            start = datetime.now(timezone.utc)
+            db.add_all(
+                models.Event(
+                    title=f"Event {i}", location="Lagos", price=5000, capacity=100,
+                    event_date=start + timedelta(days=i), is_active=True
+                )
+                for i in range(20)
+            )
+            db.commit()
+
+    def get_sync_db():
+        db = SyncSession()
+        try:
+            yield db
+        finally:
+            db.close()
+
+    async def get_async_db():
+        async with AsyncSessionFactory() as db:
+            yield db
+
+    app = FastAPI()
+
+    @app.get("/sync/events")
+    def sync_events(db: Session = Depends(get_sync_db)):
+        db.execute(query)
+        return [event.id for event in event_crud.get_events(db, 0, 20)]
+
+    @app.get("/async/events")
+    async def async_events(db: AsyncSession = Depends(get_async_db)):
+        await db.execute(query)
+        return [event.id for event in await event_crud.get_events_async(db, 0, 20)]
+
+    app.state.engines = (engine, async_engine)
+    return app
+
+
+async def drive(app: FastAPI, path: str, concurrency: int, total: int) -> dict:
+    remaining = total
+    latencies = []
+    errors = 0
+
+    async def client_loop(client: httpx.AsyncClient):
+        nonlocal remaining, errors
+        while remaining > 0:
+            remaining -= 1
+            start = time.perf_counter()
+            response = await client.get(path)
+            latencies.append(time.perf_counter() - start)
+            if response.status_code != 200:
+                errors += 1
+
+    transport = httpx.ASGITransport(app=app)
+    async with httpx.AsyncClient(transport=transport, base_url="http://bench") as client:
+        start = time.perf_counter()
+        await asyncio.gather(*(client_loop(client) for _ in range(concurrency)))
+        elapsed = time.perf_counter() - start
+
+    latencies.sort()
+    return {
+        "rps": total / elapsed,
+        "p50": latencies[len(latencies) // 2],
+        "p99": latencies[int(len(latencies) * 0.99) - 1],
+        "errors": errors,
+    }
+
+
+async def run(args) -> None:
+    app = build_app(args.database_url, args.pool_size, args.latency_ms / 1000)
+    threads = anyio.to_thread.current_default_thread_limiter().total_tokens
+    print(
+        f"{args.concurrency} concurrent clients, {args.requests} requests, "
+        f"{args.latency_ms} ms simulated DB latency, pool_size={args.pool_size}, threadpool={threads}"
+    )
+    print(f"{'route':<14} {'req/s':>9} {'p50 ms':>9} {'p99 ms':>9} {'errors':>7}")
+    for path in ("/sync/events", "/async/events"):
+        await drive(app, path, min(args.concurrency, 50), min(args.requests, 200))  # warm the pools
+        result = await drive(app, path, args.concurrency, args.requests)
+        print(
+            f"{path:<14} {result['rps']:>9.0f} {result['p50'] * 1000:>9.1f} "
+            f"{result['p99'] * 1000:>9.1f} {result['errors']:>7}"
+        )
+    engine, async_engine = app.state.engines
+    engine.dispose()
+    await async_engine.dispose()
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--concurrency", type=int, default=500)
+    parser.add_argument("--requests", type=int, default=5000)
+    parser.add_argument("--latency-ms", type=float, default=5.0)
+    parser.add_argument("--pool-size", type=int, default=100)
+    parser.add_argument("--database-url", default=f"sqlite:///{os.path.join(tempfile.mkdtemp(), 'bench.db')}")
+    args = parser.parse_args()
+    asyncio.run(run(args))
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,53 @@
+"""Login throughput per CPU core at each bcrypt cost.
+
+Usage:
+    python -m benchmarks.bcrypt_cost [--min-rounds 10] [--max-rounds 14] [--verifies 5] [--processes 1]
+
+A login costs one bcrypt verify, so the verify time bounds how many logins a
+core can serve per second. Every cost level is timed with ``--verifies``
+verifications in each of ``--processes`` processes; the per-core figure is
+what BCRYPT_ROUNDS or BCRYPT_TARGET_VERIFY_MS trades against.
+"""
+import argparse
+import multiprocessing
+import time
+
+from app.security import calibrate_rounds, password_context
+
+
+def verify_time(rounds: int, verifies: int) -> float:
+    context = password_context(rounds)
+    hashed = context.hash("benchmark-password")
+    start = time.perf_counter()
+    for _ in range(verifies):
+        context.verify("benchmark-password", hashed)
+    return (time.perf_counter() - start) / verifies
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--min-rounds", type=int, default=10)
+    parser.add_argument("--max-rounds", type=int, default=14)
+    parser.add_argument("--verifies", type=int, default=5)
+    parser.add_argument("--processes", type=int, default=1)
+    args = parser.parse_args()
+
+    print(f"{'rounds':>6} {'verify ms':>10} {'logins/s/core':>14} {'logins/s total':>15}")
+    with multiprocessing.get_context("spawn").Pool(args.processes) as pool:
+        # Import passlib and bcrypt in every process before timing anything
+        pool.starmap(verify_time, [(4, 1)] * args.processes)
+        for rounds in range(args.min_rounds, args.max_rounds + 1):
+            wall_start = time.perf_counter()
+            times = pool.starmap(verify_time, [(rounds, args.verifies)] * args.processes)
+            wall = time.perf_counter() - wall_start
+            per_verify = sum(times) / len(times)
+            total = args.processes * args.verifies / wall
+            print(f"{rounds:>6} {per_verify * 1000:>10.1f} {1 / per_verify:>14.1f} {total:>15.1f}")
+
+    for target_ms in (50, 100, 250, 500):
+        rounds = calibrate_rounds(target_ms / 1000, args.min_rounds, args.max_rounds)
+        print(f"BCRYPT_TARGET_VERIFY_MS={target_ms} calibrates to {rounds} rounds")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,154 @@
+"""Event search latency on a large generated catalog, before and after migration 2.
+
+Usage:
+    python -m benchmarks.event_search [--events 500000] [--categories 50] [--vocabulary 20000]
+                                      [--repeat 20] [--database-url postgresql://...]
+
+Seeds ``--events`` events whose titles start with one of ten genres (each in
+about a tenth of the catalog) and whose descriptions draw from a vocabulary
+of mostly rare words, then times the first page of ``search_events`` for
+text, category, date and price searches. "Before" runs without the search indexes, with text
+matched by the LIKE fallback used on other databases; "after" applies
+migration 2 (``app.migrations.add_search_indexes``) and uses the backend's
+full-text index. Defaults to a throwaway SQLite file.
+
+On SQLite with 500k events, a rare word went from 399 to 2.3 ms (prefix
+382 to 2.0 ms), a category from 8.8 to 2.3 ms, and text with category and
+price from 1044 to 67 ms. A word in a tenth of the catalog went from 3.8
+to 54 ms: the LIKE scan walks the date index and stops after 100 hits,
+while FTS5 collects every match before ordering by date, so the cost of a
+search now grows with its matches rather than with the catalog.
+"""
+import argparse
+import os
+import random
+import statistics
+import tempfile
+import time
+from datetime import datetime, timedelta, timezone
+from decimal import Decimal
+
+from sqlalchemy import create_engine, insert
+from sqlalchemy.orm import sessionmaker
+
+from app import models
+from app.cruds import events as event_crud
+from app.database import Base
+from app.migrations import add_search_indexes, model_index
+
+GENRES = ["jazz", "afrobeats", "highlife", "gospel", "comedy", "theatre", "marathon", "football", "tech", "fashion"]
+CITIES = ["Lagos", "Abuja", "Ibadan", "Kano", "Enugu", "Accra", "Nairobi", "Kigali"]
+SYLLABLES = ["ka", "lo", "mi", "ra", "du", "ne", "so", "ti", "ba", "ze", "fo", "gu", "pe", "wa", "yo", "ri"]
+CHUNK = 10_000
+
+
+def vocabulary(size: int, rng: random.Random) -> list:
+    """Pseudo-words for descriptions, so that most words are rare as in a real catalog"""
+    words = set()
+    while len(words) < size:
+        words.add("".join(rng.choice(SYLLABLES) for _ in range(rng.randint(2, 4))))
+    return sorted(words)
+
+
+def seed(engine, args) -> list:
+    rng = random.Random(0)
+    words = vocabulary(args.vocabulary, rng)
+    start = datetime.now(timezone.utc)
+    with engine.begin() as conn:
+        conn.execute(insert(models.Category.__table__), [
+            {"name": f"Category {i}", "is_active": True} for i in range(1, args.categories + 1)
+        ])
+        for offset in range(0, args.events, CHUNK):
+            rows = []
+            for i in range(offset, min(offset + CHUNK, args.events)):
+                genre = rng.choice(GENRES)
+                rows.append({
+                    "title": f"{genre.title()} {rng.choice(words).title()} {i}",
+                    "description": " ".join(rng.choice(words) for _ in range(12)),
+                    "location": rng.choice(CITIES), "price": rng.randint(0, 100) * 500,
+                    "capacity": 100, "tickets_sold": 0, "is_active": rng.random() < 0.8,
+                    "category_id": rng.randint(1, args.categories),
+                    "event_date": start + timedelta(minutes=rng.randint(0, 60 * 24 * 365 * 2)),
+                })
+            conn.execute(insert(models.Event.__table__), rows)
+    return words
+
+
+def drop_search_indexes(engine) -> None:
+    events = Base.metadata.tables["events"]
+    for name in ("ix_events_active_category_date", "ix_events_active_price"):
+        model_index(events, name).drop(engine, checkfirst=True)
+    if engine.dialect.name == "postgresql":
+        model_index(events, "ix_events_search").drop(engine, checkfirst=True)
+    elif engine.dialect.name == "sqlite":
+        with engine.begin() as conn:
+            for trigger in ("insert", "delete", "update"):
+                conn.exec_driver_sql(f"DROP TRIGGER IF EXISTS events_fts_{trigger}")
+            conn.exec_driver_sql("DROP TABLE IF EXISTS events_fts")
+
+
+def run_search(db, dialect: str, filters: dict, limit: int = 100):
+    query = db.query(models.Event).filter(*event_crud.event_filters(dialect, **filters))
+    return query.order_by(*event_crud.EVENT_ORDER).limit(limit).all()
+
+
+def time_searches(Session, dialect: str, searches: dict, repeat: int) -> dict:
+    results = {}
+    with Session() as db:
+        for name, filters in searches.items():
+            timings = []
+            for _ in range(repeat):
+                start = time.perf_counter()
+                found = run_search(db, dialect, filters)
+                timings.append(time.perf_counter() - start)
+            results[name] = (statistics.median(timings), len(found))
+    return results
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--events", type=int, default=500_000)
+    parser.add_argument("--categories", type=int, default=50)
+    parser.add_argument("--vocabulary", type=int, default=20_000)
+    parser.add_argument("--repeat", type=int, default=20)
+    parser.add_argument("--database-url", default=f"sqlite:///{os.path.join(tempfile.mkdtemp(), 'bench.db')}")
+    args = parser.parse_args()
+
+    engine = create_engine(args.database_url)
+    Session = sessionmaker(bind=engine, autoflush=False)
+    Base.metadata.create_all(bind=engine)
+    drop_search_indexes(engine)
+    print(f"Seeding {args.events} events")
+    words = seed(engine, args)
+    with engine.begin() as conn:
+        conn.exec_driver_sql("ANALYZE")
+
+    soon = datetime.now(timezone.utc) + timedelta(days=30)
+    rare = words[len(words) // 2]
+    searches = {
+        f"rare word: {rare}": {"query": rare},
+        f"prefix: {rare[:-1]}": {"query": rare[:-1]},
+        "common word: jazz": {"query": "jazz"},
+        "jazz + city: jazz lagos": {"query": "jazz lagos"},
+        "category": {"category_id": 7},
+        "date range (next 30 days)": {"date_from": datetime.now(timezone.utc), "date_to": soon},
+        "price 1000-1500": {"min_price": Decimal(1000), "max_price": Decimal(1500)},
+        "jazz + category + price": {"query": "jazz", "category_id": 3, "max_price": Decimal(5000)},
+    }
+    before = time_searches(Session, "generic", searches, args.repeat)
+    start = time.perf_counter()
+    add_search_indexes(engine)
+    with engine.begin() as conn:
+        conn.exec_driver_sql("ANALYZE")
+    print(f"Search indexes built in {time.perf_counter() - start:.1f}s")
+    after = time_searches(Session, engine.dialect.name, searches, args.repeat)
+
+    print(f"{'search (first 100 by date)':<30} {'before ms':>10} {'after ms':>10} {'rows':>6}")
+    for name in searches:
+        (before_s, before_rows), (after_s, after_rows) = before[name], after[name]
+        print(f"{name:<30} {before_s * 1000:>10.2f} {after_s * 1000:>10.2f} {after_rows:>6}")
+    engine.dispose()
+
+
+if __name__ == "__main__":
+    main()
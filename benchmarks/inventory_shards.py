@@ -0,0 +1,121 @@
+"""Ticket sales per second on one event as the number of inventory shards grows.
+
+Usage:
+    python -m benchmarks.inventory_shards [--threads 32] [--seconds 5] [--shards 0,1,4,16,64]
+                                          [--commit-latency-ms 2] [--holds]
+                                          [--database-url postgresql://...]
+
+``--threads`` workers call ``update_tickets_sold`` on the same event in a
+loop, each with its own session, as concurrent payment verifications do.
+With ``--holds`` each sale first holds its ticket in a transaction of its
+own, as checkout does, and the sale then uses up the hold; with shards
+both steps claim a shard row and leave the event row alone.
+Shards ``0`` is the event-row counter; other values set ``INVENTORY_SHARDS``.
+Every commit first sleeps ``--commit-latency-ms`` while the transaction's row
+locks are held, standing in for the fsync and network round trip of a real
+commit. Each run checks that every sale was counted.
+
+Row locks only exist on a server database: SQLite locks the whole file for
+every write, so with the default throwaway SQLite file all shard counts
+serialize the same way, and the benchmark shows the shard bookkeeping cost
+rather than any scaling (on one core, 32 threads and 2 ms commits, about
+240 sales/s with the event row and 235-245 with 1-64 shards; with holds,
+two commits per sale, about 130 and 100-120). Point it at
+Postgres to see sales scale with shards until the pool or the server is
+the bottleneck.
+"""
+import argparse
+import os
+import tempfile
+import threading
+import time
+from datetime import datetime, timedelta, timezone
+
+from sqlalchemy import create_engine, event
+from sqlalchemy.orm import Session, sessionmaker
+
+from app import models
+from app.config import settings
+from app.cruds.events import update_tickets_sold
+from app.cruds.payments import hold_event_tickets
+from app.database import Base
+
+
+def run_sales(Sessions, event_id: int, threads: int, seconds: float, holds: bool) -> int:
+    deadline = time.perf_counter() + seconds
+    sold = [0] * threads
+    errors = []
+
+    def worker(index: int):
+        with Sessions() as db:
+            while time.perf_counter() < deadline:
+                try:
+                    if holds:
+                        assert hold_event_tickets(db, event_id), "sold out"
+                        db.commit()
+                    update_tickets_sold(db, event_id, held=1 if holds else 0)
+                    sold[index] += 1
+                except Exception as exc:  # lock timeouts, deadlocks
+                    db.rollback()
+                    errors.append(exc)
+
+    workers = [threading.Thread(target=worker, args=(index,)) for index in range(threads)]
+    for thread in workers:
+        thread.start()
+    for thread in workers:
+        thread.join()
+    if errors:
+        print(f"  {len(errors)} failed sales, e.g. {errors[0]!r}"[:200])
+    return sum(sold)
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--threads", type=int, default=32)
+    parser.add_argument("--seconds", type=float, default=5.0)
+    parser.add_argument("--shards", default="0,1,4,16,64")
+    parser.add_argument("--commit-latency-ms", type=float, default=2.0)
+    parser.add_argument("--holds", action="store_true", help="hold each ticket before selling it, as checkout does")
+    parser.add_argument("--database-url", default=f"sqlite:///{os.path.join(tempfile.mkdtemp(), 'bench.db')}")
+    args = parser.parse_args()
+
+    options = {"connect_args": {"timeout": 60}} if args.database_url.startswith("sqlite") else {}
+    engine = create_engine(args.database_url, pool_size=args.threads, max_overflow=0, **options)
+    Sessions = sessionmaker(bind=engine, autoflush=False)
+    Base.metadata.create_all(bind=engine)
+    latency = args.commit_latency_ms / 1000
+
+    @event.listens_for(Sessions, "before_commit")
+    def slow_commit(session):
+        time.sleep(latency)
+
+    with Sessions() as db:
+        organizer = models.User(email=f"organizer-{time.time_ns()}@example.com", name="Organizer", password_hash="x")
+        db.add(organizer)
+        db.commit()
+        organizer_id = organizer.id
+
+    print(f"{args.threads} threads, {args.seconds:.0f} s per run, {args.commit_latency_ms} ms commits"
+          + (", holding each ticket first" if args.holds else ""))
+    print(f"{'shards':>6} {'sales/s':>9}")
+    for shards in (int(value) for value in args.shards.split(",")):
+        settings.inventory_shards = shards
+        with Sessions() as db:
+            sale = models.Event(
+                title="On-sale", location="Lagos", price=5000, capacity=10_000_000, tickets_sold=0,
+                event_date=datetime.now(timezone.utc) + timedelta(days=30), is_active=True, organizer_id=organizer_id
+            )
+            db.add(sale)
+            db.commit()
+            event_id = sale.id
+        sold = run_sales(Sessions, event_id, args.threads, args.seconds, args.holds)
+        with Session(engine) as db:
+            counted = db.get(models.Event, event_id)
+            assert counted.tickets_sold_total == sold, f"{sold} sales but {counted.tickets_sold_total} counted"
+            assert counted.tickets_held_total == 0, f"{counted.tickets_held_total} holds left over"
+        print(f"{shards:>6} {sold / args.seconds:>9.0f}")
+    engine.dispose()
+
+
+if __name__ == "__main__":
+    main()
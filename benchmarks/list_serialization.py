@@ -0,0 +1,116 @@
+"""Time and memory to load and encode a list response: ORM entities vs column rows.
+
+Usage:
+    python -m benchmarks.list_serialization [--rows 10000] [--repeat 20] [--database-url postgresql://...]
+
+Loads ``--rows`` active events and encodes them as the JSON body of an event
+list, two ways:
+
+- ``entities``: the previous path. ``get_events_async`` loads ``Event``
+  entities into the session, then FastAPI validates each one into
+  ``EventResponse`` (``from_attributes``) and encodes the result with
+  ``json.dumps``.
+- ``rows``: ``get_event_rows_async`` selects only the response columns,
+  and ``RowSerializer.dump_json`` encodes the rows in one call.
+
+Both produce the same bytes. The benchmark reports the median time per list
+and the peak memory allocated while building one list (tracemalloc, measured
+in a separate run from the timings). Defaults to a throwaway SQLite file.
+
+On one core with 10k events (2.6 MB of JSON), entities took about 295 ms
+and peaked at 31 MB; rows took about 120 ms and peaked at 12 MB, most of
+it fetching the rows through aiosqlite.
+"""
+import argparse
+import asyncio
+import json
+import os
+import statistics
+import tempfile
+import time
+import tracemalloc
+from datetime import datetime, timedelta, timezone
+from typing import List
+
+from pydantic import TypeAdapter
+from sqlalchemy import create_engine, insert
+from sqlalchemy.ext.asyncio import async_sessionmaker, create_async_engine
+
+from app import models, schemas
+from app.cruds import events as event_crud
+from app.database import Base, async_database_url
+from app.routers.events import EVENT_ROWS
+
+EVENT_LIST = TypeAdapter(List[schemas.EventResponse])
+
+
+def seed(url: str, rows: int) -> None:
+    engine = create_engine(url)
+    Base.metadata.create_all(bind=engine)
+    start = datetime.now(timezone.utc)
+    with engine.begin() as conn:
+        conn.execute(insert(models.Event.__table__), [
+            {
+                "title": f"Event {i}", "description": "An evening of live music at the waterfront",
+                "location": "Lagos", "price": 5000 + i % 7 * 250, "capacity": 500, "tickets_sold": i % 500,
+                "is_active": True, "event_date": start + timedelta(minutes=i),
+            }
+            for i in range(rows)
+        ])
+    engine.dispose()
+
+
+async def entities(Session, rows: int) -> bytes:
+    async with Session() as db:
+        events = await event_crud.get_events_async(db, 0, rows)
+        # What FastAPI does with a response_model: validate, dump to JSON types, json.dumps
+        content = EVENT_LIST.dump_python(EVENT_LIST.validate_python(events), mode="json")
+        return json.dumps(content, ensure_ascii=False, allow_nan=False, indent=None, separators=(",", ":")).encode()
+
+
+async def column_rows(Session, rows: int) -> bytes:
+    async with Session() as db:
+        return EVENT_ROWS.dump_json(await event_crud.get_event_rows_async(db, EVENT_ROWS.columns, 0, rows))
+
+
+async def measure(build, Session, rows: int, repeat: int) -> tuple:
+    timings = []
+    for _ in range(repeat):
+        start = time.perf_counter()
+        body = await build(Session, rows)
+        timings.append(time.perf_counter() - start)
+    tracemalloc.start()
+    await build(Session, rows)
+    _, peak = tracemalloc.get_traced_memory()
+    tracemalloc.stop()
+    return statistics.median(timings), peak, body
+
+
+async def run(args) -> None:
+    engine = create_async_engine(async_database_url(args.database_url))
+    Session = async_sessionmaker(bind=engine, expire_on_commit=False)
+    results = {}
+    for name, build in (("entities", entities), ("rows", column_rows)):
+        await build(Session, args.rows)  # warm up
+        results[name] = await measure(build, Session, args.rows, args.repeat)
+    await engine.dispose()
+
+    assert results["entities"][2] == results["rows"][2], "the two paths encode different JSON"
+    print(f"{args.rows} events, {len(results['rows'][2]) / 1e6:.1f} MB of JSON per list")
+    print(f"{'path':<10} {'ms':>9} {'peak MB':>9}")
+    for name, (seconds, peak, _) in results.items():
+        print(f"{name:<10} {seconds * 1000:>9.1f} {peak / 1e6:>9.1f}")
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--rows", type=int, default=10_000)
+    parser.add_argument("--repeat", type=int, default=20)
+    parser.add_argument("--database-url", default=f"sqlite:///{os.path.join(tempfile.mkdtemp(), 'bench.db')}")
+    args = parser.parse_args()
+    seed(args.database_url, args.rows)
+    asyncio.run(run(args))
+
+
+if __name__ == "__main__":
+    main()
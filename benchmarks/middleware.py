@@ -0,0 +1,178 @@
+"""Cost of the response header layers: legacy two-wrapper stack vs SecurityMiddleware.
+
+Usage:
+    python -m benchmarks.middleware [--requests 50000]
+
+Both stacks wrap the same minimal ASGI app and are driven directly, without a
+server, so the numbers isolate the middleware work. The legacy stack logs
+through ``logging`` at INFO, SecurityMiddleware through the access log queue;
+both outputs are discarded. Memory is reported as the
+bytes allocated by tracemalloc while handling a request (peak above baseline).
+"""
+import argparse
+import asyncio
+import logging
+import time
+import tracemalloc
+
+from fastapi import Request, Response
+
+from app.access_log import AccessLog
+from app.middleware import SecurityMiddleware
+
+logger = logging.getLogger("benchmarks.middleware")
+
+
+class LegacySecurityMiddleware:
+    """The previous SecurityMiddleware, kept for comparison"""
+
+    def __init__(self, app):
+        self.app = app
+
+    async def __call__(self, scope, receive, send):
+        request = Request(scope, receive)
+        start_time = time.time()
+
+        async def send_wrapper(message):
+            if message["type"] == "http.response.start":
+                headers = dict(message.get("headers", []))
+                headers[b"x-content-type-options"] = b"nosniff"
+                headers[b"x-frame-options"] = b"DENY"
+                headers[b"x-xss-protection"] = b"1; mode=block"
+                headers[b"strict-transport-security"] = b"max-age=31536000; includeSubDomains"
+                message["headers"] = [(k, v) for k, v in headers.items()]
+            await send(message)
+
+        client_ip = request.client.host if request.client else "unknown"
+        method = request.method
+        url = str(request.url)
+        logger.info(f"Request: {method} {url} from {client_ip}")
+        await self.app(scope, receive, send_wrapper)
+        process_time = time.time() - start_time
+        logger.info(f"Response time: {process_time:.4f}s for {method} {url}")
+
+
+class LegacyCORSMiddleware:
+    """The previous custom CORSMiddleware, kept for comparison"""
+
+    def __init__(self, app):
+        self.app = app
+        self.allowed_origins = ["http://localhost:3000", "http://127.0.0.1:3000"]
+        self.allowed_methods = ["GET", "POST", "PUT", "DELETE", "OPTIONS"]
+
+    async def __call__(self, scope, receive, send):
+        request = Request(scope, receive)
+
+        async def send_wrapper(message):
+            if message["type"] == "http.response.start":
+                headers = dict(message.get("headers", []))
+                origin = request.headers.get("origin")
+                if origin in self.allowed_origins:
+                    headers[b"access-control-allow-origin"] = origin.encode() if origin else b"*"
+                headers[b"access-control-allow-methods"] = ", ".join(self.allowed_methods).encode()
+                headers[b"access-control-allow-headers"] = b"Content-Type, Authorization"
+                headers[b"access-control-allow-credentials"] = b"true"
+                message["headers"] = [(k, v) for k, v in headers.items()]
+            await send(message)
+
+        if request.method == "OPTIONS":
+            response = Response(status_code=204)
+            await response(scope, receive, send_wrapper)
+            return
+        await self.app(scope, receive, send_wrapper)
+
+
+class NullStream:
+    def write(self, data):
+        pass
+
+    def flush(self):
+        pass
+
+
+async def endpoint(scope, receive, send):
+    await send({
+        "type": "http.response.start",
+        "status": 200,
+        "headers": [(b"content-type", b"application/json"), (b"content-length", b"2")],
+    })
+    await send({"type": "http.response.body", "body": b"{}"})
+
+
+def make_scope(method: str = "GET"):
+    headers = [
+        (b"host", b"testserver"),
+        (b"origin", b"http://localhost:3000"),
+        (b"user-agent", b"bench"),
+        (b"accept", b"application/json"),
+    ]
+    if method == "OPTIONS":
+        headers.append((b"access-control-request-method", b"POST"))
+    return {
+        "type": "http",
+        "http_version": "1.1",
+        "method": method,
+        "scheme": "http",
+        "server": ("testserver", 80),
+        "client": ("203.0.113.7", 51000),
+        "root_path": "",
+        "path": "/events/42",
+        "raw_path": b"/events/42",
+        "query_string": b"",
+        "headers": headers,
+    }
+
+
+async def receive():
+    return {"type": "http.request", "body": b"", "more_body": False}
+
+
+async def send(message):
+    pass
+
+
+async def drive(app, requests: int, method: str) -> float:
+    start = time.perf_counter()
+    for _ in range(requests):
+        await app(make_scope(method), receive, send)
+    return requests / (time.perf_counter() - start)
+
+
+async def peak_bytes(app, method: str, samples: int = 200) -> float:
+    total = 0
+    for _ in range(samples):
+        tracemalloc.start()
+        base = tracemalloc.get_traced_memory()[0]
+        await app(make_scope(method), receive, send)
+        total += tracemalloc.get_traced_memory()[1] - base
+        tracemalloc.stop()
+    return total / samples
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--requests", type=int, default=50_000)
+    args = parser.parse_args()
+
+    # Log at INFO like production, but discard the output so only formatting cost counts
+    logging.root.handlers = [logging.NullHandler()]
+    logging.root.setLevel(logging.INFO)
+
+    access_log = AccessLog(stream=NullStream())
+    access_log.start()
+    stacks = {
+        "legacy (Security + CORS)": LegacyCORSMiddleware(LegacySecurityMiddleware(endpoint)),
+        "SecurityMiddleware": SecurityMiddleware(endpoint, access_log=access_log),
+    }
+    print(f"{'stack':<26}{'method':>8}{'req/s':>12}{'bytes/req':>12}")
+    for name, app in stacks.items():
+        for method in ("GET", "OPTIONS"):
+            rps = asyncio.run(drive(app, args.requests, method))
+            peak = asyncio.run(peak_bytes(app, method))
+            print(f"{name:<26}{method:>8}{rps:>12,.0f}{peak:>12,.0f}")
+    access_log.stop()
+    print(f"\naccess log: {access_log.written:,} written, {access_log.dropped:,} dropped")
+
+
+if __name__ == "__main__":
+    main()
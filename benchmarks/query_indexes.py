@@ -0,0 +1,166 @@
+"""Seed a large dataset and time the app's queries before and after the query indexes.
+
+Usage:
+    python -m benchmarks.query_indexes [--users 50000] [--events 100000] [--tickets 1000000]
+                                       [--payments 1000000] [--repeat 20] [--database-url postgresql://...]
+
+Creates the schema without the indexes added by migration 1
+(``app.migrations.add_query_indexes``), loads the rows in bulk, times each
+query shape from ``app/cruds``, then applies the migration and times them
+again. A fifth of the events are active, so the partial index stays small. Defaults to a throwaway SQLite file; point
+``--database-url`` at an empty Postgres database to measure there.
+
+With the defaults on SQLite, event listing went from 20 to 2 ms and the
+lookups of tickets by event and payments by user or event
+from 60-130 ms to under 2.5 ms. Tickets by user were already fast, since
+they use the unique (user_id, event_id, seat_number) constraint.
+"""
+import argparse
+import os
+import random
+import statistics
+import tempfile
+import time
+from datetime import datetime, timedelta, timezone
+
+from sqlalchemy import create_engine, func, insert, select
+from sqlalchemy.orm import sessionmaker
+
+from app import models
+from app.cruds import events as event_crud
+from app.cruds import tickets as ticket_crud
+from app.database import Base
+from app.migrations import add_query_indexes, model_index
+
+MIGRATION_INDEXES = (
+    ("events", "ix_events_active_event_date"),
+    ("tickets", "ix_tickets_event_id"),
+    ("payments", "ix_payments_user_id"),
+    ("payments", "ix_payments_event_id"),
+)
+
+CHUNK = 10_000
+
+
+def insert_chunked(engine, table, rows, total: int) -> None:
+    with engine.begin() as conn:
+        chunk = []
+        for row in rows:
+            chunk.append(row)
+            if len(chunk) == CHUNK:
+                conn.execute(insert(table), chunk)
+                chunk = []
+        if chunk:
+            conn.execute(insert(table), chunk)
+    print(f"  {table.name}: {total} rows")
+
+
+def seed(engine, args) -> None:
+    rng = random.Random(0)
+    now = datetime.now(timezone.utc)
+    insert_chunked(engine, models.User.__table__, (
+        {"email": f"user{i}@example.com", "name": f"User {i}", "password_hash": "x", "token_version": 0}
+        for i in range(1, args.users + 1)
+    ), args.users)
+    insert_chunked(engine, models.Event.__table__, (
+        {
+            "title": f"Event {i}", "location": "Lagos", "price": 5000, "capacity": 1000,
+            "tickets_sold": 0, "organizer_id": rng.randint(1, args.users),
+            "event_date": now + timedelta(hours=rng.randint(-24 * 365, 24 * 365)),
+            "is_active": rng.random() < 0.2,
+        }
+        for i in range(1, args.events + 1)
+    ), args.events)
+    insert_chunked(engine, models.Ticket.__table__, (
+        {
+            "user_id": rng.randint(1, args.users), "event_id": rng.randint(1, args.events),
+            "ticket_code": f"TKT-{i:010d}", "amount_paid": 5000, "status": "active", "seat_number": str(i),
+        }
+        for i in range(1, args.tickets + 1)
+    ), args.tickets)
+    insert_chunked(engine, models.Payment.__table__, (
+        {
+            "user_id": rng.randint(1, args.users), "event_id": rng.randint(1, args.events),
+            "paystack_reference": f"REF-{i:010d}", "amount": 5000, "currency": "NGN",
+            "status": "pending" if rng.random() < 0.02 else "success",
+            "created_at": now - timedelta(minutes=rng.randint(0, 60 * 24 * 90)),
+        }
+        for i in range(1, args.payments + 1)
+    ), args.payments)
+
+
+def analyze(engine) -> None:
+    with engine.begin() as conn:
+        conn.exec_driver_sql("ANALYZE")
+
+
+def queries(args):
+    rng = random.Random(1)
+    return {
+        "active events by date": lambda db: event_crud.get_events(db, 0, 100),
+        "tickets of a user": lambda db: ticket_crud.get_user_tickets(db, rng.randint(1, args.users)),
+        "tickets sold for an event": lambda db: db.scalar(
+            select(func.count()).select_from(models.Ticket).where(models.Ticket.event_id == rng.randint(1, args.events))
+        ),
+        "payments of a user": lambda db: db.scalars(
+            select(models.Payment).where(models.Payment.user_id == rng.randint(1, args.users))
+        ).all(),
+        "payments for an event": lambda db: db.scalars(
+            select(models.Payment).where(models.Payment.event_id == rng.randint(1, args.events))
+        ).all(),
+    }
+
+
+def time_queries(Session, args) -> dict:
+    results = {}
+    for name, query in queries(args).items():
+        timings = []
+        for _ in range(args.repeat):
+            with Session() as db:
+                start = time.perf_counter()
+                query(db)
+                timings.append(time.perf_counter() - start)
+        results[name] = statistics.median(timings)
+    return results
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--users", type=int, default=50_000)
+    parser.add_argument("--events", type=int, default=100_000)
+    parser.add_argument("--tickets", type=int, default=1_000_000)
+    parser.add_argument("--payments", type=int, default=1_000_000)
+    parser.add_argument("--repeat", type=int, default=20)
+    parser.add_argument("--database-url", default=f"sqlite:///{os.path.join(tempfile.mkdtemp(), 'bench.db')}")
+    args = parser.parse_args()
+
+    engine = create_engine(args.database_url)
+    Session = sessionmaker(bind=engine, autoflush=False)
+    Base.metadata.create_all(bind=engine)
+    for table, name in MIGRATION_INDEXES:
+        model_index(Base.metadata.tables[table], name).drop(engine, checkfirst=True)
+
+    print("Seeding")
+    start = time.perf_counter()
+    seed(engine, args)
+    analyze(engine)
+    print(f"  done in {time.perf_counter() - start:.1f}s")
+
+    before = time_queries(Session, args)
+    start = time.perf_counter()
+    add_query_indexes(engine)
+    analyze(engine)
+    print(f"Indexes built in {time.perf_counter() - start:.1f}s")
+    after = time_queries(Session, args)
+
+    print(f"{'query':<28} {'before ms':>10} {'after ms':>10} {'speedup':>8}")
+    for name in before:
+        print(
+            f"{name:<28} {before[name] * 1000:>10.2f} {after[name] * 1000:>10.2f} "
+            f"{before[name] / after[name]:>7.0f}x"
+        )
+    engine.dispose()
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,120 @@
+"""Per-request cost of the rate limiter backends.
+
+Usage:
+    python -m benchmarks.rate_limit [--hits 200000] [--backend memory|shared] [--workers 4]
+
+The limiter table is pre-filled with N distinct clients, then random clients
+are hit repeatedly. The cost per hit should stay flat from 10 to 1,000,000
+clients. The old dict-rebuild implementation is measured for the small sizes
+only, since its cost grows with every tracked client.
+
+With ``--workers`` several processes hammer one client on the shared
+backend and the total number of allowed hits is checked against the budget.
+"""
+import argparse
+import multiprocessing
+import os
+import random
+import tempfile
+import time
+
+from app.rate_limit import SlidingWindowLimiter, SharedSlidingWindowLimiter
+
+CLIENT_COUNTS = [10, 1_000, 10_000, 100_000, 1_000_000]
+LEGACY_CLIENT_COUNTS = [10, 1_000, 10_000]
+
+
+class LegacyLimiter:
+    """The previous RateLimitMiddleware bookkeeping, kept for comparison"""
+
+    def __init__(self, max_requests: int = 100, window_seconds: int = 60):
+        self.max_requests = max_requests
+        self.window_seconds = window_seconds
+        self.requests = {}
+
+    def hit(self, client_ip: str):
+        current_time = time.time()
+        self.requests = {
+            ip: [t for t in times if current_time - t < self.window_seconds]
+            for ip, times in self.requests.items()
+        }
+        times = self.requests.setdefault(client_ip, [])
+        if len(times) >= self.max_requests:
+            return False, 0.0
+        times.append(current_time)
+        return True, 0.0
+
+
+def run(limiter, clients: int, hits: int) -> float:
+    """Return the mean cost of one hit in nanoseconds"""
+    keys = [f"10.{i >> 16 & 255}.{i >> 8 & 255}.{i & 255}" for i in range(clients)]
+    for key in keys:
+        limiter.hit(key)
+    sample = [random.choice(keys) for _ in range(hits)]
+
+    hit = limiter.hit
+    start = time.perf_counter()
+    for key in sample:
+        hit(key)
+    return (time.perf_counter() - start) / hits * 1e9
+
+
+def make_limiter(backend: str, clients: int, path: str, max_requests: int = 1_000_000):
+    if backend == "shared":
+        return SharedSlidingWindowLimiter(
+            path, max_requests=max_requests, window_seconds=60, slots=max(2 * clients, 1_024)
+        )
+    return SlidingWindowLimiter(max_requests=max_requests, window_seconds=60, max_keys=clients)
+
+
+def hammer(path: str, max_requests: int, attempts: int, allowed) -> None:
+    limiter = SharedSlidingWindowLimiter(path, max_requests=max_requests, window_seconds=60)
+    count = sum(limiter.hit("203.0.113.7")[0] for _ in range(attempts))
+    with allowed.get_lock():
+        allowed.value += count
+
+
+def shared_budget(workers: int, path: str, max_requests: int = 1_000) -> None:
+    """Check that several processes share one budget on the shared backend"""
+    allowed = multiprocessing.Value("i", 0)
+    procs = [
+        multiprocessing.Process(target=hammer, args=(path, max_requests, max_requests, allowed))
+        for _ in range(workers)
+    ]
+    start = time.perf_counter()
+    for proc in procs:
+        proc.start()
+    for proc in procs:
+        proc.join()
+    elapsed = time.perf_counter() - start
+    total = workers * max_requests
+    print(f"\n{workers} workers, budget {max_requests}: {allowed.value} of {total} hits allowed "
+          f"({total / elapsed:,.0f} hits/s across processes)")
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--hits", type=int, default=200_000)
+    parser.add_argument("--backend", choices=["memory", "shared"], default="memory")
+    parser.add_argument("--workers", type=int, default=0)
+    args = parser.parse_args()
+
+    tmpdir = tempfile.mkdtemp()
+    print(f"{'clients':>10}  {args.backend + ' ns/hit':>22}  {'legacy ns/hit':>14}")
+    for clients in CLIENT_COUNTS:
+        path = os.path.join(tmpdir, f"rate_limit_{clients}.bin")
+        current = run(make_limiter(args.backend, clients, path), clients, args.hits)
+
+        legacy = ""
+        if clients in LEGACY_CLIENT_COUNTS:
+            legacy_hits = max(args.hits // clients, 10)
+            legacy = f"{run(LegacyLimiter(1_000_000), clients, legacy_hits):,.0f}"
+
+        print(f"{clients:>10,}  {current:>22,.0f}  {legacy:>14}")
+
+    if args.workers:
+        shared_budget(args.workers, os.path.join(tmpdir, "shared.bin"))
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,110 @@
+"""Best-available seat search on per-section bitsets against a seat-by-seat scan.
+
+Usage:
+    python -m benchmarks.seat_search [--sections 40] [--rows 50] [--seats 40]
+                                     [--occupancy 0.5 0.9 0.99] [--block 1 2 4 8]
+                                     [--searches 200] [--seed 7]
+
+Builds a stadium of ``--sections`` sections of ``--rows`` rows of
+``--seats`` seats and takes a random ``--occupancy`` fraction of them. For
+each block size, finds the best ``--block`` adjacent free seats (front-most
+row of the best section with room, then nearest the middle of the row)
+``--searches`` times, two ways:
+
+- ``scan``: a loop over rows and seats against the set of taken seat
+  numbers, as a search over ``event_seats`` rows loaded into Python would be
+- ``bitset``: ``EventSeats.best_available`` (app.seating)
+
+Both must pick the same seats. Also reports how long loading the taken
+seats into bitsets takes and the size of the GET /events/{id}/seats
+bitmaps against a JSON list of taken seat numbers. Runs in memory; no
+database is needed.
+
+On one core with the default 80,000-seat stadium, seed 7: at 50% occupancy
+both searches find a block in the first rows, in 3-6 µs with bitsets and
+10-47 µs scanning. At 90% a block of 4 or 8 took 10-48 µs against 1.5-22 ms
+scanning (160-460x), and at 99% 2-8 seats took 7-44 µs against 2.8-21 ms
+(380-580x). Loading 72,000 taken seats into bitsets took about 100 ms,
+which each worker pays once per SEAT_MAP_REFRESH_SECONDS per event, and
+the availability response came to 75 KB (mostly the row list) against
+0.9 MB for the taken seat numbers as JSON.
+"""
+import argparse
+import json
+import random
+import time
+
+
+def scan(sections, taken: set, n: int):
+    """Best block by looking at each seat, rows front first, then nearest the middle"""
+    for name, rows in sections:
+        for label, seats in rows:
+            middle = (seats - n) // 2
+            best = None
+            run = 0
+            for seat in range(1, seats + 1):
+                run = 0 if f"{name}-{label}-{seat}" in taken else run + 1
+                if run >= n:
+                    start = seat - n
+                    if best is None or abs(start - middle) < abs(best - middle):
+                        best = start
+            if best is not None:
+                return [f"{name}-{label}-{seat}" for seat in range(best + 1, best + n + 1)]
+    return None
+
+
+def timed(search, repeat: int):
+    start = time.perf_counter()
+    for _ in range(repeat):
+        result = search()
+    return result, (time.perf_counter() - start) / repeat
+
+
+def run(args) -> None:
+    from app.seating import EventSeats, SeatMap
+
+    rng = random.Random(args.seed)
+    sections = [
+        (f"S{section}", [(str(row), args.seats) for row in range(1, args.rows + 1)])
+        for section in range(1, args.sections + 1)
+    ]
+    seat_map = SeatMap(sections)
+    everything = [
+        f"{name}-{label}-{seat}" for name, rows in sections for label, seats in rows for seat in range(1, seats + 1)
+    ]
+    print(f"{seat_map.capacity} seats in {args.sections} sections of {args.rows} rows of {args.seats}")
+    print(f"{'occupancy':>9} {'block':>5} {'scan µs':>10} {'bitset µs':>10} {'speedup':>8}")
+    for occupancy in args.occupancy:
+        taken = set(rng.sample(everything, int(len(everything) * occupancy)))
+        start = time.perf_counter()
+        state = EventSeats(seat_map, taken)
+        loaded = time.perf_counter() - start
+        for n in args.block:
+            expected, scan_seconds = timed(lambda: scan(sections, taken, n), max(args.searches // 20, 1))
+            found, bitset_seconds = timed(lambda: state.best_available(n), args.searches)
+            assert found == expected, (found, expected)
+            print(
+                f"{occupancy:>9.0%} {n:>5} {scan_seconds * 1e6:>10.1f} {bitset_seconds * 1e6:>10.1f} "
+                f"{scan_seconds / bitset_seconds:>7.0f}x"
+            )
+        bitmaps = len(json.dumps(state.snapshot()))
+        print(
+            f"{'':>9} loaded {len(taken)} taken seats in {loaded * 1000:.0f} ms; "
+            f"bitmaps {bitmaps / 1000:.0f} KB, seat numbers {len(json.dumps(sorted(taken))) / 1000:.0f} KB"
+        )
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--sections", type=int, default=40)
+    parser.add_argument("--rows", type=int, default=50)
+    parser.add_argument("--seats", type=int, default=40, help="seats per row")
+    parser.add_argument("--occupancy", type=float, nargs="+", default=[0.5, 0.9, 0.99])
+    parser.add_argument("--block", type=int, nargs="+", default=[1, 2, 4, 8])
+    parser.add_argument("--searches", type=int, default=200)
+    parser.add_argument("--seed", type=int, default=7)
+    run(parser.parse_args())
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,103 @@
+"""Worker cold-start cost: importing ``app.main`` and the boot-time schema step.
+
+Usage:
+    python -m benchmarks.startup [--runs 5] [--top 15] [--database-url postgresql://...]
+
+Each run starts a fresh interpreter with ``python -X importtime`` importing
+``app.main``, as a gunicorn worker does, and reports the median total import
+time and the slowest top-level packages by cumulative time. It then times
+the schema step of the lifespan: the version check workers now run
+(``ensure_schema``) against ``create_all`` on an up-to-date database, which
+every worker used to run at boot. Defaults to a throwaway SQLite file.
+
+On one core, importing the service clients on first use took the median
+import from about 760 to 730 ms (15 runs each); FastAPI and SQLAlchemy
+account for most of the rest. The version check is one query where
+``create_all`` issues one per table, each a round trip on a remote database.
+"""
+import argparse
+import os
+import statistics
+import subprocess
+import sys
+import tempfile
+from collections import defaultdict
+
+SCHEMA_STEP = """
+import time
+from sqlalchemy import event
+from app.database import Base, engine
+from app.migrations import ensure_schema, upgrade
+upgrade(engine)
+statements = []
+event.listen(engine, "before_cursor_execute", lambda *args: statements.append(args[2]))
+start = time.perf_counter(); ensure_schema(engine); check = time.perf_counter() - start
+checked = len(statements)
+start = time.perf_counter(); Base.metadata.create_all(bind=engine); create_all = time.perf_counter() - start
+print(check, checked, create_all, len(statements) - checked)
+"""
+
+
+def import_times(env: dict) -> tuple:
+    """Total microseconds for ``app.main``, cumulative microseconds per module it
+    imports directly, and every module imported"""
+    result = subprocess.run(
+        [sys.executable, "-X", "importtime", "-c", "import app.main"],
+        capture_output=True, text=True, env=env, check=True
+    )
+    total = 0
+    children = {}
+    modules = set()
+    for line in result.stderr.splitlines():
+        parts = line[len("import time:"):].split("|")
+        if not line.startswith("import time:") or len(parts) != 3 or not parts[1].strip().isdigit():
+            continue
+        _, cumulative, name = parts
+        modules.add(name.strip())
+        depth = (len(name) - len(name.lstrip())) // 2
+        # A module is listed after everything it imported, so the depth-1 lines
+        # since the previous top-level module are the next one's direct imports
+        if depth == 0:
+            if name.strip() == "app.main":
+                total = int(cumulative)
+                break
+            children = {}
+        elif depth == 1:
+            children[name.strip()] = int(cumulative)
+    return total, children, modules
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--runs", type=int, default=5)
+    parser.add_argument("--top", type=int, default=15)
+    parser.add_argument("--database-url", default=f"sqlite:///{os.path.join(tempfile.mkdtemp(), 'bench.db')}")
+    args = parser.parse_args()
+    env = {**os.environ, "DATABASE_URL": args.database_url}
+
+    totals = []
+    packages = defaultdict(list)
+    for _ in range(args.runs):
+        total, per_package, modules = import_times(env)
+        totals.append(total)
+        for name, cumulative in per_package.items():
+            packages[name].append(cumulative)
+
+    print(f"import app.main: {statistics.median(totals) / 1000:.0f} ms (median of {args.runs} cold interpreters)")
+    print(f"{'imported by app.main':<28} {'ms':>8}")
+    ranked = sorted(packages.items(), key=lambda item: statistics.median(item[1]), reverse=True)
+    for name, values in ranked[:args.top]:
+        print(f"{name:<28} {statistics.median(values) / 1000:>8.1f}")
+    eager = [name for name in ("sendgrid", "qrcode", "PIL", "requests") if name in modules]
+    print(f"service clients imported at boot: {', '.join(eager) or 'none'}")
+
+    result = subprocess.run([sys.executable, "-c", SCHEMA_STEP], capture_output=True, text=True, env=env, check=True)
+    check, checked, create_all, created = result.stdout.split()[-4:]
+    print(
+        f"schema step on a current database: version check {float(check) * 1000:.1f} ms / {checked} queries, "
+        f"create_all {float(create_all) * 1000:.1f} ms / {created} queries"
+    )
+
+
+if __name__ == "__main__":
+    main()
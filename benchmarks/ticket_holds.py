@@ -0,0 +1,125 @@
+"""Checkout rush for the last tickets of an event: capacity check only vs ticket holds.
+
+Usage:
+    python -m benchmarks.ticket_holds [--buyers 2000] [--concurrency 100] [--tickets 100]
+                                      [--paystack-ms 50] [--database-url postgresql://...]
+
+Drives ``POST /payments/initialize`` in-process through httpx's ASGI
+transport: ``--buyers`` checkouts, ``--concurrency`` at a time, for an event
+with ``--tickets`` left. Paystack is replaced by a stub that sleeps
+``--paystack-ms``. Two modes:
+
+- ``check only``: the previous behaviour, where initialize only compared
+  ``tickets_sold`` with the capacity and reserved nothing (the hold is
+  skipped), so every buyer reaches Paystack until payments are verified
+- ``holds``: initialize holds a ticket with one conditional UPDATE first
+
+Each mode reports checkouts per second, how many reached Paystack and how
+many pending payments were left behind. Defaults to a throwaway SQLite file.
+
+On one core with 2000 buyers for 100 tickets and 50 ms Paystack calls,
+checking only sent all 2000 checkouts to Paystack (about 120 per second,
+2000 pending payments); with holds 100 reached Paystack and the other 1900
+were refused by the database (about 320 checkouts per second), leaving 100
+pending payments whose holds expire unless they are paid.
+"""
+import argparse
+import asyncio
+import os
+import tempfile
+import time
+from datetime import datetime, timedelta, timezone
+
+
+async def rush(client, headers: dict, event_id: int, buyers: int, concurrency: int) -> dict:
+    remaining = buyers
+    statuses = {}
+
+    async def buyer():
+        nonlocal remaining
+        while remaining > 0:
+            remaining -= 1
+            response = await client.post(
+                "/payments/initialize", json={"event_id": event_id, "email": "buyer@example.com"}, headers=headers
+            )
+            statuses[response.status_code] = statuses.get(response.status_code, 0) + 1
+
+    start = time.perf_counter()
+    await asyncio.gather(*(buyer() for _ in range(concurrency)))
+    return {"rps": buyers / (time.perf_counter() - start), "statuses": statuses}
+
+
+async def run(args) -> None:
+    import httpx
+
+    from app import models
+    from app.cruds import payments as payment_crud
+    from app.database import SessionLocal, async_engine, create_tables, engine
+    from app.main import app
+    from app.services import paystack
+
+    create_tables()
+    calls = 0
+
+    def initialize_payment(email: str, amount: int, reference: str) -> dict:
+        nonlocal calls
+        calls += 1
+        time.sleep(args.paystack_ms / 1000)
+        return {"status": True, "data": {"authorization_url": "https://checkout.paystack.com/x", "access_code": "x"}}
+
+    paystack.initialize_payment = initialize_payment
+    reserve_payment = payment_crud.reserve_payment
+
+    def without_hold(db, user_id, event_id, reference, amount, hold_seconds):
+        return payment_crud.create_payment(db, user_id, event_id, reference, amount, access_code="")
+
+    transport = httpx.ASGITransport(app=app)
+    async with httpx.AsyncClient(transport=transport, base_url="http://bench") as client:
+        user = {"email": f"buyer-{time.time_ns()}@example.com", "name": "Buyer", "password": "benchmark-password"}
+        await client.post("/auth/register", json=user)
+        token = (await client.post("/auth/login", json=user)).json()["access_token"]
+        headers = {"Authorization": f"Bearer {token}"}
+
+        print(f"{args.buyers} buyers, {args.concurrency} at a time, {args.tickets} tickets left, "
+              f"{args.paystack_ms} ms Paystack calls")
+        print(f"{'mode':<12} {'checkouts/s':>12} {'Paystack calls':>15} {'pending left':>13} {'refused':>8}")
+        for mode, reserve in (("check only", without_hold), ("holds", reserve_payment)):
+            payment_crud.reserve_payment = reserve
+            with SessionLocal() as db:
+                event = models.Event(
+                    title="Last tickets", location="Lagos", price=5000, capacity=args.tickets, tickets_sold=0,
+                    event_date=datetime.now(timezone.utc) + timedelta(days=30), is_active=True
+                )
+                db.add(event)
+                db.commit()
+                event_id = event.id
+            calls = 0
+            result = await rush(client, headers, event_id, args.buyers, args.concurrency)
+            with SessionLocal() as db:
+                pending = db.query(models.Payment).filter(
+                    models.Payment.event_id == event_id, models.Payment.status == 'pending'
+                ).count()
+            print(f"{mode:<12} {result['rps']:>12.0f} {calls:>15} {pending:>13} {result['statuses'].get(400, 0):>8}")
+        payment_crud.reserve_payment = reserve_payment
+    engine.dispose()
+    await async_engine.dispose()
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--buyers", type=int, default=2000)
+    parser.add_argument("--concurrency", type=int, default=100)
+    parser.add_argument("--tickets", type=int, default=100)
+    parser.add_argument("--paystack-ms", type=float, default=50.0)
+    parser.add_argument("--database-url", default=f"sqlite:///{os.path.join(tempfile.mkdtemp(), 'bench.db')}")
+    args = parser.parse_args()
+    # Settings are read when the app is imported
+    os.environ["DATABASE_URL"] = args.database_url
+    os.environ.setdefault("RATE_LIMIT_REQUESTS", str(10 * args.buyers))
+    os.environ.setdefault("ACCESS_LOG_ENABLED", "false")
+    os.environ.setdefault("BCRYPT_ROUNDS", "4")
+    asyncio.run(run(args))
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,165 @@
+"""Checkout latency under a 50x on-sale spike, with and without the waiting room.
+
+Usage:
+    python -m benchmarks.waiting_room [--baseline 10] [--spike 50] [--rate 30]
+                                      [--paystack-ms 100] [--paystack-limit 10]
+                                      [--database-url postgresql://...]
+
+Drives the real app in-process through httpx's ASGI transport. Each buyer
+starts one checkout (``POST /payments/initialize``); first ``--baseline``
+buyers arrive together, then ``--spike`` times as many. Paystack is a stub
+that takes ``--paystack-ms`` and fails when more than ``--paystack-limit``
+calls are in flight, as an overloaded gateway would, so the app's circuit
+breaker opens after five failures. Two modes:
+
+- ``open``: buyers go straight to checkout
+- ``waiting room``: buyers join the event's queue, poll it (``GET
+  /events/{id}/queue``) as ``wait_seconds`` says, and check out once
+  admitted, ``--rate`` per second
+
+Reports, per phase, the checkouts that succeeded and failed (503), the
+checkout request latency, and how long the whole phase took to serve.
+Defaults to a throwaway SQLite file.
+
+On one core with 10 then 500 buyers (one account each), 100 ms Paystack
+calls and 10 calls in flight allowed: open checkouts took 0.18 s p50 at
+baseline and 5.8 s p50 (5.9 s p99) in the spike, where Paystack
+overflowed, the breaker kept opening and 140 of 500 checkouts failed.
+With the waiting room at 30 per second checkouts took 0.11 s p50 (0.15 s
+p99) in both phases and all 500 succeeded; the spike took 17 s to serve,
+which buyers spent in the queue, polling it from memory.
+"""
+import argparse
+import asyncio
+import os
+import tempfile
+import threading
+import time
+from datetime import datetime, timedelta, timezone
+
+
+def percentile(values, fraction: float) -> float:
+    values = sorted(values)
+    return values[min(int(len(values) * fraction), len(values) - 1)] if values else 0.0
+
+
+async def buyer(client, headers: dict, event_id: int, queued: bool, result: dict) -> None:
+    checkout_headers = headers
+    if queued:
+        place = (await client.post(f"/events/{event_id}/queue", headers=headers)).json()
+        token = place["token"]
+        while not place["admitted"]:
+            await asyncio.sleep(place["wait_seconds"])
+            place = (await client.get(f"/events/{event_id}/queue", headers={"X-Queue-Token": token})).json()
+        checkout_headers = {**headers, "X-Queue-Token": token}
+    start = time.perf_counter()
+    response = await client.post(
+        "/payments/initialize", json={"event_id": event_id, "email": "buyer@example.com"}, headers=checkout_headers
+    )
+    result["latency"].append(time.perf_counter() - start)
+    result["statuses"][response.status_code] = result["statuses"].get(response.status_code, 0) + 1
+
+
+async def phase(client, buyer_headers: list, event_id: int, queued: bool) -> dict:
+    result = {"latency": [], "statuses": {}}
+    start = time.perf_counter()
+    await asyncio.gather(*(buyer(client, headers, event_id, queued, result) for headers in buyer_headers))
+    result["seconds"] = time.perf_counter() - start
+    return result
+
+
+async def run(args) -> None:
+    import httpx
+
+    from app import models
+    from app.database import SessionLocal, async_engine, create_tables, engine
+    from app.main import app
+    from app.security import create_access_token, token_claims
+    from app.services import paystack
+    from app.waiting_room import waiting_room
+
+    create_tables()
+    in_flight = 0
+    lock = threading.Lock()
+
+    def initialize_payment(email: str, amount: int, reference: str) -> dict:
+        def request():
+            nonlocal in_flight
+            with lock:
+                in_flight += 1
+                overloaded = in_flight > args.paystack_limit
+            try:
+                time.sleep(args.paystack_ms / 1000)
+                if overloaded:
+                    raise Exception("429 Too Many Requests from Paystack")
+                return {"status": True, "data": {"authorization_url": "https://checkout.paystack.com/x", "access_code": "x"}}
+            finally:
+                with lock:
+                    in_flight -= 1
+        return paystack.circuit_breaker.call(request)
+
+    paystack.initialize_payment = initialize_payment
+
+    transport = httpx.ASGITransport(app=app)
+    async with httpx.AsyncClient(transport=transport, base_url="http://bench", timeout=120) as client:
+        spike = args.baseline * args.spike
+        # One account per buyer: the waiting room gives each account one place
+        run_id = time.time_ns()
+        with SessionLocal() as db:
+            users = [
+                models.User(email=f"buyer-{run_id}-{index}@example.com", name="Buyer", password_hash="x")
+                for index in range(args.baseline + spike)
+            ]
+            db.add_all(users)
+            db.commit()
+            buyer_headers = [
+                {"Authorization": f"Bearer {create_access_token(token_claims(user), timedelta(hours=1))}"}
+                for user in users
+            ]
+
+        print(f"{args.baseline} then {spike} buyers, {args.paystack_ms} ms Paystack calls, "
+              f"at most {args.paystack_limit} in flight")
+        print(f"{'mode':<14} {'phase':<9} {'ok':>5} {'failed':>7} {'p50 s':>7} {'p99 s':>7} {'served in s':>12}")
+        for mode, rate in (("open", 0.0), ("waiting room", args.rate)):
+            waiting_room.rate = rate
+            waiting_room.clear()
+            paystack.circuit_breaker.on_success()
+            with SessionLocal() as db:
+                event = models.Event(
+                    title="On-sale", location="Lagos", price=5000, capacity=1_000_000, tickets_sold=0,
+                    event_date=datetime.now(timezone.utc) + timedelta(days=30), is_active=True
+                )
+                db.add(event)
+                db.commit()
+                event_id = event.id
+            for name, headers in (("baseline", buyer_headers[:args.baseline]), ("spike", buyer_headers[args.baseline:])):
+                buyers = len(headers)
+                result = await phase(client, headers, event_id, queued=rate > 0)
+                ok = result["statuses"].get(200, 0)
+                print(
+                    f"{mode:<14} {name:<9} {ok:>5} {buyers - ok:>7} {percentile(result['latency'], 0.5):>7.2f} "
+                    f"{percentile(result['latency'], 0.99):>7.2f} {result['seconds']:>12.1f}"
+                )
+    engine.dispose()
+    await async_engine.dispose()
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--baseline", type=int, default=10)
+    parser.add_argument("--spike", type=int, default=50, help="spike size as a multiple of the baseline")
+    parser.add_argument("--rate", type=float, default=30.0, help="admissions per second in waiting room mode")
+    parser.add_argument("--paystack-ms", type=float, default=100.0)
+    parser.add_argument("--paystack-limit", type=int, default=10)
+    parser.add_argument("--database-url", default=f"sqlite:///{os.path.join(tempfile.mkdtemp(), 'bench.db')}")
+    args = parser.parse_args()
+    # Settings are read when the app is imported
+    os.environ["DATABASE_URL"] = args.database_url
+    os.environ.setdefault("RATE_LIMIT_REQUESTS", "1000000")
+    os.environ.setdefault("ACCESS_LOG_ENABLED", "false")
+    os.environ.setdefault("BCRYPT_ROUNDS", "4")
+    asyncio.run(run(args))
+
+
+if __name__ == "__main__":
+    main()
@@ -1,23 +1,71 @@
+import os
+import tempfile
 import pytest
 from fastapi.testclient import TestClient
-from sqlalchemy import create_engine
+from sqlalchemy import create_engine, event
 from sqlalchemy.orm import sessionmaker
-from sqlalchemy.pool import StaticPool
+from sqlalchemy.ext.asyncio import async_sessionmaker, create_async_engine
+from sqlalchemy.pool import NullPool
 
-from app.main import app
-from app.database import Base, get_db
+# Hash passwords on the threadpool instead of spawning a process pool per test client
+os.environ.setdefault("PASSWORD_HASH_PROCESSES", "0")
+# The cheapest bcrypt cost keeps hashing out of the test run time
+os.environ.setdefault("BCRYPT_ROUNDS", "4")
+
+from app.main import app, rate_limiter
+from app.cache import event_cache, principal_cache
+from app.security import login_attempts
+from app.revocation import revocations
+from app.waiting_room import waiting_room
+from app.seating import seating
+from app.replicas import RoutingSession, read_your_writes
+from app.database import replicas
+from app.database import Base, async_database_url, get_async_db, get_async_session_factory, get_db
 from app import models
 
-# Use in-memory SQLite for testing
-SQLALCHEMY_DATABASE_URL = "sqlite:///:memory:"
+# Use a SQLite file for testing, so the sync and async engines share one database
+SQLALCHEMY_DATABASE_URL = f"sqlite:///{os.path.join(tempfile.mkdtemp(), 'test.db')}"
 
 engine = create_engine(
     SQLALCHEMY_DATABASE_URL,
     connect_args={"check_same_thread": False},
-    poolclass=StaticPool,
 )
 TestingSessionLocal = sessionmaker(autocommit=False, autoflush=False, bind=engine)
 
+# NullPool: every TestClient runs its own event loop, and pooled aiosqlite
+# connections cannot be reused from another loop
+async_engine = create_async_engine(async_database_url(SQLALCHEMY_DATABASE_URL), poolclass=NullPool)
+TestingAsyncSessionLocal = async_sessionmaker(
+    bind=async_engine, sync_session_class=RoutingSession, autoflush=False, expire_on_commit=False
+)
+
+def pytest_addoption(parser):
+    parser.addoption("--run-slow", action="store_true", help="also run tests marked slow")
+
+def pytest_configure(config):
+    config.addinivalue_line("markers", "slow: takes long (e.g. a million-row export); run with --run-slow")
+
+def pytest_collection_modifyitems(config, items):
+    if config.getoption("--run-slow"):
+        return
+    skip = pytest.mark.skip(reason="slow; run with --run-slow")
+    for item in items:
+        if "slow" in item.keywords:
+            item.add_marker(skip)
+
+@pytest.fixture(autouse=True)
+def reset_shared_state():
+    """Give every test a fresh rate limit budget and empty caches"""
+    rate_limiter.clear()
+    login_attempts.clear()
+    revocations.clear()
+    principal_cache.clear()
+    event_cache.clear()
+    waiting_room.clear()
+    seating.clear()
+    read_your_writes.clear()
+    yield
+
 @pytest.fixture(scope="function")
 def db_session():
     """Create a fresh database for each test"""
@@ -29,6 +77,11 @@ def db_session():
         db.close()
         Base.metadata.drop_all(bind=engine)
 
+@pytest.fixture
+def async_session_factory(db_session):
+    """Factory for async sessions on the same fresh database as ``db_session``"""
+    return TestingAsyncSessionLocal
+
 @pytest.fixture(scope="function")
 def client(db_session):
     """Create a test client with database override"""
@@ -38,11 +91,44 @@ def client(db_session):
         finally:
             pass
     
+    async def override_get_async_db():
+        async with TestingAsyncSessionLocal() as db:
+            yield db
+    
     app.dependency_overrides[get_db] = override_get_db
+    app.dependency_overrides[get_async_db] = override_get_async_db
+    app.dependency_overrides[get_async_session_factory] = lambda: TestingAsyncSessionLocal
     with TestClient(app) as test_client:
         yield test_client
     app.dependency_overrides.clear()
 
+@pytest.fixture
+def replica(monkeypatch):
+    """A second SQLite file serving as the only read replica; request it before ``client``"""
+    url = f"sqlite:///{os.path.join(tempfile.mkdtemp(), 'replica.db')}"
+    replica_engine = create_engine(url, connect_args={"check_same_thread": False})
+    Base.metadata.create_all(bind=replica_engine)
+    monkeypatch.setattr(replicas, "engines", {"replica0": create_async_engine(async_database_url(url), poolclass=NullPool)})
+    monkeypatch.setattr(replicas, "lag", {"replica0": None})
+    db = sessionmaker(bind=replica_engine)()
+    try:
+        yield db
+    finally:
+        db.close()
+        replica_engine.dispose()
+
+@pytest.fixture
+def sql_statements():
+    """SQL run on the test database by either engine; clear it to start counting"""
+    statements = []
+    listener = lambda conn, cursor, statement, *args: statements.append(statement)
+    engines = [engine, async_engine.sync_engine]
+    for bind in engines:
+        event.listen(bind, "before_cursor_execute", listener)
+    yield statements
+    for bind in engines:
+        event.remove(bind, "before_cursor_execute", listener)
+
 @pytest.fixture
 def test_user_data():
     """Sample user data"""
@@ -100,4 +100,331 @@ def test_get_current_user_invalid_token(client):
     """Test getting current user with invalid token fails"""
     response = client.get("/auth/me", headers={"Authorization": "Bearer invalid_token"})
     
-    assert response.status_code == status.HTTP_401_UNAUTHORIZED
\ No newline at end of file
+    assert response.status_code == status.HTTP_401_UNAUTHORIZED
+
+def test_authenticated_requests_skip_users_table(client, authenticated_user, sql_statements):
+    """Test tokens are validated from their claims without querying users"""
+    sql_statements.clear()
+    for _ in range(5):
+        response = client.get("/tickets/my-tickets", headers=authenticated_user["headers"])
+        assert response.status_code == status.HTTP_200_OK
+    
+    assert sql_statements
+    assert not any("FROM users" in statement for statement in sql_statements)
+
+def test_cached_user_invalidated_on_deactivation(client, authenticated_user, db_session):
+    """Test deactivating a user takes effect despite the cache"""
+    from app import schemas
+    from app.cruds import users as user_crud
+    me = client.get("/auth/me", headers=authenticated_user["headers"]).json()
+    
+    user_crud.update_user(db_session, me["id"], schemas.UserUpdate(is_active=False))
+    
+    response = client.get("/auth/me", headers=authenticated_user["headers"])
+    assert response.status_code == status.HTTP_401_UNAUTHORIZED
+
+def test_principal_cache_expires_with_token():
+    """Test cached principals never outlive their token"""
+    from app import schemas
+    from app.cache import PrincipalCache
+    now = [1000.0]
+    cache = PrincipalCache(ttl=60, clock=lambda: now[0])
+    user = schemas.AuthenticatedUser(id=1, email="a@example.com", is_active=True)
+    
+    cache.set("token", user, token_expires_at=1010)
+    assert cache.get("token") == user
+    
+    now[0] = 1011.0
+    assert cache.get("token") is None
+
+def test_password_hasher_process_pool():
+    """Test hashing and verification on the dedicated process pool"""
+    import asyncio
+    from app.security import PasswordHasher
+    hasher = PasswordHasher(processes=1, max_pending=2)
+    
+    async def run():
+        hashed = await hasher.hash("testpassword123")
+        return hashed, await hasher.verify("testpassword123", hashed), await hasher.verify("wrong-password", hashed)
+    
+    try:
+        hashed, valid, invalid = asyncio.run(run())
+    finally:
+        hasher.shutdown()
+    
+    assert hashed.startswith("$2b$")
+    assert valid is True
+    assert invalid is False
+
+def test_password_hasher_start_spawns_processes():
+    """Test start has every pool process running before the first hash"""
+    from app.security import PasswordHasher
+    hasher = PasswordHasher(processes=2, max_pending=2)
+    
+    try:
+        hasher.start()
+        processes = hasher._executor()._processes
+        assert len(processes) == 2
+        assert all(process.is_alive() for process in processes.values())
+    finally:
+        hasher.shutdown()
+
+def test_password_hasher_rejects_when_saturated():
+    """Test the hasher refuses work beyond its queue bound"""
+    import asyncio
+    import time
+    from app.security import PasswordHasher, PasswordHasherBusy
+    hasher = PasswordHasher(processes=0, max_pending=1, retry_after=3)
+    
+    async def run():
+        return await asyncio.gather(hasher._run(time.sleep, 0.2), hasher.hash("testpassword123"), return_exceptions=True)
+    
+    results = asyncio.run(run())
+    
+    assert isinstance(results[1], PasswordHasherBusy)
+    assert results[1].retry_after == 3
+
+def test_login_returns_503_when_hasher_saturated(client, test_user_data, monkeypatch):
+    """Test a saturated hashing pool sheds logins with 503 and Retry-After"""
+    import threading
+    from app.security import password_hasher
+    client.post("/auth/register", json=test_user_data)
+    exhausted = threading.BoundedSemaphore(1)
+    exhausted.acquire()
+    monkeypatch.setattr(password_hasher, "_slots", exhausted)
+    
+    response = client.post("/auth/login", json={
+        "email": test_user_data["email"],
+        "password": test_user_data["password"]
+    })
+    
+    assert response.status_code == status.HTTP_503_SERVICE_UNAVAILABLE
+    assert response.headers["retry-after"] == "1"
+
+def test_login_locked_after_repeated_failures(client, test_user_data, sql_statements):
+    """Test an account is locked before any DB or bcrypt work after too many failures"""
+    from app.config import settings
+    client.post("/auth/register", json=test_user_data)
+    for _ in range(settings.max_login_attempts):
+        response = client.post("/auth/login", json={"email": test_user_data["email"], "password": "wrongpassword"})
+        assert response.status_code == status.HTTP_401_UNAUTHORIZED
+    
+    sql_statements.clear()
+    response = client.post("/auth/login", json={
+        "email": test_user_data["email"],
+        "password": test_user_data["password"]
+    })
+    
+    assert response.status_code == status.HTTP_429_TOO_MANY_REQUESTS
+    assert int(response.headers["retry-after"]) > 0
+    assert sql_statements == []
+
+def test_successful_login_resets_failures(client, test_user_data):
+    """Test a successful login clears the account's failure count"""
+    from app.config import settings
+    client.post("/auth/register", json=test_user_data)
+    credentials = {"email": test_user_data["email"], "password": test_user_data["password"]}
+    wrong = {"email": test_user_data["email"], "password": "wrongpassword"}
+    
+    for _ in range(settings.max_login_attempts - 1):
+        client.post("/auth/login", json=wrong)
+    assert client.post("/auth/login", json=credentials).status_code == status.HTTP_200_OK
+    
+    for _ in range(settings.max_login_attempts - 1):
+        client.post("/auth/login", json=wrong)
+    assert client.post("/auth/login", json=credentials).status_code == status.HTTP_200_OK
+
+def test_login_tracker_locks_address():
+    """Test failures across many accounts lock the client address"""
+    from app.rate_limit import LoginAttemptTracker, SlidingWindowLimiter
+    tracker = LoginAttemptTracker(
+        accounts=SlidingWindowLimiter(max_requests=5, window_seconds=900),
+        addresses=SlidingWindowLimiter(max_requests=3, window_seconds=900)
+    )
+    for i in range(3):
+        tracker.record_failure(f"user{i}@example.com", "198.51.100.4")
+    
+    assert tracker.check("someone@example.com", "198.51.100.4")[0] is False
+    assert tracker.check("someone@example.com", "198.51.100.5")[0] is True
+    assert tracker.check("User0@Example.com ", "198.51.100.5")[0] is True
+
+def test_login_lockout_is_shared_between_workers(tmp_path):
+    """Test failures recorded by different workers count against one budget"""
+    from app.rate_limit import SHARED_BACKEND, LoginAttemptTracker, create_limiter
+    from app.security import login_attempts
+    
+    def worker():
+        return LoginAttemptTracker(
+            accounts=create_limiter(SHARED_BACKEND, 3, 900, storage_path=str(tmp_path / "accounts")),
+            addresses=create_limiter(SHARED_BACKEND, 10, 900, storage_path=str(tmp_path / "addresses"))
+        )
+    
+    first, second = worker(), worker()
+    for tracker in (first, second, first):
+        tracker.record_failure("user@example.com", "198.51.100.4")
+    
+    assert type(login_attempts.accounts) is type(first.accounts)
+    assert second.check("user@example.com", "198.51.100.5")[0] is False
+
+def test_login_rehashes_outdated_cost(client, test_user_data, db_session):
+    """Test a hash made with another bcrypt cost is replaced on login"""
+    from app import models
+    from app.security import password_context, password_hasher
+    client.post("/auth/register", json=test_user_data)
+    user = db_session.query(models.User).filter(models.User.email == test_user_data["email"]).first()
+    user.password_hash = password_context(5).hash(test_user_data["password"])
+    db_session.commit()
+    
+    response = client.post("/auth/login", json={
+        "email": test_user_data["email"],
+        "password": test_user_data["password"]
+    })
+    
+    assert response.status_code == status.HTTP_200_OK
+    db_session.refresh(user)
+    assert user.password_hash.startswith(f"$2b${password_hasher.rounds:02d}$")
+    assert client.post("/auth/login", json={
+        "email": test_user_data["email"],
+        "password": test_user_data["password"]
+    }).status_code == status.HTTP_200_OK
+
+def test_authenticate_user_rehashes_outdated_cost(db_session):
+    """Test authenticate_user upgrades the stored hash after verifying it"""
+    from app import schemas
+    from app.cruds import users as user_crud
+    from app.security import password_context, password_hasher
+    user = user_crud.create_user(
+        db_session,
+        schemas.UserCreate(email="rehash@example.com", name="Rehash", password="testpassword123"),
+        password_hash=password_context(5).hash("testpassword123")
+    )
+    
+    assert user_crud.authenticate_user(db_session, "rehash@example.com", "wrong-password") is None
+    assert user.password_hash.startswith("$2b$05$")
+    assert user_crud.authenticate_user(db_session, "rehash@example.com", "testpassword123") is not None
+    assert user.password_hash.startswith(f"$2b${password_hasher.rounds:02d}$")
+
+def test_calibrated_rounds_shared_between_workers(tmp_path, monkeypatch):
+    """Test the calibrated cost is computed once and reused from the shared file"""
+    from app import security
+    calls = []
+    monkeypatch.setattr(security, "calibrate_rounds", lambda *args: calls.append(args) or 11)
+    path = str(tmp_path / "rounds")
+    
+    assert security.load_calibrated_rounds(path, 0.25, 10, 16) == 11
+    assert security.load_calibrated_rounds(path, 0.25, 10, 16) == 11
+    assert len(calls) == 1
+    
+    security.load_calibrated_rounds(path, 0.5, 10, 16)
+    assert len(calls) == 2
+
+def test_calibrate_rounds_stays_within_bounds():
+    """Test calibration never leaves the configured cost range"""
+    from app.security import calibrate_rounds
+    assert calibrate_rounds(0.0, min_rounds=4, max_rounds=6) == 4
+    assert calibrate_rounds(3600.0, min_rounds=4, max_rounds=6) == 6
+
+def test_refresh_token_issues_new_access_token(client, test_user_data):
+    """Test the refresh endpoint exchanges a refresh token for new tokens"""
+    client.post("/auth/register", json=test_user_data)
+    login = client.post("/auth/login", json={
+        "email": test_user_data["email"],
+        "password": test_user_data["password"]
+    }).json()
+    assert login["refresh_token"]
+    assert login["expires_in"] > 0
+    
+    response = client.post("/auth/refresh", json={"refresh_token": login["refresh_token"]})
+    
+    assert response.status_code == status.HTTP_200_OK
+    tokens = response.json()
+    me = client.get("/auth/me", headers={"Authorization": f"Bearer {tokens['access_token']}"})
+    assert me.json()["email"] == test_user_data["email"]
+
+def test_token_types_are_not_interchangeable(client, test_user_data):
+    """Test refresh tokens are refused as access tokens and vice versa"""
+    client.post("/auth/register", json=test_user_data)
+    login = client.post("/auth/login", json={
+        "email": test_user_data["email"],
+        "password": test_user_data["password"]
+    }).json()
+    
+    response = client.get("/auth/me", headers={"Authorization": f"Bearer {login['refresh_token']}"})
+    assert response.status_code == status.HTTP_401_UNAUTHORIZED
+    response = client.post("/auth/refresh", json={"refresh_token": login["access_token"]})
+    assert response.status_code == status.HTTP_401_UNAUTHORIZED
+
+def test_logout_revokes_access_and_refresh_tokens(client, test_user_data):
+    """Test logging out ends every session of the user"""
+    client.post("/auth/register", json=test_user_data)
+    credentials = {"email": test_user_data["email"], "password": test_user_data["password"]}
+    first = client.post("/auth/login", json=credentials).json()
+    second = client.post("/auth/login", json=credentials).json()
+    
+    response = client.post("/auth/logout", headers={"Authorization": f"Bearer {first['access_token']}"})
+    assert response.status_code == status.HTTP_204_NO_CONTENT
+    
+    response = client.get("/tickets/my-tickets", headers={"Authorization": f"Bearer {second['access_token']}"})
+    assert response.status_code == status.HTTP_401_UNAUTHORIZED
+    response = client.post("/auth/refresh", json={"refresh_token": second["refresh_token"]})
+    assert response.status_code == status.HTTP_401_UNAUTHORIZED
+    
+    third = client.post("/auth/login", json=credentials).json()
+    response = client.get("/tickets/my-tickets", headers={"Authorization": f"Bearer {third['access_token']}"})
+    assert response.status_code == status.HTTP_200_OK
+
+def test_legacy_token_resolved_from_database(client, authenticated_user):
+    """Test tokens without the uid claim still authenticate"""
+    from datetime import timedelta
+    from app.security import create_access_token
+    token = create_access_token({"sub": authenticated_user["user_data"]["email"]}, timedelta(minutes=5))
+    
+    response = client.get("/tickets/my-tickets", headers={"Authorization": f"Bearer {token}"})
+    
+    assert response.status_code == status.HTTP_200_OK
+
+def test_revocation_set_follows_table_incrementally(db_session):
+    """Test revocations written by another worker are loaded and expire"""
+    from app.revocation import RevocationSet
+    now = [1_000_000.0]
+    writer = RevocationSet(retention=900, clock=lambda: now[0])
+    reader = RevocationSet(retention=900, clock=lambda: now[0])
+    
+    writer.record(db_session, 7, 1)
+    db_session.commit()
+    assert reader.refresh(db_session) == 1
+    assert reader.is_revoked(7, 0)
+    assert not reader.is_revoked(7, 1)
+    
+    writer.record(db_session, 8, 3)
+    db_session.commit()
+    assert reader.refresh(db_session) == 1
+    assert reader.is_revoked(8, 2)
+    assert len(reader) == 2
+    
+    now[0] += 901
+    reader.refresh(db_session)
+    assert len(reader) == 0
+    assert writer.purge(db_session) == 2
+
+def test_revocation_committed_behind_a_higher_id_is_loaded(db_session):
+    """Test a row whose transaction commits after one with a higher id still reaches other workers"""
+    from datetime import datetime, timezone
+    from app import models
+    from app.revocation import RevocationSet
+    now = [1_000_000.0]
+    reader = RevocationSet(retention=900, clock=lambda: now[0])
+    expires_at = datetime.fromtimestamp(now[0] + 900, timezone.utc)
+    
+    db_session.add(models.TokenRevocation(id=5, user_id=8, token_version=1, expires_at=expires_at))
+    db_session.commit()
+    assert reader.refresh(db_session) == 1
+    
+    now[0] += 5
+    db_session.add(models.TokenRevocation(id=4, user_id=7, token_version=1, expires_at=expires_at))
+    db_session.commit()
+    assert reader.refresh(db_session) == 1
+    assert reader.is_revoked(7, 0)
+    
+    now[0] += 120
+    assert reader.refresh(db_session) == 0
@@ -1,3 +1,6 @@
+import os
+import tempfile
+
 import pytest
 from fastapi import status
 
@@ -101,4 +104,539 @@ def test_list_events_pagination(client, authenticated_user, test_event_data):
     assert len(response.json()) == 3
     
     response = client.get("/events/?skip=3&limit=3")
-    assert len(response.json()) == 2
\ No newline at end of file
+    assert len(response.json()) == 2
+
+def test_list_events_cursor_pagination(client, authenticated_user, test_event_data):
+    """Test cursor pages walk events by date, unaffected by events added meanwhile"""
+    for day in (5, 3, 1, 4, 2):
+        event_data = {**test_event_data, "title": f"Day {day}", "event_date": f"2025-01-0{day}T20:00:00"}
+        client.post("/events/", json=event_data, headers=authenticated_user["headers"])
+    
+    titles = []
+    response = client.get("/events/?limit=2")
+    while True:
+        titles.extend(event["title"] for event in response.json())
+        if "x-next-cursor" not in response.headers:
+            break
+        assert 'rel="next"' in response.headers["link"]
+        if len(titles) == 2:
+            # An event before the cursor must not shift the following pages
+            early = {**test_event_data, "title": "Early", "event_date": "2024-06-01T20:00:00"}
+            client.post("/events/", json=early, headers=authenticated_user["headers"])
+        response = client.get(f"/events/?limit=2&cursor={response.headers['x-next-cursor']}")
+    
+    assert titles == ["Day 1", "Day 2", "Day 3", "Day 4", "Day 5"]
+
+def test_list_events_rejects_bad_cursor_and_large_pages(client):
+    """Test invalid cursors are a 400 and page sizes are capped"""
+    assert client.get("/events/?cursor=not-a-cursor").status_code == status.HTTP_400_BAD_REQUEST
+    assert client.get("/events/?limit=101").status_code == status.HTTP_422_UNPROCESSABLE_ENTITY
+
+def test_cursor_page_seeks_the_index(db_session):
+    """Test a cursor page is an index range scan rather than a scan of earlier pages"""
+    from datetime import datetime
+    from sqlalchemy import select, tuple_
+    from app import models
+    from app.cruds.events import EVENT_ORDER
+    query = (
+        select(models.Event)
+        .where(models.Event.is_active == True, tuple_(*EVENT_ORDER) > tuple_(datetime(2025, 1, 1), 10))
+        .order_by(*EVENT_ORDER)
+        .limit(100)
+    )
+    bind = db_session.get_bind()
+    sql = str(query.compile(bind, compile_kwargs={"literal_binds": True}))
+    plan = " ".join(row[-1] for row in db_session.connection().exec_driver_sql(f"EXPLAIN QUERY PLAN {sql}"))
+    
+    assert "SEARCH events USING INDEX ix_events_active_event_date" in plan
+    assert "TEMP B-TREE" not in plan
+
+def test_async_event_crud(async_session_factory, db_session, test_event_data):
+    """Test the async CRUD functions against the SQLite test database"""
+    import asyncio
+    from app import schemas
+    from app.cruds import events as event_crud
+    from app.cruds import users as user_crud
+    
+    async def run():
+        async with async_session_factory() as db:
+            user = await user_crud.create_user_async(
+                db,
+                schemas.UserCreate(email="organizer@example.com", name="Organizer", password="testpassword123"),
+                password_hash="not-a-real-hash"
+            )
+            event = await event_crud.create_event_async(db, schemas.EventCreate(**test_event_data), user.id)
+            updated = await event_crud.update_tickets_sold_async(db, event.id, 2)
+            return event.id, updated.tickets_sold, [e.id for e in await event_crud.get_events_async(db)]
+    
+    event_id, tickets_sold, listed = asyncio.run(run())
+    
+    assert tickets_sold == 2
+    assert listed == [event_id]
+    assert event_crud.get_event(db_session, event_id).tickets_sold == 2
+
+def test_event_list_rows_encode_like_the_schema(client, authenticated_user, test_event_data, db_session):
+    """Test list pages built from column rows are byte-for-byte what EventResponse gives"""
+    from typing import List
+    from pydantic import TypeAdapter
+    from app import models, schemas
+    for price in ("5000.50", "0"):
+        client.post("/events/", json={**test_event_data, "price": price}, headers=authenticated_user["headers"])
+    events = db_session.query(models.Event).order_by(models.Event.event_date, models.Event.id).all()
+    adapter = TypeAdapter(List[schemas.EventResponse])
+    
+    assert client.get("/events/").content == adapter.dump_json(adapter.validate_python(events))
+    assert client.get("/events/search?q=test").content == adapter.dump_json(adapter.validate_python(events))
+
+def test_async_database_url():
+    """Test sync database URLs map to their asyncio drivers"""
+    from app.database import async_database_url
+    assert async_database_url("sqlite:///./app.db") == "sqlite+aiosqlite:///./app.db"
+    assert async_database_url("postgresql://u:p@db:5432/app?sslmode=require") == (
+        "postgresql+asyncpg://u:p@db:5432/app?ssl=require"
+    )
+
+def add_replica_event(replica, title="Replica Event"):
+    from datetime import datetime
+    from app import models
+    event = models.Event(
+        title=title, description="Only on the replica", location="Replica", price=5000, capacity=100,
+        event_date=datetime(2024, 12, 31, 20), organizer_id=1
+    )
+    replica.add(event)
+    replica.commit()
+    return event.id
+
+def test_reads_go_to_replica(replica, client):
+    """Test the public read endpoints are served by a caught-up replica"""
+    event_id = add_replica_event(replica)
+    
+    response = client.get("/events/")
+    assert [event["title"] for event in response.json()] == ["Replica Event"]
+    assert client.get(f"/events/{event_id}").json()["title"] == "Replica Event"
+    assert client.get("/health").json()["replica_lag_seconds"] == {"replica0": 0.0}
+
+def test_reads_follow_own_writes(replica, client, authenticated_user, test_event_data):
+    """Test a caller who just wrote reads from the primary while others use the replica"""
+    from app.replicas import read_your_writes
+    add_replica_event(replica)
+    read_your_writes.clear()  # forget registration and login, made before the token existed
+    
+    client.post("/events/", json=test_event_data, headers=authenticated_user["headers"])
+    
+    own = client.get("/events/", headers=authenticated_user["headers"]).json()
+    assert [event["title"] for event in own] == [test_event_data["title"]]
+    anonymous = client.get("/events/").json()
+    assert [event["title"] for event in anonymous] == ["Replica Event"]
+
+def test_lagging_replica_falls_back_to_primary(replica, client, monkeypatch):
+    """Test reads use the primary when the replica is too far behind or unreachable"""
+    from app.database import replicas
+    add_replica_event(replica)
+    
+    monkeypatch.setitem(replicas.lag, "replica0", replicas.max_lag + 1)
+    assert client.get("/events/").json() == []
+    monkeypatch.setitem(replicas.lag, "replica0", None)
+    assert client.get("/events/").json() == []
+
+def test_event_reads_revalidate_with_etag(client, authenticated_user, test_event_data):
+    """Test cached event reads carry an ETag and answer a matching If-None-Match with 304"""
+    event_id = client.post("/events/", json=test_event_data, headers=authenticated_user["headers"]).json()["id"]
+    
+    for url in ("/events/", f"/events/{event_id}"):
+        response = client.get(url)
+        etag = response.headers["etag"]
+        revalidated = client.get(url, headers={"If-None-Match": f'"stale", W/{etag}'})
+        assert revalidated.status_code == status.HTTP_304_NOT_MODIFIED
+        assert revalidated.content == b""
+        assert revalidated.headers["etag"] == etag
+        assert client.get(url, headers={"If-None-Match": '"stale"'}).json() == response.json()
+
+def test_event_cache_invalidated_by_event_writes(client, authenticated_user, test_event_data, db_session):
+    """Test event reads are served from the cache until the event cruds write"""
+    from app import models
+    from app.cruds.events import update_tickets_sold
+    from app.replicas import read_your_writes
+    event_id = client.post("/events/", json=test_event_data, headers=authenticated_user["headers"]).json()["id"]
+    read_your_writes.clear()  # callers who wrote recently skip the cache
+    before = client.get(f"/events/{event_id}")
+    
+    db_session.query(models.Event).filter_by(id=event_id).update({"title": "Renamed Event"})
+    db_session.commit()
+    assert client.get(f"/events/{event_id}").json()["title"] == test_event_data["title"]
+    
+    update_tickets_sold(db_session, event_id)
+    after = client.get(f"/events/{event_id}")
+    assert after.json()["title"] == "Renamed Event"
+    assert after.json()["tickets_sold"] == 1
+    assert after.headers["etag"] != before.headers["etag"]
+    assert client.get(f"/events/{event_id}", headers={"If-None-Match": before.headers["etag"]}).status_code == 200
+
+def test_event_cache_coalesces_concurrent_misses():
+    """Test concurrent misses share one load and a load overtaken by a write is not kept"""
+    import asyncio
+    from app.cache import CachedResponse, ResponseCache
+    cache = ResponseCache()
+    loads = []
+    
+    async def load():
+        loads.append(cache.epoch)
+        await asyncio.sleep(0.01)
+        return CachedResponse.from_body(b"[]")
+    
+    async def failing_load():
+        await asyncio.sleep(0.01)
+        raise ValueError("database down")
+    
+    async def run():
+        first = await asyncio.gather(*(cache.get_or_load("/events/", load) for _ in range(10)))
+        failed = await asyncio.gather(*(cache.get_or_load("/other", failing_load) for _ in range(3)),
+                                      return_exceptions=True)
+        pending = asyncio.ensure_future(cache.get_or_load("/events/?limit=1", load))
+        await asyncio.sleep(0)
+        cache.invalidate()
+        await pending
+        await cache.get_or_load("/events/?limit=1", load)
+        return first, failed
+    
+    first, failed = asyncio.run(run())
+    
+    assert len({response.etag for response in first}) == 1
+    assert (cache.misses, cache.coalesced) == (4, 11)
+    assert all(isinstance(result, ValueError) for result in failed)
+    assert loads == [0, 0, 1]
+
+@pytest.fixture
+def sharded_inventory(monkeypatch):
+    """Count sales on four inventory shards per event"""
+    from app.config import settings
+    monkeypatch.setattr(settings, "inventory_shards", 4)
+
+def test_sharded_sales_leave_the_event_row_alone(client, authenticated_user, test_event_data, db_session, sharded_inventory):
+    """Test sharded sales are counted on shard rows, reported in tickets_sold, and overflow to the event row"""
+    from app import models
+    from app.cruds.events import update_tickets_sold
+    event_id = client.post("/events/", json={**test_event_data, "capacity": 10}, headers=authenticated_user["headers"]).json()["id"]
+    
+    for _ in range(10):
+        update_tickets_sold(db_session, event_id)
+    shards = db_session.query(models.EventInventoryShard).filter_by(event_id=event_id).all()
+    assert len(shards) == 4
+    assert all(shard.sold == shard.allotment for shard in shards)
+    assert sum(shard.sold for shard in shards) == 10
+    assert db_session.get(models.Event, event_id).tickets_sold == 0
+    assert client.get(f"/events/{event_id}").json()["tickets_sold"] == 10
+    assert client.get("/events/").json()[0]["tickets_sold"] == 10
+    
+    assert update_tickets_sold(db_session, event_id).tickets_sold_total == 11
+    assert db_session.get(models.Event, event_id).tickets_sold == 1
+
+def test_dry_shard_is_refilled_from_the_others(client, authenticated_user, test_event_data, db_session,
+                                               sharded_inventory, monkeypatch):
+    """Test sales that keep hitting one shard rebalance the others' allotment into it"""
+    from app import models
+    from app.cruds import inventory
+    from app.cruds.events import update_tickets_sold
+    monkeypatch.setattr(inventory, "pick_shard", lambda shards: 0)
+    event_id = client.post("/events/", json={**test_event_data, "capacity": 8}, headers=authenticated_user["headers"]).json()["id"]
+    
+    for _ in range(6):
+        update_tickets_sold(db_session, event_id)
+    shards = db_session.query(models.EventInventoryShard).filter_by(event_id=event_id).order_by(models.EventInventoryShard.shard).all()
+    
+    assert shards[0].sold == 6
+    assert sum(shard.allotment - shard.sold for shard in shards) == 2
+    assert db_session.get(models.Event, event_id).tickets_sold == 0
+
+def test_sharded_sales_async(async_session_factory, db_session, test_event_data, sharded_inventory):
+    """Test the async sale path counts on shards too"""
+    import asyncio
+    from app import models, schemas
+    from app.cruds import events as event_crud
+    db_session.add(models.User(id=1, email="organizer@example.com", name="Organizer", password_hash="x"))
+    db_session.commit()
+    
+    async def run():
+        async with async_session_factory() as db:
+            event = await event_crud.create_event_async(db, schemas.EventCreate(**test_event_data), 1)
+            await event_crud.update_tickets_sold_async(db, event.id, 2)
+            updated = await event_crud.update_tickets_sold_async(db, event.id)
+            return updated.tickets_sold, updated.tickets_sold_total
+    
+    assert asyncio.run(run()) == (0, 3)
+
+@pytest.fixture
+def search_catalog(client, authenticated_user, db_session, test_event_data):
+    """A few events across categories, dates, prices and places"""
+    from app import models
+    music, sports = models.Category(name="Music"), models.Category(name="Sports")
+    db_session.add_all([music, sports])
+    db_session.commit()
+    for title, description, location, date, price, category in (
+        ("Jazz Night", "Live jazz concerts by the lagoon", "Lagos", "2025-03-01T20:00:00", 5000, music),
+        ("Afrobeats Festival", "Three stages of afrobeats", "Lagos", "2025-04-01T18:00:00", 15000, music),
+        ("City Marathon", "Annual road race", "Abuja", "2025-05-01T06:00:00", 2000, sports),
+        ("Jazz Brunch", "Smooth jazz with brunch", "Abuja", "2025-06-01T11:00:00", 8000, music),
+    ):
+        client.post("/events/", json={
+            **test_event_data, "title": title, "description": description, "location": location,
+            "event_date": date, "price": price, "category_id": category.id
+        }, headers=authenticated_user["headers"])
+    return {"music": music.id, "sports": sports.id}
+
+def search_titles(client, query: str):
+    response = client.get(f"/events/search?{query}")
+    assert response.status_code == status.HTTP_200_OK
+    return [event["title"] for event in response.json()]
+
+def test_search_events_full_text(client, search_catalog):
+    """Test text search matches every word, stems, and treats the last word as a prefix"""
+    assert search_titles(client, "q=jazz") == ["Jazz Night", "Jazz Brunch"]
+    assert search_titles(client, "q=jazz abuja") == ["Jazz Brunch"]
+    assert search_titles(client, "q=concert") == ["Jazz Night"]
+    assert search_titles(client, "q=afrob") == ["Afrobeats Festival"]
+    assert search_titles(client, "q=opera") == []
+    # Punctuation is not search syntax
+    assert search_titles(client, 'q="jazz*" (') == ["Jazz Night", "Jazz Brunch"]
+
+def test_search_events_filters(client, search_catalog):
+    """Test category, date and price filters, alone and combined with text"""
+    assert search_titles(client, f"category_id={search_catalog['sports']}") == ["City Marathon"]
+    assert search_titles(client, "date_from=2025-04-01T00:00:00&date_to=2025-05-31T00:00:00") == [
+        "Afrobeats Festival", "City Marathon"
+    ]
+    assert search_titles(client, "min_price=5000&max_price=8000") == ["Jazz Night", "Jazz Brunch"]
+    assert search_titles(client, f"q=jazz&category_id={search_catalog['music']}&max_price=6000") == ["Jazz Night"]
+
+def test_search_events_pages_and_follows_edits(client, search_catalog, db_session):
+    """Test search results page by cursor and reflect edited event text"""
+    from app import models
+    response = client.get("/events/search?q=jazz&limit=1")
+    assert [event["title"] for event in response.json()] == ["Jazz Night"]
+    next_page = client.get(f"/events/search?q=jazz&limit=1&cursor={response.headers['x-next-cursor']}")
+    assert [event["title"] for event in next_page.json()] == ["Jazz Brunch"]
+    assert "x-next-cursor" not in next_page.headers
+    
+    event = db_session.query(models.Event).filter_by(title="City Marathon").one()
+    event.description = "Annual road race with a jazz band at the finish"
+    db_session.commit()
+    assert search_titles(client, "q=jazz") == ["Jazz Night", "City Marathon", "Jazz Brunch"]
+
+def test_search_filters_use_indexes(db_session):
+    """Test text and category searches read the FTS table and the category index"""
+    from sqlalchemy import select
+    from app import models
+    from app.cruds.events import EVENT_ORDER, event_filters
+    
+    def plan(**filters):
+        query = select(models.Event).where(*event_filters("sqlite", **filters)).order_by(*EVENT_ORDER).limit(100)
+        compiled = query.compile(db_session.get_bind())
+        rows = db_session.connection().exec_driver_sql(f"EXPLAIN QUERY PLAN {compiled}", tuple(compiled.params.values()))
+        return " ".join(row[-1] for row in rows)
+    
+    assert "VIRTUAL TABLE INDEX" in plan(query="jazz")
+    assert "ix_events_active_category_date" in plan(category_id=1)
+
+def test_export_attendees_csv_and_ndjson(client, authenticated_user, test_event_data, db_session):
+    """Test organizers download each ticket with its holder and payment as CSV or NDJSON"""
+    import csv
+    import io
+    import json
+    from datetime import datetime
+    from app import models
+    event_id = client.post("/events/", json=test_event_data, headers=authenticated_user["headers"]).json()["id"]
+    paid, unpaid = (models.User(email=f"{name}@example.com", name=name.title(), password_hash="x") for name in ("ada", "bola"))
+    unpaid.name, unpaid.phone = "=HYPERLINK(\"http://evil.example\")", "+2348000000000"
+    db_session.add_all([paid, unpaid])
+    db_session.flush()
+    ticket = models.Ticket(user_id=paid.id, event_id=event_id, ticket_code="TKT-PAID", amount_paid=5000, status="active")
+    db_session.add_all([ticket, models.Ticket(user_id=unpaid.id, event_id=event_id, ticket_code="TKT-COMP",
+                                              amount_paid=0, status="active", seat_number="A1")])
+    db_session.flush()
+    db_session.add(models.Payment(user_id=paid.id, event_id=event_id, ticket_id=ticket.id, paystack_reference="ref-1",
+                                  amount=5000, status="success", paid_at=datetime(2024, 12, 1, 9)))
+    db_session.commit()
+    
+    response = client.get(f"/events/{event_id}/attendees", headers=authenticated_user["headers"])
+    assert response.headers["content-type"] == "text/csv; charset=utf-8"
+    assert response.headers["content-disposition"] == f'attachment; filename="event-{event_id}-attendees.csv"'
+    rows = list(csv.DictReader(io.StringIO(response.text)))
+    assert [(row["ticket_code"], row["email"], row["payment_reference"], row["seat_number"]) for row in rows] == [
+        ("TKT-PAID", "ada@example.com", "ref-1", ""), ("TKT-COMP", "bola@example.com", "", "A1")
+    ]
+    assert rows[0]["amount_paid"] == "5000.00"
+    assert rows[0]["paid_at"] == "2024-12-01T09:00:00"
+    # Attendee-typed text never reaches the spreadsheet as a formula
+    assert (rows[1]["name"], rows[1]["phone"]) == ("'=HYPERLINK(\"http://evil.example\")", "'+2348000000000")
+    
+    response = client.get(f"/events/{event_id}/attendees?format=ndjson", headers=authenticated_user["headers"])
+    lines = [json.loads(line) for line in response.text.splitlines()]
+    assert [(line["name"], line["payment_status"]) for line in lines] == [
+        ("Ada", "success"), ("=HYPERLINK(\"http://evil.example\")", None)
+    ]
+
+def test_export_attendees_is_for_the_organizer_only(client, authenticated_user, test_event_data):
+    """Test other users cannot export an event's attendees"""
+    event_id = client.post("/events/", json=test_event_data, headers=authenticated_user["headers"]).json()["id"]
+    other = {"email": "other@example.com", "name": "Other User", "password": "testpassword123"}
+    client.post("/auth/register", json=other)
+    token = client.post("/auth/login", json={"email": other["email"], "password": other["password"]}).json()["access_token"]
+    
+    response = client.get(f"/events/{event_id}/attendees", headers={"Authorization": f"Bearer {token}"})
+    assert response.status_code == status.HTTP_403_FORBIDDEN
+    response = client.get("/events/99999/attendees", headers=authenticated_user["headers"])
+    assert response.status_code == status.HTTP_404_NOT_FOUND
+    assert client.get(f"/events/{event_id}/attendees").status_code == status.HTTP_403_FORBIDDEN
+
+EXPORT_RSS_SCRIPT = """
+import asyncio, os, resource, sys
+from datetime import timedelta
+from app.database import async_engine, create_tables, engine
+from app.main import app
+from app.security import create_access_token, token_claims
+from app import schemas
+
+tickets = int(sys.argv[1])
+create_tables()
+with engine.begin() as conn:
+    conn.exec_driver_sql("INSERT INTO users (id, email, name, password_hash, is_active, token_version) "
+                         "VALUES (1, 'organizer@example.com', 'Organizer', 'x', 1, 0)")
+    conn.exec_driver_sql("INSERT INTO events (id, title, event_date, location, price, capacity, organizer_id, is_active) "
+                         "VALUES (1, 'Stadium Show', '2025-06-01 20:00:00', 'Lagos', 5000, ?, 1, 1), "
+                         "(2, 'Warm Up', '2025-06-01 18:00:00', 'Lagos', 0, 1, 1, 1)", (tickets,))
+    conn.exec_driver_sql("WITH RECURSIVE n(i) AS (SELECT 2 UNION ALL SELECT i + 1 FROM n WHERE i < 1001) "
+                         "INSERT INTO users (id, email, name, password_hash, phone) "
+                         "SELECT i, 'fan' || i || '@example.com', 'Fan ' || i, 'x', '+234800' || i FROM n")
+    conn.exec_driver_sql("WITH RECURSIVE n(i) AS (SELECT 1 UNION ALL SELECT i + 1 FROM n WHERE i < ?) "
+                         "INSERT INTO tickets (user_id, event_id, ticket_code, status, seat_number, amount_paid, purchase_date) "
+                         "SELECT 2 + i % 1000, 1, 'TKT-' || i, 'active', 'S' || i, 5000, '2025-05-01 10:00:00' FROM n",
+                         (tickets,))
+    conn.exec_driver_sql("INSERT INTO payments (user_id, event_id, ticket_id, paystack_reference, amount, status) "
+                         "SELECT user_id, 1, id, 'ref-' || id, 5000, 'success' FROM tickets")
+organizer = schemas.AuthenticatedUser(id=1, email="organizer@example.com", is_active=True, token_version=0)
+token = create_access_token(token_claims(organizer), expires_delta=timedelta(minutes=5))
+
+async def export(query, event_id=1):
+    body = [0, None, 0]
+    path = f"/events/{event_id}/attendees"
+    scope = {
+        "type": "http", "asgi": {"version": "3.0"}, "http_version": "1.1", "method": "GET", "scheme": "http",
+        "path": path, "raw_path": path.encode(), "root_path": "", "query_string": query,
+        "headers": [(b"host", b"test"), (b"authorization", f"Bearer {token}".encode())],
+        "client": ("127.0.0.1", 5000), "server": ("test", 80),
+    }
+    requested = False
+    async def receive():
+        nonlocal requested
+        if not requested:
+            requested = True
+            return {"type": "http.request", "body": b"", "more_body": False}
+        await asyncio.Event().wait()
+    async def send(message):
+        if message["type"] == "http.response.start":
+            body[1] = message["status"]
+        elif message["type"] == "http.response.body":
+            body[0] += len(message.get("body", b""))
+            body[2] += 1
+    await app(scope, receive, send)
+    return body
+
+async def main():
+    await export(b"format=csv", event_id=2)  # warm up imports and pools on an event without tickets
+    baseline = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    for query in (b"format=csv", b"format=ndjson"):
+        size, status, chunks = await export(query)
+        peak = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+        print(query.decode(), status, size, chunks, baseline * 1024, peak * 1024)
+    await async_engine.dispose()
+
+asyncio.run(main())
+"""
+
+def export_attendees(tickets: int) -> list:
+    """Run EXPORT_RSS_SCRIPT on a fresh database; per format its status, size, body chunks and RSS before and after"""
+    import subprocess
+    import sys
+    env = {
+        **os.environ, "DATABASE_URL": f"sqlite:///{os.path.join(tempfile.mkdtemp(), 'export.db')}",
+        "ACCESS_LOG_ENABLED": "false", "JWT_SECRET_KEY": os.environ.get("JWT_SECRET_KEY", "export-test-secret"),
+    }
+    result = subprocess.run([sys.executable, "-c", EXPORT_RSS_SCRIPT, str(tickets)], capture_output=True, text=True,
+                            env=env, check=True)
+    return [line.split() for line in result.stdout.strip().splitlines()[-2:]]
+
+def test_export_attendees_streams_in_batches():
+    """Test an export goes out a batch of tickets at a time rather than as one body"""
+    for fmt, status_code, size, chunks, _, _ in export_attendees(5_000):
+        assert status_code == "200"
+        assert int(chunks) > 5, fmt
+
+@pytest.mark.slow
+def test_export_attendees_memory_stays_flat():
+    """Test exporting 1M tickets streams: peak RSS grows far less than the export's size"""
+    for fmt, status_code, size, _, baseline, peak in export_attendees(1_000_000):
+        assert status_code == "200"
+        assert int(size) > 100_000_000, fmt
+        assert int(peak) - int(baseline) < 50_000_000, f"{fmt}: peak RSS grew {(int(peak) - int(baseline)) / 1e6:.0f} MB"
+
+def test_seat_search_on_bitsets():
+    """Test seat blocks are found front row first, nearest the middle, and never across rows"""
+    from app.seating import EventSeats, SeatMap, block_starts
+    
+    assert block_starts(0b0111011, 3) == 0b0001000
+    seats = EventSeats(SeatMap([("A", [("1", 3), ("2", 3)]), ("B", [("1", 8)])]), taken=["A-1-3", "A-2-1"])
+    
+    assert seats.best_available(2) == ["A-1-1", "A-1-2"]
+    assert seats.best_available(3) == ["B-1-3", "B-1-4", "B-1-5"]
+    assert seats.best_available(3, section="A") is None
+    assert seats.best_available(1, section="C") is None
+    assert seats.available() == 12
+    # Seats counted row after row: A-1-3 and A-2-1 are seats 2 and 3
+    assert seats.snapshot()[0] == {
+        "name": "A", "rows": [{"label": "1", "seats": 3}, {"label": "2", "seats": 3}], "taken": "DA=="
+    }
+
+@pytest.fixture
+def seated_event(client, authenticated_user, test_event_data):
+    """An event at a venue with two sections"""
+    venue = client.post("/venues/", json={"name": "Eko Hall", "sections": [
+        {"name": "A", "rows": [{"label": "1", "seats": 10}, {"label": "2", "seats": 10}]},
+        {"name": "B", "rows": [{"label": "1", "seats": 4}]},
+    ]}, headers=authenticated_user["headers"])
+    assert venue.status_code == status.HTTP_201_CREATED
+    response = client.post(
+        "/events/",
+        json={**test_event_data, "venue_id": venue.json()["id"]},
+        headers=authenticated_user["headers"]
+    )
+    return response.json()
+
+def test_hold_best_seats(client, authenticated_user, seated_event, db_session):
+    """Test holds get the best free adjacent seats and availability shows them taken"""
+    from app import models
+    
+    def hold(count, **body):
+        return client.post(
+            f"/events/{seated_event['id']}/seats/hold",
+            json={"count": count, **body},
+            headers=authenticated_user["headers"]
+        )
+    
+    assert hold(2).json()["seats"] == ["A-1-5", "A-1-6"]
+    assert hold(2).json()["seats"] == ["A-1-3", "A-1-4"]
+    assert hold(4, section="B").json()["seats"] == ["B-1-1", "B-1-2", "B-1-3", "B-1-4"]
+    response = hold(1, section="B")
+    assert response.status_code == status.HTTP_409_CONFLICT
+    
+    seats = client.get(f"/events/{seated_event['id']}/seats").json()
+    assert seats["available"] == 16
+    assert [section["name"] for section in seats["sections"]] == ["A", "B"]
+    assert db_session.query(models.EventSeat).count() == 8
+
+def test_seats_of_unseated_event(client, authenticated_user, test_event_data):
+    """Test events without a venue have no seats to show or hold, and unknown venues are refused"""
+    event = client.post("/events/", json=test_event_data, headers=authenticated_user["headers"]).json()
+    
+    assert client.get(f"/events/{event['id']}/seats").status_code == status.HTTP_404_NOT_FOUND
+    response = client.post("/events/", json={**test_event_data, "venue_id": 999}, headers=authenticated_user["headers"])
+    assert response.status_code == status.HTTP_404_NOT_FOUND
@@ -0,0 +1,165 @@
+import pytest
+from fastapi import status
+from app.metrics import Histogram, Metrics, SnapshotStore, merge, render
+
+def test_histogram_buckets():
+    """Test observations land in the first bucket that fits"""
+    histogram = Histogram((0.1, 1.0))
+    for value in (0.05, 0.1, 0.5, 3.0):
+        histogram.observe(value)
+    
+    assert histogram.counts == [2, 1, 1]
+    assert histogram.sum == pytest.approx(3.65)
+
+def test_render_prometheus_text():
+    """Test histograms are rendered cumulatively with route labels"""
+    metrics = Metrics(buckets=(0.1, 1.0))
+    metrics.observe_request("GET", "/events/{event_id}", 200, 0.05)
+    metrics.observe_request("GET", "/events/{event_id}", 404, 0.5)
+    metrics.observe_request("GET", None, 404, 0.01)
+    
+    text = render(merge([metrics.snapshot()]))
+    
+    assert '# TYPE http_request_duration_seconds histogram' in text
+    assert 'http_request_duration_seconds_bucket{method="GET",route="/events/{event_id}",le="0.1"} 1' in text
+    assert 'http_request_duration_seconds_bucket{method="GET",route="/events/{event_id}",le="+Inf"} 2' in text
+    assert 'http_request_duration_seconds_count{method="GET",route="/events/{event_id}"} 2' in text
+    assert 'http_responses_total{method="GET",route="/events/{event_id}",status="404"} 1' in text
+    assert 'route="<unmatched>"' in text
+
+def test_merge_sums_workers():
+    """Test snapshots from several workers are summed"""
+    worker_a, worker_b = Metrics(), Metrics()
+    worker_a.observe_request("GET", "/health", 200, 0.001)
+    worker_b.observe_request("GET", "/health", 200, 0.002)
+    worker_b.in_flight = 3
+    
+    text = render(merge([worker_a.snapshot(), worker_b.snapshot()]))
+    
+    assert 'http_responses_total{method="GET",route="/health",status="200"} 2' in text
+    assert 'http_requests_in_flight 3' in text
+
+def test_snapshot_store_aggregates(tmp_path):
+    """Test worker snapshot files are read back for aggregation"""
+    store = SnapshotStore(str(tmp_path))
+    metrics = Metrics()
+    metrics.observe_request("POST", "/auth/login", 401, 0.2)
+    store.write(metrics.snapshot())
+    
+    snapshots = store.read_all()
+    
+    assert len(snapshots) == 1
+    assert 'status="401"} 1' in render(merge(snapshots))
+
+def test_metrics_endpoint(client, authenticated_user):
+    """Test /metrics exposes per-route latency and threadpool wait"""
+    client.get("/events/")
+    client.get("/auth/me", headers=authenticated_user["headers"])
+    
+    response = client.get("/metrics")
+    
+    assert response.status_code == status.HTTP_200_OK
+    assert response.headers["content-type"].startswith("text/plain")
+    text = response.text
+    assert 'route="/events/"' in text
+    assert 'http_responses_total{method="GET",route="/auth/me",status="200"}' in text
+    assert "threadpool_queue_wait_seconds_count" in text
+    assert "access_log_records_dropped_total" in text
+    assert 'db_pool_connections_max{pool="async"}' in text
+    assert 'db_pool_checkout_wait_seconds_count{pool="sync"}' in text
+    assert 'db_statements_total{method="GET",route="/auth/me"}' in text
+    assert 'db_request_time_seconds_count{method="GET",route="/events/"}' in text
+
+def test_threadpool_wait_is_measured_on_sync_routes_only(client, authenticated_user):
+    """Test async routes stay off the threadpool and sync routes record their wait for it"""
+    from app.metrics import metrics
+    
+    def waits():
+        return sum(metrics.snapshot()["histograms"]["threadpool_queue_wait_seconds"][0][1])
+    
+    metrics.reset()
+    client.get("/health")
+    client.get("/events/")
+    assert waits() == 0
+    
+    client.get("/payments/verify/TXN-UNKNOWN", headers=authenticated_user["headers"])
+    assert waits() == 1
+    client.get("/")
+    assert waits() == 2
+
+def test_pool_limits_fit_connection_budget():
+    """Test pools are capped so every worker's engines fit max_connections"""
+    from app.db_pool import pool_limits
+    assert pool_limits(100, 10, workers=4, engines=2, pool_size=5, max_overflow=10) == (5, 6)
+    assert pool_limits(100, 10, workers=16, engines=2, pool_size=5, max_overflow=10) == (2, 0)
+    assert pool_limits(500, 0, workers=2, engines=2, pool_size=5, max_overflow=10) == (5, 10)
+
+def test_pool_records_waits_and_timeouts(tmp_path):
+    """Test the instrumented pool counts checkout waits and timeouts"""
+    import pytest
+    from sqlalchemy import create_engine
+    from sqlalchemy.exc import TimeoutError as PoolTimeoutError
+    from app.db_pool import attach_stats, engine_options, pool_status
+    url = f"sqlite:///{tmp_path / 'pool.db'}"
+    engine = create_engine(url, **engine_options(url, pool_size=1, max_overflow=0, pool_timeout=0.05))
+    stats = attach_stats(engine, "test")
+    
+    held = engine.connect()
+    assert pool_status(engine)["saturation"] == 1.0
+    with pytest.raises(PoolTimeoutError):
+        engine.connect()
+    held.close()
+    engine.dispose()
+    
+    assert stats.timeouts == 1
+    assert sum(stats.wait.counts) == 2
+    assert engine.pool.stats is stats
+
+def test_health_reports_pools(client):
+    """Test /health includes the occupancy of both database pools"""
+    data = client.get("/health").json()
+    
+    assert data["status"] == "healthy"
+    assert set(data["pools"]) == {"sync", "async"}
+    assert data["pools"]["sync"]["saturation"] < 1
+
+def test_db_stats_header_counts_request_statements(client, sql_statements):
+    """Test debug mode reports the request's SQL statements in a header"""
+    sql_statements.clear()
+    response = client.get("/events/")
+    
+    stats = dict(part.split("=") for part in response.headers["x-db-stats"].split("; "))
+    assert int(stats["count"]) == len(sql_statements) >= 1
+    assert float(stats["time_ms"]) >= float(stats["slowest_ms"]) > 0
+    assert stats["repeated"] == "0"
+
+def test_repeated_statements_flagged_as_n_plus_one(db_session, caplog):
+    """Test a statement repeated within one request is reported once as a possible N+1"""
+    from app import models
+    from app.query_stats import QueryLog
+    query_log = QueryLog(repeat_threshold=3)
+    queries, token = query_log.begin()
+    for event_id in range(5):
+        db_session.get(models.Event, event_id + 1)
+    
+    with caplog.at_level("WARNING", logger="app.query_stats"):
+        query_log.finish("GET", "/events/{event_id}", queries, token)
+    
+    assert queries.count == 5
+    assert query_log.statements == {("GET", "/events/{event_id}"): 5}
+    assert query_log.repeats == {("GET", "/events/{event_id}"): 1}
+    assert "Possible N+1 in GET /events/{event_id}: 5 statements, 5x SELECT" in caplog.text
+
+def test_slow_query_log_redacts_parameters(client, test_user_data, monkeypatch, caplog):
+    """Test slow statements are logged without their parameter values"""
+    from app.query_stats import query_log
+    monkeypatch.setattr(query_log, "slow_threshold", 0.0)
+    slow_before = query_log.slow
+    
+    with caplog.at_level("WARNING", logger="app.query_stats"):
+        client.post("/auth/login", json={"email": test_user_data["email"], "password": "wrong-password"})
+    
+    assert "Slow query" in caplog.text and "users.email" in caplog.text
+    assert "'str'" in caplog.text
+    assert test_user_data["email"] not in caplog.text
+    assert query_log.slow > slow_before
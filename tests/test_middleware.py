@@ -0,0 +1,286 @@
+import io
+import json
+import pytest
+from fastapi import status
+from app.access_log import AccessLog
+from app.rate_limit import SlidingWindowLimiter, SharedSlidingWindowLimiter, create_limiter
+
+
+class FakeClock:
+    def __init__(self, now: float = 1000.0):
+        self.now = now
+
+    def __call__(self):
+        return self.now
+
+
+def test_limiter_allows_up_to_limit():
+    """Test limiter rejects requests past the budget"""
+    limiter = SlidingWindowLimiter(max_requests=3, window_seconds=60, clock=FakeClock(1200.0))
+    
+    results = [limiter.hit("1.2.3.4")[0] for _ in range(4)]
+    
+    assert results == [True, True, True, False]
+
+def test_limiter_keys_are_independent():
+    """Test one client's traffic does not consume another's budget"""
+    limiter = SlidingWindowLimiter(max_requests=1, window_seconds=60, clock=FakeClock(1200.0))
+    
+    assert limiter.hit("a")[0] is True
+    assert limiter.hit("a")[0] is False
+    assert limiter.hit("b")[0] is True
+
+def test_limiter_previous_window_is_weighted():
+    """Test previous window hits decay as the sliding window moves on"""
+    clock = FakeClock(1200.0)
+    limiter = SlidingWindowLimiter(max_requests=10, window_seconds=60, clock=clock)
+    for _ in range(10):
+        limiter.hit("a")
+    
+    # Half way into the next window only half of the old hits still count
+    clock.now = 1290.0
+    allowed = [limiter.hit("a")[0] for _ in range(6)]
+    
+    assert allowed == [True, True, True, True, True, False]
+
+def test_limiter_retry_after():
+    """Test rejected hits report when to retry"""
+    clock = FakeClock(1200.0)
+    limiter = SlidingWindowLimiter(max_requests=1, window_seconds=60, clock=clock)
+    limiter.hit("a")
+    
+    allowed, retry_after = limiter.hit("a")
+    
+    assert allowed is False
+    assert 0 < retry_after <= 60
+
+def test_limiter_caps_memory():
+    """Test least recently seen clients are evicted at the key cap"""
+    limiter = SlidingWindowLimiter(max_requests=5, window_seconds=60, max_keys=3, clock=FakeClock())
+    for key in ["a", "b", "c", "d"]:
+        limiter.hit(key)
+    
+    assert len(limiter) == 3
+
+def test_limiter_sweeps_idle_keys():
+    """Test expired clients are dropped lazily by later hits"""
+    clock = FakeClock(1200.0)
+    limiter = SlidingWindowLimiter(max_requests=5, window_seconds=60, sweep_batch=2, clock=clock)
+    for key in ["a", "b", "c"]:
+        limiter.hit(key)
+    
+    clock.now = 1500.0
+    limiter.hit("d")
+    
+    assert len(limiter) == 2
+    limiter.hit("d")
+    assert len(limiter) == 1
+
+def test_shared_limiter_shares_budget_between_instances(tmp_path):
+    """Test limiters opened on the same file enforce one global budget"""
+    path = str(tmp_path / "rate_limit.bin")
+    clock = FakeClock(1200.0)
+    worker_a = SharedSlidingWindowLimiter(path, max_requests=3, window_seconds=60, clock=clock)
+    worker_b = SharedSlidingWindowLimiter(path, max_requests=3, window_seconds=60, clock=clock)
+    
+    results = [worker.hit("1.2.3.4")[0] for worker in (worker_a, worker_b, worker_a, worker_b)]
+    
+    assert results == [True, True, True, False]
+    worker_b.reset("1.2.3.4")
+    assert worker_a.hit("1.2.3.4")[0] is True
+
+def test_shared_limiter_previous_window_is_weighted(tmp_path):
+    """Test the shared backend rolls windows like the in-memory one"""
+    clock = FakeClock(1200.0)
+    limiter = SharedSlidingWindowLimiter(str(tmp_path / "rl.bin"), max_requests=10, window_seconds=60, clock=clock)
+    for _ in range(10):
+        limiter.hit("a")
+    
+    clock.now = 1290.0
+    allowed = [limiter.hit("a")[0] for _ in range(6)]
+    
+    assert allowed == [True, True, True, True, True, False]
+
+def test_create_limiter_backends(tmp_path):
+    """Test the backend factory"""
+    assert isinstance(create_limiter("memory", 10, 60), SlidingWindowLimiter)
+    assert isinstance(
+        create_limiter("shared", 10, 60, storage_path=str(tmp_path / "rl.bin")),
+        SharedSlidingWindowLimiter
+    )
+    with pytest.raises(ValueError):
+        create_limiter("redis", 10, 60)
+
+def test_rate_limit_middleware_returns_429(client, monkeypatch):
+    """Test the middleware rejects clients over the limit"""
+    from app.main import rate_limiter
+    monkeypatch.setattr(rate_limiter, "max_requests", 2)
+    
+    assert client.get("/health").status_code == status.HTTP_200_OK
+    assert client.get("/health").status_code == status.HTTP_200_OK
+    response = client.get("/health")
+    
+    assert response.status_code == status.HTTP_429_TOO_MANY_REQUESTS
+    assert int(response.headers["retry-after"]) > 0
+
+def test_security_headers_added(client):
+    """Test security and CORS headers are added to responses"""
+    response = client.get("/health")
+    
+    assert response.headers["x-content-type-options"] == "nosniff"
+    assert response.headers["x-frame-options"] == "DENY"
+    assert response.headers["strict-transport-security"].startswith("max-age=")
+    assert response.headers["access-control-allow-credentials"] == "true"
+    assert "access-control-allow-origin" not in response.headers
+
+def test_cors_allowed_origin_echoed(client):
+    """Test an allowed origin is echoed back"""
+    response = client.get("/health", headers={"Origin": "http://localhost:3000"})
+    
+    assert response.headers["access-control-allow-origin"] == "http://localhost:3000"
+    assert response.headers["vary"] == "Origin"
+
+def test_cors_unknown_origin_not_echoed(client):
+    """Test an unknown origin gets no allow-origin header"""
+    response = client.get("/health", headers={"Origin": "http://evil.example"})
+    
+    assert "access-control-allow-origin" not in response.headers
+
+def test_cors_preflight(client):
+    """Test preflight requests are answered without reaching the routes"""
+    response = client.options(
+        "/events/",
+        headers={"Origin": "http://localhost:3000", "Access-Control-Request-Method": "POST"}
+    )
+    
+    assert response.status_code == status.HTTP_204_NO_CONTENT
+    assert response.headers["access-control-allow-origin"] == "http://localhost:3000"
+    assert "POST" in response.headers["access-control-allow-methods"]
+
+def test_plain_options_reaches_the_routes(client):
+    """Test OPTIONS without a CORS request method is not treated as a preflight"""
+    response = client.options("/events/", headers={"Origin": "http://localhost:3000"})
+    
+    assert response.status_code == status.HTTP_405_METHOD_NOT_ALLOWED
+
+def test_security_headers_replace_application_headers():
+    """Test headers the application already set are not sent twice"""
+    import asyncio
+    from app.middleware import SecurityMiddleware
+    
+    async def app(scope, receive, send):
+        await send({"type": "http.response.start", "status": 200, "headers": [
+            (b"x-frame-options", b"SAMEORIGIN"), (b"set-cookie", b"a=1"), (b"set-cookie", b"b=2"),
+            (b"vary", b"Accept-Encoding"),
+        ]})
+        await send({"type": "http.response.body", "body": b""})
+    
+    messages = []
+    
+    async def send(message):
+        messages.append(message)
+    
+    scope = {"type": "http", "method": "GET", "path": "/", "headers": [(b"origin", b"http://localhost:3000")]}
+    asyncio.run(SecurityMiddleware(app)(scope, None, send))
+    
+    headers = messages[0]["headers"]
+    assert [value for name, value in headers if name == b"x-frame-options"] == [b"DENY"]
+    assert [value for name, value in headers if name == b"set-cookie"] == [b"a=1", b"b=2"]
+    assert (b"access-control-allow-origin", b"http://localhost:3000") in headers
+    assert [value for name, value in headers if name == b"vary"] == [b"Accept-Encoding, Origin"]
+
+def test_vary_origin_is_merged_with_application_vary():
+    """Test Origin is added to the application's Vary instead of replacing it"""
+    from app.middleware import add_vary_origin
+    
+    headers = [(b"vary", b"Accept-Encoding")]
+    add_vary_origin(headers)
+    assert headers == [(b"vary", b"Accept-Encoding, Origin")]
+    
+    add_vary_origin(headers)
+    assert headers == [(b"vary", b"Accept-Encoding, Origin")]
+    
+    headers = []
+    add_vary_origin(headers)
+    assert headers == [(b"vary", b"Origin")]
+
+def test_cors_origins_come_from_settings(monkeypatch):
+    """Test the allowed origins default to the configured ones"""
+    from app.config import settings
+    from app.middleware import SecurityMiddleware
+    monkeypatch.setattr(settings, "cors_origins", ["https://tickets.example"])
+    
+    middleware = SecurityMiddleware(None)
+    
+    assert list(middleware.origin_headers) == [b"https://tickets.example"]
+
+def test_access_log_writes_batches():
+    """Test queued records are written as JSON lines"""
+    stream = io.StringIO()
+    log = AccessLog(batch_size=2, stream=stream)
+    log.record("GET", "/events/{event_id}", 200, 0.0123, "1.2.3.4")
+    log.record("POST", "/auth/login", 401, 0.2, "1.2.3.4")
+    log.record("GET", "/health", 200, 0.001, "5.6.7.8")
+    
+    log.flush()
+    
+    lines = [json.loads(line) for line in stream.getvalue().splitlines()]
+    assert [line["route"] for line in lines] == ["/events/{event_id}", "/auth/login", "/health"]
+    assert lines[0]["status"] == 200
+    assert lines[0]["duration_ms"] == 12.3
+    assert log.written == 3
+
+def test_access_log_drops_when_full():
+    """Test records past the queue bound are dropped and counted"""
+    log = AccessLog(max_queue=2, stream=io.StringIO())
+    for _ in range(5):
+        log.record("GET", "/health", 200, 0.001, "1.2.3.4")
+    
+    assert log.dropped == 3
+
+def test_access_log_samples_only_successes():
+    """Test sampling skips 2xx records but keeps every error"""
+    log = AccessLog(success_sample_rate=0.5, stream=io.StringIO(), random_func=lambda: 0.9)
+    log.record("GET", "/health", 200, 0.001, "1.2.3.4")
+    log.record("GET", "/events/{event_id}", 404, 0.001, "1.2.3.4")
+    log.record("GET", "/payments/verify/{reference}", 503, 0.001, "1.2.3.4")
+    
+    assert log.sampled_out == 1
+    log.flush()
+    assert log.written == 2
+
+def test_access_log_background_writer():
+    """Test the writer thread flushes everything on stop"""
+    stream = io.StringIO()
+    log = AccessLog(flush_interval=0.01, stream=stream)
+    log.start()
+    log.record("GET", "/health", 200, 0.001, "1.2.3.4")
+    log.stop()
+    
+    assert len(stream.getvalue().splitlines()) == 1
+
+def test_access_log_records_route_template(client, authenticated_user, monkeypatch):
+    """Test the middleware logs the route template, not the raw path"""
+    from app.main import access_log
+    records = []
+    monkeypatch.setattr(access_log, "record", lambda *args: records.append(args))
+    
+    client.get("/events/12345")
+    
+    method, route, status_code, duration, client_ip = records[-1]
+    assert (method, route, status_code) == ("GET", "/events/{event_id}", 404)
+    assert duration > 0
+
+@pytest.mark.parametrize("backend", ["memory", "shared"])
+def test_limiter_peek_does_not_count(backend, tmp_path):
+    """Test peek reports the limit without consuming budget"""
+    limiter = create_limiter(backend, 2, 60, storage_path=str(tmp_path / "rl.bin"))
+    
+    assert limiter.peek("a") == (True, 0.0)
+    limiter.hit("a")
+    assert limiter.peek("a")[0] is True
+    limiter.hit("a")
+    allowed, retry_after = limiter.peek("a")
+    
+    assert allowed is False
+    assert retry_after > 0
@@ -0,0 +1,175 @@
+import os
+import tempfile
+import threading
+from datetime import datetime
+
+import pytest
+from sqlalchemy import MetaData, Table, create_engine, event, func, inspect, select
+from sqlalchemy.orm import Session
+
+from app import models
+from app.cruds.events import search_events
+from app.database import Base
+from app.migrations import MIGRATIONS, SCHEMA_VERSION, ensure_schema, migrate, model_index, schema_migrations, upgrade
+
+@pytest.fixture
+def migration_engine():
+    """An empty SQLite file, separate from the test database"""
+    engine = create_engine(f"sqlite:///{os.path.join(tempfile.mkdtemp(), 'migrate.db')}")
+    yield engine
+    engine.dispose()
+
+def index_names(engine, table):
+    return {index["name"] for index in inspect(engine).get_indexes(table)}
+
+def test_migrate_adds_indexes_to_existing_tables(migration_engine):
+    """Test tables created before the indexes existed get them, once"""
+    Base.metadata.create_all(bind=migration_engine)
+    for table, name in (("events", "ix_events_active_event_date"), ("payments", "ix_payments_event_id")):
+        model_index(Base.metadata.tables[table], name).drop(migration_engine)
+    with migration_engine.begin() as conn:
+        # Created by migration 1 before it was found unused
+        conn.exec_driver_sql("CREATE INDEX ix_payments_pending_created_at ON payments (created_at)")
+
+    assert migrate(migration_engine) == [version for version, _, _ in MIGRATIONS]
+    assert "ix_events_active_event_date" in index_names(migration_engine, "events")
+    payment_indexes = index_names(migration_engine, "payments")
+    assert {"ix_payments_user_id", "ix_payments_event_id"} <= payment_indexes
+    assert "ix_payments_pending_created_at" not in payment_indexes
+    assert migrate(migration_engine) == []
+
+def test_migrate_on_fresh_database(migration_engine):
+    """Test a database built by create_all records the migrations without failing"""
+    Base.metadata.create_all(bind=migration_engine)
+    assert migrate(migration_engine) == [version for version, _, _ in MIGRATIONS]
+
+def test_event_listing_uses_active_index(migration_engine):
+    """Test get_events' query is answered from the partial index, not a table scan and sort"""
+    Base.metadata.create_all(bind=migration_engine)
+    query = (
+        select(models.Event)
+        .where(models.Event.is_active == True)
+        .order_by(models.Event.event_date, models.Event.id)
+        .limit(100)
+    )
+    sql = str(query.compile(migration_engine, compile_kwargs={"literal_binds": True}))
+    with migration_engine.connect() as conn:
+        plan = " ".join(row[-1] for row in conn.exec_driver_sql(f"EXPLAIN QUERY PLAN {sql}"))
+
+    assert "ix_events_active_event_date" in plan
+    assert "TEMP B-TREE" not in plan
+
+def test_ensure_schema_migrates_then_only_checks(migration_engine):
+    """Test boot creates an empty database, after which it costs one query"""
+    ensure_schema(migration_engine)
+    assert "events" in inspect(migration_engine).get_table_names()
+    
+    statements = []
+    event.listen(migration_engine, "before_cursor_execute", lambda conn, cursor, statement, *args: statements.append(statement))
+    ensure_schema(migration_engine)
+    assert len(statements) == 1
+
+def test_ensure_schema_refuses_stale_database(migration_engine):
+    """Test workers fail fast on an unmigrated database when they may not migrate it"""
+    with pytest.raises(RuntimeError, match=f"needs {SCHEMA_VERSION}"):
+        ensure_schema(migration_engine, migrate_on_startup=False)
+    assert "events" not in inspect(migration_engine).get_table_names()
+
+def test_concurrent_upgrades_apply_each_migration_once(migration_engine):
+    """Test workers booting together migrate one at a time"""
+    errors = []
+    
+    def boot():
+        try:
+            upgrade(migration_engine)
+        except Exception as exc:
+            errors.append(exc)
+    
+    threads = [threading.Thread(target=boot) for _ in range(4)]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+    
+    assert errors == []
+    with migration_engine.connect() as conn:
+        assert conn.scalar(select(func.count()).select_from(schema_migrations)) == len(MIGRATIONS)
+
+def test_search_migration_indexes_existing_events(migration_engine):
+    """Test events created before full-text search are searchable after migrating"""
+    Base.metadata.create_all(bind=migration_engine)
+    with migration_engine.begin() as conn:
+        conn.exec_driver_sql("DROP TABLE events_fts")
+        for trigger in ("insert", "delete", "update"):
+            conn.exec_driver_sql(f"DROP TRIGGER events_fts_{trigger}")
+    with Session(migration_engine) as db:
+        db.add(models.Event(
+            title="Jazz Night", description="Live music", location="Lagos", price=5000, capacity=10,
+            event_date=datetime(2025, 3, 1), is_active=True
+        ))
+        db.commit()
+    
+    migrate(migration_engine)
+    
+    with Session(migration_engine) as db:
+        assert [event.title for event in search_events(db, query="jazz")] == ["Jazz Night"]
+
+def test_hold_migration_adds_columns_to_existing_tables(migration_engine):
+    """Test events and payments created before ticket holds get the hold columns, events with none held"""
+    Base.metadata.create_all(bind=migration_engine)
+    with migration_engine.begin() as conn:
+        conn.exec_driver_sql("DROP INDEX ix_payments_pending_hold_expires_at")
+        conn.exec_driver_sql("ALTER TABLE payments DROP COLUMN hold_expires_at")
+        conn.exec_driver_sql("ALTER TABLE events DROP COLUMN tickets_held")
+        conn.exec_driver_sql(
+            "INSERT INTO events (title, location, price, capacity, tickets_sold, event_date, is_active) "
+            "VALUES ('Jazz Night', 'Lagos', 5000, 10, 3, '2025-03-01 20:00:00', 1)"
+        )
+    
+    migrate(migration_engine)
+    
+    assert "ix_payments_pending_hold_expires_at" in index_names(migration_engine, "payments")
+    with Session(migration_engine) as db:
+        event = db.scalars(select(models.Event)).one()
+        assert (event.tickets_held, event.tickets_sold_total) == (0, 3)
+
+def test_seating_migration_adds_venue_tables(migration_engine):
+    """Test a database from before reserved seating gets the seating tables"""
+    Base.metadata.create_all(bind=migration_engine)
+    with migration_engine.begin() as conn:
+        for table in ("event_seats", "venue_rows", "venue_sections", "venues"):
+            conn.exec_driver_sql(f"DROP TABLE {table}")
+    
+    migrate(migration_engine)
+    
+    assert {"venues", "venue_sections", "venue_rows", "event_seats"} <= set(inspect(migration_engine).get_table_names())
+    assert "ix_event_seats_held_expires_at" in index_names(migration_engine, "event_seats")
+
+# Columns the models gained after the first release, which migrations add
+BASELINE_COLUMNS_ADDED = {"users": {"token_version"}, "events": {"tickets_held", "venue_id"}, "payments": {"hold_expires_at"}}
+
+def create_baseline_schema(engine):
+    """The tables of the first release, before any migration"""
+    metadata = MetaData()
+    for name in ("users", "categories", "events", "tickets", "payments"):
+        columns = Base.metadata.tables[name].columns
+        Table(name, metadata, *(column._copy() for column in columns if column.name not in BASELINE_COLUMNS_ADDED.get(name, ())))
+    metadata.create_all(bind=engine)
+
+def test_upgrade_baseline_database(migration_engine):
+    """Test a database from the first release gets every model column, and existing users can still log in"""
+    create_baseline_schema(migration_engine)
+    with migration_engine.begin() as conn:
+        conn.exec_driver_sql(
+            "INSERT INTO users (email, name, password_hash, is_active) VALUES ('ada@example.com', 'Ada', 'x', 1)"
+        )
+    
+    ensure_schema(migration_engine)
+    
+    for table in Base.metadata.sorted_tables:
+        existing = {column["name"] for column in inspect(migration_engine).get_columns(table.name)}
+        assert set(table.columns.keys()) <= existing, table.name
+    foreign_keys = inspect(migration_engine).get_foreign_keys("events")
+    assert (["venue_id"], "venues") in [(fk["constrained_columns"], fk["referred_table"]) for fk in foreign_keys]
+    with Session(migration_engine) as db:
+        assert db.scalars(select(models.User)).one().token_version == 0
@@ -132,6 +132,11 @@ def test_verify_payment_success(
     data = response.json()
     assert "ticket_code" in data
     assert data["message"] == "Payment verified successfully"
+    assert data["email_sent"] is True
+    assert mock_email.call_args.kwargs["user_name"] == authenticated_user["user_data"]["name"]
+    # Statements run on the threadpool are attributed to the request too
+    assert response.headers["x-db-stats"].startswith("count=")
+    assert not response.headers["x-db-stats"].startswith("count=0;")
 
 def test_verify_payment_invalid_reference(client, authenticated_user):
     """Test verifying payment with invalid reference fails"""
@@ -140,4 +145,294 @@ def test_verify_payment_invalid_reference(client, authenticated_user):
         headers=authenticated_user["headers"]
     )
     
-    assert response.status_code == status.HTTP_404_NOT_FOUND
\ No newline at end of file
+    assert response.status_code == status.HTTP_404_NOT_FOUND
+@pytest.fixture
+def last_tickets(client, authenticated_user, test_event_data):
+    """An event with two tickets"""
+    response = client.post(
+        "/events/",
+        json={**test_event_data, "capacity": 2},
+        headers=authenticated_user["headers"]
+    )
+    return response.json()
+
+def start_checkout(client, authenticated_user, event):
+    return client.post(
+        "/payments/initialize",
+        json={"event_id": event["id"], "email": authenticated_user["user_data"]["email"]},
+        headers=authenticated_user["headers"]
+    )
+
+def held_and_sold(db_session, event):
+    from app import models
+    db_session.expire_all()
+    row = db_session.get(models.Event, event["id"])
+    return row.tickets_held_total, row.tickets_sold_total
+
+def test_sold_out_checkout_never_reaches_paystack(
+    client,
+    authenticated_user,
+    last_tickets,
+    db_session,
+    mock_paystack_initialize
+):
+    """Test checkouts hold the remaining tickets and further ones are refused before Paystack is called"""
+    assert start_checkout(client, authenticated_user, last_tickets).status_code == status.HTTP_200_OK
+    assert start_checkout(client, authenticated_user, last_tickets).status_code == status.HTTP_200_OK
+    
+    response = start_checkout(client, authenticated_user, last_tickets)
+    
+    assert response.status_code == status.HTTP_400_BAD_REQUEST
+    assert response.json()["detail"] == "Event sold out"
+    assert mock_paystack_initialize.call_count == 2
+    assert held_and_sold(db_session, last_tickets) == (2, 0)
+
+def test_failed_initialization_releases_hold(client, authenticated_user, last_tickets, db_session):
+    """Test a checkout Paystack declines gives its ticket back"""
+    with patch('app.services.paystack.initialize_payment') as mock:
+        mock.return_value = {'status': False, 'message': 'Declined'}
+        response = start_checkout(client, authenticated_user, last_tickets)
+    
+    assert response.status_code == status.HTTP_400_BAD_REQUEST
+    assert held_and_sold(db_session, last_tickets) == (0, 0)
+
+@patch('app.services.email_service.send_ticket_email')
+@patch('app.services.qr_service.generate_qr_code')
+def test_verification_turns_hold_into_sale(
+    mock_qr,
+    mock_email,
+    client,
+    authenticated_user,
+    last_tickets,
+    db_session,
+    mock_paystack_initialize,
+    mock_paystack_verify
+):
+    """Test a verified payment's held ticket is counted as sold, once"""
+    mock_qr.return_value = "qr_codes/test.png"
+    mock_email.return_value = True
+    reference = start_checkout(client, authenticated_user, last_tickets).json()["reference"]
+    
+    for _ in range(2):
+        response = client.get(f"/payments/verify/{reference}", headers=authenticated_user["headers"])
+        assert response.status_code == status.HTTP_200_OK
+    
+    assert held_and_sold(db_session, last_tickets) == (0, 1)
+
+def test_hold_is_converted_once(client, authenticated_user, last_tickets, db_session, mock_paystack_initialize):
+    """Test a verification racing one that already sold the payment's ticket does not sell it again"""
+    from app.cruds import events as event_crud
+    from app.cruds import payments as payment_crud
+    reference = start_checkout(client, authenticated_user, last_tickets).json()["reference"]
+    held_payment = payment_crud.get_payment_by_reference(db_session, reference)
+    # Payments from before holds existed never held a ticket
+    legacy = payment_crud.create_payment(
+        db_session, held_payment.user_id, last_tickets["id"], "TXN-LEGACY", 1000.0, ""
+    )
+    
+    for payment, held in ((held_payment, 1), (legacy, 0)):
+        assert payment_crud.convert_hold(db_session, payment) == held
+        event_crud.update_tickets_sold(db_session, last_tickets["id"], held=held)
+        db_session.commit()
+        assert payment_crud.convert_hold(db_session, payment) == payment_crud.HOLD_USED
+    
+    assert held_and_sold(db_session, last_tickets) == (0, 2)
+
+@patch('app.services.email_service.send_ticket_email')
+@patch('app.services.qr_service.generate_qr_code')
+def test_expired_holds_are_released(
+    mock_qr,
+    mock_email,
+    client,
+    authenticated_user,
+    last_tickets,
+    db_session,
+    mock_paystack_initialize,
+    mock_paystack_verify
+):
+    """Test the sweeper frees lapsed holds, and a late payment only gets a ticket that is still free"""
+    from datetime import datetime, timedelta, timezone
+    from app.holds import HoldSweeper
+    mock_qr.return_value = "qr_codes/test.png"
+    mock_email.return_value = True
+    late, early = (start_checkout(client, authenticated_user, last_tickets).json()["reference"] for _ in range(2))
+    
+    sweeper = HoldSweeper(batch_size=1)
+    with patch('app.cruds.payments.datetime') as clock:
+        clock.now.return_value = datetime.now(timezone.utc) + timedelta(hours=1)
+        assert sweeper.sweep(db_session) == 2
+    assert held_and_sold(db_session, last_tickets) == (0, 0)
+    
+    # The early payment's ticket is taken back; the late one's is sold to someone else
+    assert client.get(f"/payments/verify/{early}", headers=authenticated_user["headers"]).status_code == 200
+    assert start_checkout(client, authenticated_user, last_tickets).status_code == status.HTTP_200_OK
+    response = client.get(f"/payments/verify/{late}", headers=authenticated_user["headers"])
+    
+    assert response.status_code == status.HTTP_409_CONFLICT
+    assert held_and_sold(db_session, last_tickets) == (1, 1)
+
+@patch('app.services.email_service.send_ticket_email')
+@patch('app.services.qr_service.generate_qr_code')
+def test_sharded_holds_leave_the_event_row_alone(
+    mock_qr,
+    mock_email,
+    client,
+    authenticated_user,
+    last_tickets,
+    db_session,
+    mock_paystack_initialize,
+    mock_paystack_verify,
+    monkeypatch
+):
+    """Test with inventory shards holds are claimed and sold on the shards, and holds from before them on the event row"""
+    from app import models
+    from app.config import settings
+    mock_qr.return_value = "qr_codes/test.png"
+    mock_email.return_value = True
+    before_shards = start_checkout(client, authenticated_user, last_tickets).json()["reference"]
+    monkeypatch.setattr(settings, "inventory_shards", 4)
+    
+    sharded = start_checkout(client, authenticated_user, last_tickets).json()["reference"]
+    assert start_checkout(client, authenticated_user, last_tickets).status_code == status.HTTP_400_BAD_REQUEST
+    for reference in (sharded, before_shards):
+        assert client.get(f"/payments/verify/{reference}", headers=authenticated_user["headers"]).status_code == 200
+    
+    assert held_and_sold(db_session, last_tickets) == (0, 2)
+    row = db_session.get(models.Event, last_tickets["id"])
+    shards = db_session.query(models.EventInventoryShard).filter_by(event_id=last_tickets["id"]).all()
+    assert (row.tickets_held, row.tickets_sold) == (0, 1)
+    assert (sum(shard.held for shard in shards), sum(shard.sold for shard in shards)) == (0, 1)
+
+def test_waiting_room_spaces_admissions():
+    """Test each caller gets the next slot, and tokens tell their place without any stored state"""
+    from app.waiting_room import WaitingRoom
+    now = [1000.0]
+    room = WaitingRoom(rate=2, checkout_seconds=60, secret="test-secret", clock=lambda: now[0])
+    
+    first, second, third = (room.join(event_id=7, user_id=user) for user in (1, 2, 3))
+    
+    assert room.place(first).admitted
+    assert room.place(third)[:2] == (7, 3)
+    assert (room.place(third).position, room.place(third).wait_seconds) == (2, 1.0)
+    assert room.join(event_id=8, user_id=1) and room.place(room.join(event_id=8, user_id=2)).position == 1
+    now[0] += 1.0
+    assert room.place(third).admitted and room.place(second).admitted
+    now[0] += 61.0
+    assert room.place(first).expired
+    assert room.place(first[:-1] + ("A" if first[-1] != "A" else "B")) is None
+    assert WaitingRoom(rate=2, secret="other-secret").place(first) is None
+
+def test_waiting_room_gives_one_slot_per_caller():
+    """Test joining again returns the caller's token while it is good, without moving anyone back"""
+    from app.waiting_room import WaitingRoom
+    now = [1000.0]
+    room = WaitingRoom(rate=1, checkout_seconds=60, secret="test-secret", clock=lambda: now[0])
+    
+    first = room.join(event_id=7, user_id=1)
+    waiting = room.join(event_id=7, user_id=2)
+    assert [room.join(event_id=7, user_id=2) for _ in range(5)] == [waiting] * 5
+    assert room.place(room.join(event_id=7, user_id=3)).position == 2
+    assert room.joined == 3
+    
+    now[0] += 62.0
+    assert room.place(first).expired
+    assert room.join(event_id=7, user_id=1) != first
+
+@pytest.fixture
+def waiting_room_on(monkeypatch):
+    """A waiting room admitting one buyer per second"""
+    from app.waiting_room import waiting_room
+    monkeypatch.setattr(waiting_room, "rate", 1.0)
+    return waiting_room
+
+def test_checkout_needs_admitted_queue_token(
+    client,
+    authenticated_user,
+    created_event,
+    waiting_room_on,
+    sql_statements,
+    mock_paystack_initialize,
+    db_session,
+    monkeypatch
+):
+    """Test only admitted callers reach checkout, once per queue token, and polling the queue never touches the database"""
+    import time
+    from app.cruds import payments as payment_crud
+    path = f"/events/{created_event['id']}/queue"
+    ahead = waiting_room_on.join(created_event["id"], user_id=999)
+    second, again = (client.post(path, headers=authenticated_user["headers"]).json() for _ in range(2))
+    assert (second["admitted"], second["position"]) == (False, 1)
+    assert again["token"] == second["token"]
+    
+    sql_statements.clear()
+    response = client.get(path, headers={"X-Queue-Token": second["token"]})
+    assert response.status_code == status.HTTP_200_OK
+    assert response.json()["position"] == 1 and response.headers["retry-after"] == "1"
+    assert sql_statements == []
+    assert client.get(path, headers={"X-Queue-Token": "1.1.1.forged"}).status_code == status.HTTP_403_FORBIDDEN
+    
+    def checkout(token=None):
+        headers = {**authenticated_user["headers"], **({"X-Queue-Token": token} if token else {})}
+        return client.post("/payments/initialize", json={
+            "event_id": created_event["id"], "email": authenticated_user["user_data"]["email"]
+        }, headers=headers)
+    
+    assert checkout().status_code == status.HTTP_403_FORBIDDEN
+    assert checkout(ahead).status_code == status.HTTP_403_FORBIDDEN
+    waiting = checkout(second["token"])
+    assert waiting.status_code == status.HTTP_429_TOO_MANY_REQUESTS
+    assert waiting.headers["retry-after"] == "1"
+    monkeypatch.setattr(waiting_room_on, "clock", lambda: time.time() + 1.5)
+    paid = checkout(second["token"])
+    assert paid.status_code == status.HTTP_200_OK
+    assert checkout(second["token"]).status_code == status.HTTP_403_FORBIDDEN
+    assert mock_paystack_initialize.call_count == 1
+    
+    # A failed checkout does not use the token up
+    payment_crud.release_hold(db_session, paid.json()["reference"], 'failed')
+    assert checkout(second["token"]).status_code == status.HTTP_200_OK
+
+@patch('app.services.email_service.send_ticket_email')
+@patch('app.services.qr_service.generate_qr_code')
+def test_checkout_sells_held_seat(
+    mock_qr,
+    mock_email,
+    client,
+    authenticated_user,
+    test_event_data,
+    db_session,
+    mock_paystack_initialize,
+    mock_paystack_verify
+):
+    """Test a seated checkout needs a seat the buyer holds, and its ticket gets that seat"""
+    from app import models
+    mock_qr.return_value = "qr_codes/test.png"
+    mock_email.return_value = True
+    venue = client.post("/venues/", json={"name": "Eko Hall", "sections": [
+        {"name": "A", "rows": [{"label": "1", "seats": 4}]}
+    ]}, headers=authenticated_user["headers"]).json()
+    event = client.post(
+        "/events/", json={**test_event_data, "venue_id": venue["id"]}, headers=authenticated_user["headers"]
+    ).json()
+    
+    def checkout(**body):
+        return client.post(
+            "/payments/initialize",
+            json={"event_id": event["id"], "email": authenticated_user["user_data"]["email"], **body},
+            headers=authenticated_user["headers"]
+        )
+    
+    assert checkout().status_code == status.HTTP_400_BAD_REQUEST
+    assert checkout(seat_number="A-1-1").status_code == status.HTTP_409_CONFLICT
+    seats = client.post(
+        f"/events/{event['id']}/seats/hold", json={"count": 2}, headers=authenticated_user["headers"]
+    ).json()["seats"]
+    assert seats == ["A-1-2", "A-1-3"]
+    reference = checkout(seat_number="A-1-3").json()["reference"]
+    assert client.get(f"/payments/verify/{reference}", headers=authenticated_user["headers"]).status_code == 200
+    
+    db_session.expire_all()
+    ticket = db_session.query(models.Ticket).one()
+    assert ticket.seat_number == "A-1-3"
+    assert db_session.get(models.EventSeat, (event["id"], "A-1-3")).status == 'sold'
+    assert held_and_sold(db_session, event) == (0, 1)
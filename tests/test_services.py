@@ -163,4 +163,15 @@ def test_send_email_with_none_qr_path(mock_sendgrid):
     
     assert result is True
     mock_sendgrid.assert_called_once()
-    mock_sg_instance.send.assert_called_once()
\ No newline at end of file
+    mock_sg_instance.send.assert_called_once()
+
+def test_app_import_skips_service_clients():
+    """Test importing the app leaves the service client libraries for first use"""
+    import subprocess
+    import sys
+    code = (
+        "import sys, app.main; "
+        "print(sorted(m for m in ('sendgrid', 'qrcode', 'PIL', 'requests') if m in sys.modules))"
+    )
+    result = subprocess.run([sys.executable, "-c", code], capture_output=True, text=True, check=True)
+    assert result.stdout.strip().splitlines()[-1] == "[]"
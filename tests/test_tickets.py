@@ -52,6 +52,18 @@ def test_get_my_tickets_with_data(
     assert len(tickets) >= 1
     assert tickets[0]["ticket_code"] == created_ticket.ticket_code
 
+def test_my_tickets_rows_encode_like_the_schema(client, authenticated_user, created_ticket):
+    """Test tickets encoded from column rows match TicketResponse, nulls included"""
+    from typing import List
+    from pydantic import TypeAdapter
+    from app import schemas
+    adapter = TypeAdapter(List[schemas.TicketResponse])
+    
+    response = client.get("/tickets/my-tickets", headers=authenticated_user["headers"])
+    
+    assert response.headers["content-type"] == "application/json"
+    assert response.content == adapter.dump_json(adapter.validate_python([created_ticket]))
+
 def test_get_my_tickets_no_auth(client):
     """Test getting tickets without authentication fails"""
     response = client.get("/tickets/my-tickets")